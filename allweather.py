@@ -1,46 +1,46 @@
 import numpy as np
-from scipy.optimize import minimize
 
-# Numerical values for the standard deviations (risks) of each asset
-sigma_eq = 0.153
-sigma_com = 0.213
-sigma_cc = 0.041
-sigma_em = 0.105
-sigma_il = 0.073
-sigma_nom = 0.08
+from risk_parity import (
+    solve, solve_sequence, regime_risks, covariance_from_sigmas, perturbed_covariances,
+    ALL_WEATHER_ASSETS, ALL_WEATHER_REGIMES, ALL_WEATHER_SIGMAS, ALL_WEATHER_EXPOSURES,
+)
 
-# Define the risk equations for each quadrant
-def risk_diff(weights):
-    w_eq, w_com, w_cc, w_em, w_il, w_nom = weights
-    # Risk for each quadrant
-    R1 = w_eq/2. * sigma_eq + w_com/2. * sigma_com + w_cc * sigma_cc + w_em/2. * sigma_em
-    R2 = w_il/2. * sigma_il + w_com/2. * sigma_com + w_em/2. * sigma_em
-    R3 = w_nom/2. * sigma_nom + w_il/2. * sigma_il
-    R4 = w_eq/2. * sigma_eq + w_nom/2. * sigma_nom
-    # Difference between risks (we want to minimize this difference)
-    return (R1 - R2)**2 + (R1 - R3)**2 + (R1 - R4)**2
+# Numerical values for the standard deviations (risks) of each asset:
+# equities, commodities, corporate credit, EM credit, IL bonds, nominal bonds
+sigmas = ALL_WEATHER_SIGMAS
+covariance = covariance_from_sigmas(sigmas)
 
-# Initial guess for the weights
-initial_guess = np.array([1/6, 1/6, 1/6, 1/6, 1/6, 1/6])
+# scipy's default SLSQP tolerance, which the published allocation below was
+# solved with: tighter ones keep balancing towards another corner (see the notes)
+tol = 1e-6
 
-# Constraints: sum of weights = 1
-constraints = ({
-    'type': 'eq',
-    'fun': lambda weights: np.sum(weights) - 1
-})
-
-# Bounds: weights should be between 0 and 1 (i.e., non-negative and not exceeding 1)
-bounds = [(0, 1) for _ in range(6)]
-
-# Minimize the risk difference with the constraints and bounds
-result = minimize(risk_diff, initial_guess, bounds=bounds, constraints=constraints)
+# Each asset's risk is split over the four quadrants by ALL_WEATHER_EXPOSURES,
+# the weights balance the risk of the quadrants (see risk_parity.py)
+result = solve(ALL_WEATHER_EXPOSURES, covariance, standalone=True, tol=tol)
 
 # Output the solution
 if result.success:
     print("Optimized weights:", result.x)
+    for asset, weight in zip(ALL_WEATHER_ASSETS, result.x):
+        print(f"    {weight:.2%} in {asset}")
+    risks = regime_risks(result.x, ALL_WEATHER_EXPOSURES, covariance, standalone=True)[0]
+    for regime, risk in zip(ALL_WEATHER_REGIMES, risks):
+        print(f"    {regime} risk: {risk:.2%}")
+    print(f"Total risk: {(result.x * sigmas).sum():.2%}")
 else:
     print("Optimization failed:", result.message)
 
+# Sensitivity of the weights to +-10% errors in the sigmas, each solve
+# starting from the solution above
+weights, _, success = solve_sequence(
+    ALL_WEATHER_EXPOSURES, perturbed_covariances(sigmas, 1000, scale=0.1), x0=result.x,
+    standalone=True, warm_start=False, tol=tol,
+)
+low, high = np.percentile(weights[success], [5, 95], axis=0)
+print("\nWeights over 1000 perturbed sigmas (5th - 95th percentile):")
+for asset, lo, hi in zip(ALL_WEATHER_ASSETS, low, high):
+    print(f"    {asset}: {lo:.2%} - {hi:.2%}")
+
 """
 Result:
     array([0.11129921, 0.01442717, 0.13121359, 0.12701067, 0.29618735,
@@ -56,9 +56,15 @@ These are the fractions of our portfolio, so that gives us:
 
 This sums to exactly 100%. For a total risk of 8.6%. See this calculation:
 
-In [7]: (result.x * np.array([sigma_eq, sigma_com, sigma_cc, sigma_em, sigma_il,
-   ...:  sigma_nom])).sum()
+In [7]: (result.x * sigmas).sum()
 Out[7]: 0.08602828114133718
 
-And a total expected return of ???
+At this tolerance the quadrants carry 2.21%, 1.90%, 2.36% and 2.13% of
+risk. The four quadrant conditions leave the six weights underdetermined:
+solving to tol=1e-12 balances them exactly at 2.48% each, but by moving to
+a corner with no Corporate Credit (14.81%, 4.97%, 0.00%, 15.54%, 31.05%,
+33.63%) for a total risk of 9.91%.
+
+For the return, allweather_backtest.py rebalances this allocation on
+proxy ETFs with covariances re-estimated from their history.
 """
@@ -0,0 +1,184 @@
+import os
+from collections import deque
+
+import numpy as np
+import pandas as pd
+import yfinance as yf
+
+from demark.data import OHLCVCache, DEFAULT_CACHE_DIR
+from demark.metrics import equity_metrics
+from risk_parity import solve, ALL_WEATHER_ASSETS, ALL_WEATHER_EXPOSURES
+
+"""
+    Backtest of the All Weather allocation (allweather.py) on proxy ETFs.
+
+    Daily returns stream through a covariance estimator that is updated in
+    O(1) per day: an exponentially weighted one (EWMACovariance) or an
+    exact rolling window (RollingCovariance, Welford's updates with the
+    oldest day removed). On each rebalance date the quadrant risk balance
+    is re-solved with the current estimate, starting from the previous
+    weights, and the portfolio is reset to those weights at the close.
+    Between rebalances the holdings drift with prices.
+
+    Prices come through the demark OHLCV cache, so only the first run
+    downloads them. They are dividend adjusted, so they are kept in their
+    own directory of the cache rather than next to the demark bars of the
+    same symbols, whose adjustment yf_retry_download leaves to yfinance.
+"""
+
+PROXY_ETFS = {
+    "Equities": "SPY",
+    "Commodities": "DBC",
+    "Corporate Credit": "LQD",
+    "EM Credit": "EMB",
+    "IL Bonds": "TIP",
+    "Nominal Bonds": "TLT",
+}
+START_DATE = "2008-01-01"
+END_DATE = "2024-01-01"
+INITIAL_CAPITAL = 100000
+PERIODS_PER_YEAR = 252
+ADJUSTED_CACHE_DIR = os.path.join(os.environ.get("DEMARK_CACHE_DIR", DEFAULT_CACHE_DIR), "adjusted")
+
+
+class EWMACovariance:
+    """RiskMetrics style covariance of zero-mean returns, decay lam per day."""
+    def __init__(self, n_assets, lam=0.94):
+        self.lam = lam
+        self.sum = np.zeros((n_assets, n_assets))
+        self.weight = 0.0
+        self.count = 0
+
+    def update(self, returns):
+        self.sum *= self.lam
+        self.sum += (1 - self.lam) * np.outer(returns, returns)
+        self.weight = self.lam * self.weight + (1 - self.lam)
+        self.count += 1
+
+    def covariance(self):
+        return self.sum / self.weight
+
+
+class RollingCovariance:
+    """Sample covariance of the last window days of returns (all of them without window)."""
+    def __init__(self, n_assets, window=None):
+        self.window = window
+        self.history = deque()
+        self.mean = np.zeros(n_assets)
+        self.comoment = np.zeros((n_assets, n_assets))
+        self.count = 0
+
+    def update(self, returns):
+        returns = np.asarray(returns, dtype=float)
+        self.count += 1
+        delta = returns - self.mean
+        self.mean += delta / self.count
+        self.comoment += np.outer(delta, returns - self.mean)
+        if self.window is None:
+            return
+
+        self.history.append(returns)
+        if self.count > self.window:
+            # Welford's update in reverse for the day leaving the window
+            oldest = self.history.popleft()
+            self.count -= 1
+            delta = oldest - self.mean
+            self.mean -= delta / self.count
+            self.comoment -= np.outer(delta, oldest - self.mean)
+
+    def covariance(self):
+        return self.comoment / (self.count - 1)
+
+
+def yf_close_download(symbol, start_date, end_date):
+    data = yf.download(symbol, start=start_date, end=end_date, auto_adjust=True, progress=False)
+    return data if not data.empty else None
+
+
+def load_prices(symbols, start_date, end_date, cache=None):
+    """Closes of symbols on the dates they all trade, one column each."""
+    if cache is None:
+        cache = OHLCVCache(ADJUSTED_CACHE_DIR, downloader=yf_close_download)
+    closes = {}
+    for symbol in symbols:
+        data = cache.get(symbol, start_date, end_date)
+        if data is None:
+            raise ValueError(f"No prices for {symbol} between {start_date} and {end_date}")
+        closes[symbol] = data["Close"]
+    return pd.DataFrame(closes).dropna()
+
+
+def rebalance_rows(dates, frequency="M"):
+    """Rows of the first trading day of each period (e.g. "M" for monthly, "Q")."""
+    periods = pd.DatetimeIndex(dates).to_period(frequency)
+    return np.flatnonzero(np.r_[True, periods[1:] != periods[:-1]])
+
+
+def backtest_allweather(
+    prices, exposures=ALL_WEATHER_EXPOSURES, estimator=None, warmup=63, frequency="M",
+    standalone=False, initial_capital=INITIAL_CAPITAL,
+):
+    """
+    Rebalance prices (dates x assets, in the order of the exposures' rows)
+    on the first trading day of every frequency period once warmup days of
+    returns are in the estimator (default EWMACovariance).
+
+    Returns (equity_df with date and portfolio_value, weights_df of the
+    target weights on each rebalance date).
+    """
+    close = prices.to_numpy(dtype=float)
+    n_dates, n_assets = close.shape
+    estimator = estimator or EWMACovariance(n_assets)
+    returns = close[1:] / close[:-1] - 1
+    is_rebalance = np.zeros(n_dates, dtype=bool)
+    is_rebalance[rebalance_rows(prices.index, frequency)] = True
+
+    equity = np.full(n_dates, float(initial_capital))
+    shares = None
+    weights = None
+    targets = []
+    for row in range(1, n_dates):
+        estimator.update(returns[row - 1])
+        if shares is not None:
+            equity[row] = shares @ close[row]
+        else:
+            equity[row] = equity[row - 1]
+        if not is_rebalance[row] or estimator.count < warmup:
+            continue
+
+        result = solve(exposures, estimator.covariance() * PERIODS_PER_YEAR, x0=weights, standalone=standalone)
+        if not result.success:
+            continue
+        weights = np.clip(result.x, 0, None) / np.clip(result.x, 0, None).sum()
+        shares = equity[row] * weights / close[row]
+        targets.append((prices.index[row], *weights))
+
+    equity_df = pd.DataFrame({"date": prices.index, "portfolio_value": equity})
+    weights_df = pd.DataFrame(targets, columns=["date", *prices.columns]).set_index("date")
+    return equity_df, weights_df
+
+
+def print_backtest(equity_df, weights_df, initial_capital=INITIAL_CAPITAL):
+    invested = equity_df[equity_df["date"] >= weights_df.index[0]] if len(weights_df) else equity_df
+    metrics = equity_metrics(invested["portfolio_value"].to_numpy(), periods_per_year=PERIODS_PER_YEAR)
+    print(f"\nAll Weather from {invested['date'].iloc[0].date()} to {invested['date'].iloc[-1].date()}:")
+    print(f"Final Portfolio Value: ${equity_df['portfolio_value'].iloc[-1]:,.2f} from ${initial_capital:,.2f}")
+    print(f"CAGR: {metrics['cagr']:.2f}%")
+    print(f"Sharpe Ratio: {metrics['sharpe_ratio']:.2f}")
+    print(f"Max Drawdown: {metrics['max_drawdown']:.2f}%")
+    print(f"Rebalances: {len(weights_df)}")
+    print("\nAverage target weights:")
+    print(weights_df.mean().to_string(float_format=lambda x: f"{x:.2%}"))
+
+
+if __name__ == "__main__":
+    symbols = [PROXY_ETFS[asset] for asset in ALL_WEATHER_ASSETS]
+    prices = load_prices(symbols, START_DATE, END_DATE)
+
+    for name, estimator in [
+        ("EWMA, lambda 0.94", EWMACovariance(len(symbols))),
+        ("Rolling 252 days", RollingCovariance(len(symbols), window=252)),
+    ]:
+        print(f"\nCovariance: {name}")
+        equity_df, weights_df = backtest_allweather(prices, estimator=estimator)
+        print_backtest(equity_df, weights_df)
@@ -0,0 +1,9 @@
+import os
+import sys
+
+"""
+    Lets one pytest run from the repository root collect both suites: the
+    demark modules and their tests import each other by bare name.
+"""
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "demark"))
@@ -1,3 +1,4 @@
+from contextlib import nullcontext
 import pandas as pd
 import numpy as np
 import yfinance as yf
@@ -5,11 +6,17 @@ from datetime import datetime, timedelta
 import matplotlib.dates as mdates
 from tqdm import tqdm
 
-from utils_demark import yf_retry_download
+from utils_demark import yf_batch_download, get_default_cache
+from data import download_universe
 from tickers import get_sp500_tickers, get_commodity_tickers, get_crypto_tickers
 from setup_demark import identify_td_buy_setup, identify_td_sell_setup
 from countdown_demark import identify_td_buy_countdown, identify_td_sell_countdown
+from signals_demark import identify_td_events, events_to_wide, signal_mask, BUY_SETUP, SELL_SETUP
+from parallel_demark import IndicatorPool
 from sizing import FixedAmountPositionSizer, KellyPositionSizer
+from portfolio import simulate_portfolio
+from panel import Panel
+from metrics import portfolio_metrics, print_metrics
 
 
 HOLDING_PERIOD_DAYS = 10
@@ -20,7 +27,11 @@ END_DATE = "2023-01-01"
 INITIAL_CAPITAL = 100000
 
 
-def add_aggregated_countdown_signal(data):
+def add_aggregated_countdown_signal(data, events=None):
+    if events is not None:
+        # Sparse mode: read the 9s straight from the events table
+        data["TD_Signal"] = signal_mask(events, len(data), SELL_SETUP, 9)
+        return data
     countdown_cols = [col for col in data.columns if col.startswith("TD_Sell_Setup")]
     if not countdown_cols:
         # print(f"Warning: No TD Buy Countdown columns found in data")
@@ -30,6 +41,107 @@ def add_aggregated_countdown_signal(data):
     return data
 
 
+CANDIDATE_DTYPE = np.dtype([
+    ("ticker", np.int32),  # column of the ticker in the panel
+    ("signal_row", np.int64),
+    ("entry_row", np.int64),
+    ("entry_price", np.float64),
+])
+
+
+def find_candidate_trades(panel, num_rising_closes=NUM_RISING_CLOSES, market_ticker="^GSPC", chunk_size=512):
+    """
+    Entries after each TD_Signal whose next num_rising_closes + 1 closes
+    (SIGNAL_LOOKBACK_DAYS by default) rise num_rising_closes times in a row,
+    entered at the open of the bar after the last of them. Bars are counted
+    on each ticker's own calendar.
+
+    Works on the whole Panel at once, chunk_size tickers at a time: each
+    column's bars are packed to the top so "the k-th next bar" is a shift
+    by k rows. Returns (candidates, diagnostics) where candidates is a
+    CANDIDATE_DTYPE record array sorted by entry_row (ties in ticker then
+    signal order) and diagnostics counts total_td_signals and
+    signals_with_rising_closes.
+    """
+    lookback_days = num_rising_closes + 1
+    n_dates = len(panel.dates)
+    position = np.arange(n_dates)[:, None]
+    parts = []
+    diagnostics = {"total_td_signals": 0, "signals_with_rising_closes": 0}
+
+    for lo in range(0, len(panel.tickers), chunk_size):
+        cols = slice(lo, lo + chunk_size)
+        valid = np.asarray(panel.valid[:, cols])
+        signal = np.asarray(panel.field("TD_Signal")[:, cols]) & valid
+        if market_ticker in panel:
+            market_col = panel.column(market_ticker) - lo
+            if 0 <= market_col < valid.shape[1]:
+                signal[:, market_col] = False
+
+        # Row of the i-th bar of each ticker, its bars first in date order
+        order = np.argsort(~valid, axis=0, kind="stable")
+        n_bars = valid.sum(axis=0)
+        close = np.take_along_axis(np.asarray(panel.field("Close")[:, cols], dtype=float), order, axis=0)
+        signal = np.take_along_axis(signal, order, axis=0)
+
+        # rises[j]: close of bar j + 1 above close of bar j
+        rises = np.zeros((n_dates + lookback_days, valid.shape[1]), dtype=bool)
+        rises[: n_dates - 1] = close[1:] > close[:-1]
+        rising = signal & (position + lookback_days < n_bars)
+        diagnostics["total_td_signals"] += int(signal.sum())
+        for k in range(1, num_rising_closes + 1):
+            rising &= rises[k : k + n_dates]
+        diagnostics["signals_with_rising_closes"] += int(rising.sum())
+
+        entry_position = position + lookback_days + 1
+        has_entry = rising & (entry_position < n_bars)
+        chunk_cols, signal_positions = np.nonzero(has_entry.T)
+        signal_rows = order[signal_positions, chunk_cols]
+        entry_rows = order[signal_positions + lookback_days + 1, chunk_cols]
+
+        part = np.empty(len(chunk_cols), dtype=CANDIDATE_DTYPE)
+        part["ticker"] = chunk_cols + lo
+        part["signal_row"] = signal_rows
+        part["entry_row"] = entry_rows
+        part["entry_price"] = np.asarray(panel.field("Open")[:, cols])[entry_rows, chunk_cols]
+        parts.append(part)
+
+    candidates = np.concatenate(parts) if parts else np.empty(0, dtype=CANDIDATE_DTYPE)
+    candidates = candidates[np.argsort(candidates["entry_row"], kind="stable")]
+    return candidates, diagnostics
+
+
+def find_potential_trades(
+    all_data, diagnostics, holding_period_days=HOLDING_PERIOD_DAYS, num_rising_closes=NUM_RISING_CLOSES
+):
+    """
+    find_candidate_trades as the list of trade dicts simulate_portfolio
+    takes, sorted by entry_date. Each trade exits holding_period_days
+    after entry. all_data is a Panel or {ticker: DataFrame}.
+    """
+    panel = all_data
+    if not isinstance(panel, Panel):
+        panel = Panel.from_frames(all_data, fields=["Open", "Close", "TD_Signal"], dtype=np.float64)
+
+    candidates, counts = find_candidate_trades(panel, num_rising_closes)
+    for name, count in counts.items():
+        diagnostics[name] += count
+
+    entry_dates = panel.dates[candidates["entry_row"]]
+    exit_dates = entry_dates + timedelta(days=holding_period_days)
+    return [
+        {
+            "ticker": panel.tickers[ticker],
+            "entry_date": entry_date,
+            "entry_price": entry_price,
+            "exit_date": exit_date,
+        }
+        for ticker, entry_date, entry_price, exit_date in zip(
+            candidates["ticker"], entry_dates, candidates["entry_price"], exit_dates
+        )
+    ]
+
+
 def backtest_portfolio(all_data, position_sizer):
     # Diagnostics
     diagnostics = {
@@ -39,163 +151,21 @@ def backtest_portfolio(all_data, position_sizer):
         "insufficient_cash": 0,
     }
 
-    # Collect all potential trades
-    potential_trades = []
-
-    for ticker, data in all_data.items():
-        if ticker == "^GSPC":
-            continue
-
-        signal_dates = data.index[data["TD_Signal"] == True]
-
-        diagnostics["total_td_signals"] += len(signal_dates)
-
-        for signal_date in signal_dates:
-            signal_idx = data.index.get_loc(signal_date)
-
-            # Check if there are at least 3 days of data after the signal
-            if signal_idx + 3 >= len(data):
-                continue
-
-            # Get the next 3 closing prices
-            closes = data["Close"].iloc[signal_idx + 1 : signal_idx + 4].values
-
-            # Check if the closes are rising consecutively
-            is_rising = all(closes[i] > closes[i - 1] for i in range(1, len(closes)))
-
-            if is_rising:
-                diagnostics["signals_with_rising_closes"] += 1
-
-                entry_idx = signal_idx + 4  # Day after the 3rd rising close
-
-                # Ensure entry index is within data range
-                if entry_idx >= len(data):
-                    continue
-
-                entry_date = data.index[entry_idx]
-                entry_price = data["Open"].iloc[entry_idx]
-                exit_date = entry_date + timedelta(days=HOLDING_PERIOD_DAYS)
-
-                potential_trades.append({
-                    "ticker": ticker,
-                    "entry_date": entry_date,
-                    "entry_price": entry_price,
-                    "exit_date": exit_date,
-                })
-
-    # Sort potential trades by entry_date
-    potential_trades.sort(key=lambda x: x["entry_date"])
-
-    # Simulate the portfolio over time
-    portfolio_value = INITIAL_CAPITAL
-    cash = INITIAL_CAPITAL
-    active_positions = []
-    closed_positions = []
-    daily_portfolio_values = []
-    max_concurrent_positions = 0
-
-    # Build a list of all dates in the data
-    all_dates = sorted(
-        set(date for data in all_data.values() for date in data.index)
-    )
-
-    # Convert all_dates to a set for faster lookup
-    all_dates_set = set(all_dates)
-
-    # Index potential_trades
-    trade_idx = 0
-    total_trades = len(potential_trades)
+    potential_trades = find_potential_trades(all_data, diagnostics)
 
     print("\nRunning portfolio backtest...")
+    portfolio_df, trades_df, stats = simulate_portfolio(
+        all_data, potential_trades, position_sizer, INITIAL_CAPITAL
+    )
+    diagnostics["trades_executed"] = stats["trades_executed"]
+    diagnostics["insufficient_cash"] = stats["insufficient_cash"]
 
-    for current_date in tqdm(all_dates):
-        # First, check for positions that need to be closed
-        positions_to_remove = []
-        for position in active_positions:
-            if current_date >= position["exit_date"]:
-                exit_date = current_date
-                # Ensure the exit date is within the data range
-                if exit_date not in all_data[position["ticker"]].index:
-                    # Skip if exit date is not available (e.g., market holiday)
-                    continue
-                exit_price = all_data[position["ticker"]].loc[exit_date, "Close"]
-                position_return = (exit_price - position["entry_price"]) / position["entry_price"]
-                cash += position["shares"] * exit_price
-
-                trade_result = {
-                    "ticker": position["ticker"],
-                    "entry_date": position["entry_date"],
-                    "exit_date": exit_date,
-                    "entry_price": position["entry_price"],
-                    "exit_price": exit_price,
-                    "shares": position["shares"],
-                    "initial_value": position["shares"] * position["entry_price"],
-                    "final_value": position["shares"] * exit_price,
-                    "return": position_return,
-                }
-
-                closed_positions.append(trade_result)
-                position_sizer.update_trade_history(trade_result)
-                positions_to_remove.append(position)
-
-        for position in positions_to_remove:
-            active_positions.remove(position)
-
-        # Now, check if any trades are to be entered today
-        while trade_idx < total_trades and potential_trades[trade_idx]["entry_date"] == current_date:
-            trade = potential_trades[trade_idx]
-            trade_idx += 1
-
-            # Calculate position size
-            dollar_size, position_size_pct = position_sizer.calculate_position_size(
-                trade["ticker"],
-                all_data[trade["ticker"]].loc[:current_date],
-                all_data["^GSPC"].loc[:current_date],
-                portfolio_value,
-            )
-
-            # Check if we have enough cash
-            if dollar_size <= cash:
-                shares = dollar_size / trade["entry_price"]
-
-                new_position = {
-                    "ticker": trade["ticker"],
-                    "entry_date": trade["entry_date"],
-                    "exit_date": trade["exit_date"],
-                    "entry_price": trade["entry_price"],
-                    "shares": shares,
-                }
-
-                active_positions.append(new_position)
-                cash -= dollar_size
-                diagnostics["trades_executed"] += 1
-            else:
-                diagnostics["insufficient_cash"] += 1
-
-        # Calculate current portfolio value
-        current_portfolio_value = cash
-        for position in active_positions:
-            if current_date not in all_data[position["ticker"]].index:
-                # Skip if current date is not available (e.g., market holiday)
-                continue
-            current_price = all_data[position["ticker"]].loc[current_date, "Close"]
-            current_portfolio_value += position["shares"] * current_price
-
-        portfolio_value = current_portfolio_value
-        daily_portfolio_values.append(
-            {
-                "date": current_date,
-                "portfolio_value": portfolio_value,
-                "n_positions": len(active_positions),
-            }
-        )
+    report_backtest(diagnostics, portfolio_df, trades_df, stats["max_concurrent_positions"])
 
-        max_concurrent_positions = max(max_concurrent_positions, len(active_positions))
+    return portfolio_df, trades_df, diagnostics
 
-    # Prepare results
-    portfolio_df = pd.DataFrame(daily_portfolio_values)
-    trades_df = pd.DataFrame(closed_positions)
 
+def report_backtest(diagnostics, portfolio_df, trades_df, max_concurrent_positions):
     # Print diagnostic results
     print("\nSignal Flow Analysis:")
     print(f"Total TD Signals: {diagnostics['total_td_signals']}")
@@ -206,78 +176,136 @@ def backtest_portfolio(all_data, position_sizer):
     print_stats(portfolio_df, trades_df)
     print(f"Max Concurrent Positions: {max_concurrent_positions}")
 
-    return portfolio_df, trades_df, diagnostics
 
-def print_stats(portfolio_df, trades_df):
-    # Calculate strategy statistics
-    total_trades = len(trades_df)
-    if total_trades > 0:
-        win_rate = (trades_df["return"] > 0).mean() * 100
-        avg_return = trades_df["return"].mean() * 100
-        total_return = (
-            (portfolio_df["portfolio_value"].iloc[-1] - INITIAL_CAPITAL)
-            / INITIAL_CAPITAL
-            * 100
-        )
-
-        # Calculate Sharpe Ratio
-        daily_returns = portfolio_df["portfolio_value"].pct_change()
-        sharpe_ratio = np.sqrt(252) * daily_returns.mean() / daily_returns.std()
+def backtest_stats(portfolio_df, trades_df, initial_capital=INITIAL_CAPITAL):
+    """Summary statistics of a backtest as a dict (see metrics.portfolio_metrics)."""
+    return portfolio_metrics(portfolio_df, trades_df, initial_capital)
 
-        # Calculate max drawdown
-        rolling_max = portfolio_df["portfolio_value"].expanding().max()
-        drawdowns = (portfolio_df["portfolio_value"] - rolling_max) / rolling_max
-        max_drawdown = drawdowns.min() * 100
 
-        print("\nStrategy Results:")
-        print(f"Initial Capital: ${INITIAL_CAPITAL:,.2f}")
-        print(
-            f"Final Portfolio Value: ${portfolio_df['portfolio_value'].iloc[-1]:,.2f}"
-        )
-        print(f"Total Return: {total_return:.2f}%")
-        print(f"PnL: {portfolio_df['portfolio_value'].iloc[-1] - INITIAL_CAPITAL}")
-        print(f"Total Trades: {total_trades}")
-        print(f"Win Rate: {win_rate:.2f}%")
-        print(f"Average Trade Return: {avg_return:.2f}%")
-        print(f"Sharpe Ratio: {sharpe_ratio:.2f}")
-        print(f"Max Drawdown: {max_drawdown:.2f}%")
+def print_stats(portfolio_df, trades_df):
+    # Calculate strategy statistics
+    if len(trades_df) > 0:
+        print_metrics(backtest_stats(portfolio_df, trades_df), INITIAL_CAPITAL)
 
 
 def check_rising_closes(data, ticker, idx):
-    """Check if there are 3 consecutive rising closes."""
-    if idx + NUM_RISING_CLOSES >= len(data[ticker]):
+    """
+    Check if the SIGNAL_LOOKBACK_DAYS closes after the signal at idx rise
+    NUM_RISING_CLOSES times in a row, as find_candidate_trades does.
+    """
+    if idx + SIGNAL_LOOKBACK_DAYS >= len(data[ticker]):
         return False
-    closes = data[ticker]["Close"].iloc[idx : idx + NUM_RISING_CLOSES].values
+    closes = data[ticker]["Close"].iloc[idx + 1 : idx + SIGNAL_LOOKBACK_DAYS + 1].values
     return all(closes[i] > closes[i - 1] for i in range(1, len(closes)))
 
 
-def prepare_data(tickers):
-    """Download and prepare data for all tickers."""
+def prepare_data(
+    tickers, sparse=False, max_workers=8, batch_size=20, n_processes=None,
+    fetch_batch=yf_batch_download, use_cache=True, panel=False, panel_dtype=np.float64,
+):
+    """
+    Download and prepare data for all tickers.
+
+    Tickers are downloaded in batches by a pool of max_workers threads, and
+    each one is prepared as soon as it arrives while the rest are still
+    downloading. Tickers that fail to download are reported at the end.
+
+    With n_processes set, the indicators are computed on a process pool of
+    that size (see parallel_demark) instead of in this process. The result
+    is the same as the serial path.
+
+    With sparse=True the frames only get TD_Signal, and the setups are
+    returned as a second dict of per-ticker events tables (see
+    signals_demark) instead of one dense column per setup.
+
+    fetch_batch is the batch downloader (see data.download_universe), and
+    use_cache=False bypasses the on-disk cache.
+
+    With panel=True the frames come back stacked into a Panel (see panel),
+    which the backtest and the sizers take in place of the dict. Its prices
+    are panel_dtype; np.float32 is for runs short of memory.
+    """
     print("Downloading and preparing data...")
     all_data = {}
+    all_events = {}
+    failed = {}
+
+    downloads = download_universe(
+        tickers, START_DATE, END_DATE, fetch_batch,
+        cache=get_default_cache() if use_cache else None,
+        max_workers=max_workers, batch_size=batch_size,
+    )
+    downloaded = {}
+
+    # The pool (and its shared memory) is released even if the loop fails
+    with IndicatorPool(n_processes, kinds=(BUY_SETUP, SELL_SETUP)) if n_processes else nullcontext() as pool:
+        for ticker, data, error in tqdm(downloads, total=len(tickers)):
+            if data is None:
+                failed[ticker] = error
+                continue
+            if len(data) < 50:
+                continue
 
-    for ticker in tqdm(tickers):
-        data = yf_retry_download(ticker, START_DATE, END_DATE)
-        if data is None or len(data) < 50:
-            continue
+            if pool is not None:
+                pool.submit(ticker, data)
+                downloaded[ticker] = data
+                continue
+
+            data, events = prepare_ticker_data(data, sparse)
+            all_data[ticker] = data
+            if sparse:
+                all_events[ticker] = events
+
+        if pool is not None:
+            for ticker, events in pool.results():
+                data, events = prepare_ticker_data(downloaded.pop(ticker), sparse, events)
+                all_data[ticker] = data
+                if sparse:
+                    all_events[ticker] = events
+
+    if failed:
+        print(f"Failed to download {len(failed)} tickers:")
+        for ticker, error in failed.items():
+            print(f"  {ticker}: {error}")
+
+    # Downloads finish in any order, keep the order of tickers
+    all_data = {ticker: all_data[ticker] for ticker in tickers if ticker in all_data}
+    if panel:
+        all_data = Panel.from_frames(all_data, dtype=panel_dtype)
+    if sparse:
+        all_events = {ticker: all_events[ticker] for ticker in all_data}
+        return all_data, all_events
+    return all_data
 
-        data.reset_index(inplace=True)
-        data["Date"] = data["Date"].map(mdates.date2num)
 
-        # Compute TD Combo indicators
+def prepare_ticker_data(data, sparse=False, events=None):
+    """
+    Compute the TD indicators and TD_Signal for one downloaded frame.
+    events can be passed in when the setups were already computed elsewhere.
+    """
+    data = data.reset_index()
+    data["Date"] = data["Date"].map(mdates.date2num)
+
+    # Compute TD Combo indicators
+    if sparse:
+        if events is None:
+            events = identify_td_events(data, kinds=(BUY_SETUP, SELL_SETUP))
+        data = add_aggregated_countdown_signal(data, events)
+    elif events is not None:
+        data = events_to_wide(data, events, kinds=(BUY_SETUP, SELL_SETUP))
+        data = add_aggregated_countdown_signal(data)
+    else:
         data = identify_td_buy_setup(data)
         data = identify_td_sell_setup(data)
         #data = identify_td_buy_countdown(data)
 
         data = add_aggregated_countdown_signal(data)
 
-        # Convert date back to datetime
-        data["Date"] = pd.to_datetime(mdates.num2date(data["Date"]))
-        data.set_index("Date", inplace=True)
-
-        all_data[ticker] = data
+    # Convert date back to datetime
+    data["Date"] = pd.to_datetime(mdates.num2date(data["Date"]))
+    data.set_index("Date", inplace=True)
 
-    return all_data
+    return data, events
 
 
 class Position:
@@ -300,7 +328,7 @@ if __name__ == "__main__":
     tickers = get_sp500_tickers()
     #tickers = get_crypto_tickers()
     tickers.append("^GSPC")
-    all_data = prepare_data(tickers)
+    all_data = prepare_data(tickers, panel=True)
 
     position_sizer = FixedAmountPositionSizer(1000.)
     portfolio_df, trades_df, diagnostics = backtest_portfolio(all_data, position_sizer)
@@ -0,0 +1,231 @@
+import argparse
+import contextlib
+import io
+import json
+import platform
+import time
+import tracemalloc
+from functools import partial
+import pandas as pd
+import numpy as np
+import matplotlib.dates as mdates
+
+from setup_demark import identify_td_buy_setup, identify_td_sell_setup
+from countdown_demark import identify_td_buy_countdown, identify_td_sell_countdown
+from backtest import prepare_data, backtest_portfolio, START_DATE
+from sizing import FixedAmountPositionSizer
+
+"""
+    Offline benchmarks of the indicator engines and the backtest.
+
+    The data is a seeded synthetic universe (random walks, trending and
+    choppy tickers), so runs are reproducible and need no network. Each
+    stage is timed on its own (best of `repeat` runs) and then run once
+    more under tracemalloc for its peak memory. Results can be saved as a
+    JSON baseline and compared against a later run:
+
+        python benchmark.py --output baseline.json
+        python benchmark.py --baseline baseline.json
+"""
+
+REGIMES = ("random_walk", "trending", "choppy")
+MARKET_TICKER = "^GSPC"
+
+
+def synthetic_ohlcv(n_bars, regime="random_walk", seed=0, start_date=START_DATE, vol=0.02):
+    """
+    One ticker of daily OHLCV bars on business days from start_date, shaped
+    like a yfinance download (Date index, Open/High/Low/Close/Volume).
+
+    random_walk has no drift, trending drifts up or down by about half its
+    daily volatility every 10 bars, and choppy reverts to a fixed level.
+    """
+    rng = np.random.default_rng(seed)
+    shocks = rng.normal(0, vol, n_bars)
+    if regime == "random_walk":
+        log_close = np.cumsum(shocks)
+    elif regime == "trending":
+        drift = rng.choice([-1, 1]) * vol / 20
+        log_close = np.cumsum(shocks + drift)
+    elif regime == "choppy":
+        # AR(1) around 0, mean reverting within a few bars
+        log_close = np.empty(n_bars)
+        level = 0.0
+        for i, shock in enumerate(shocks):
+            level = 0.7 * level + shock
+            log_close[i] = level
+    else:
+        raise ValueError(f"Unknown regime {regime!r}, expected one of {REGIMES}")
+
+    close = 100 * np.exp(log_close)
+    open_ = np.concatenate([[close[0]], close[:-1]]) * (1 + rng.normal(0, vol / 4, n_bars))
+    high = np.maximum(open_, close) * (1 + np.abs(rng.normal(0, vol / 2, n_bars)))
+    low = np.minimum(open_, close) * (1 - np.abs(rng.normal(0, vol / 2, n_bars)))
+    volume = rng.lognormal(14, 0.5, n_bars).round()
+
+    dates = pd.bdate_range(start_date, periods=n_bars, name="Date")
+    return pd.DataFrame(
+        {"Open": open_, "High": high, "Low": low, "Close": close, "Volume": volume},
+        index=dates,
+    )
+
+
+def synthetic_universe(n_tickers, n_bars, seed=0, regimes=REGIMES):
+    """n_tickers synthetic tickers cycling through regimes, plus the market ticker."""
+    universe = {}
+    for i in range(n_tickers):
+        universe[f"SYN{i:04d}"] = synthetic_ohlcv(n_bars, regimes[i % len(regimes)], seed * 100_003 + i)
+    universe[MARKET_TICKER] = synthetic_ohlcv(n_bars, "random_walk", seed * 100_003 + n_tickers, vol=0.01)
+    return universe
+
+
+def fetch_synthetic(universe, symbols, start_date, end_date):
+    """A fetch_batch for prepare_data that serves the synthetic universe."""
+    return {symbol: universe[symbol] for symbol in symbols}, {}
+
+
+def _indicator_frames(universe):
+    frames = []
+    for data in universe.values():
+        data = data.reset_index()
+        data["Date"] = data["Date"].map(mdates.date2num)
+        frames.append(data)
+    return frames
+
+
+def _measure(run, repeat):
+    """Best wall time of repeat runs, then peak traced memory of one more."""
+    seconds = float("inf")
+    with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+        for _ in range(repeat):
+            start = time.perf_counter()
+            run()
+            seconds = min(seconds, time.perf_counter() - start)
+
+        tracemalloc.start()
+        try:
+            run()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+    return seconds, peak
+
+
+def run_benchmarks(n_tickers=50, n_bars=1000, seed=0, repeat=3, n_processes=None):
+    """
+    Time each stage on a synthetic universe. Returns a dict with the run's
+    parameters under "meta" and, for every stage, seconds, bars_per_second
+    and peak_memory_mb under "results".
+    """
+    universe = synthetic_universe(n_tickers, n_bars, seed)
+    frames = _indicator_frames(universe)
+    with_setups = [identify_td_sell_setup(identify_td_buy_setup(df)) for df in frames]
+    with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+        all_data = prepare_data(list(universe), fetch_batch=partial(fetch_synthetic, universe), use_cache=False)
+    n_total_bars = sum(len(df) for df in frames)
+
+    stages = {
+        "identify_td_buy_setup": lambda: [identify_td_buy_setup(df) for df in frames],
+        "identify_td_sell_setup": lambda: [identify_td_sell_setup(df) for df in frames],
+        "identify_td_buy_countdown": lambda: [identify_td_buy_countdown(df) for df in with_setups],
+        "identify_td_sell_countdown": lambda: [identify_td_sell_countdown(df) for df in with_setups],
+        "prepare_data": lambda: prepare_data(
+            list(universe), fetch_batch=partial(fetch_synthetic, universe),
+            use_cache=False, n_processes=n_processes,
+        ),
+        "backtest_portfolio": lambda: backtest_portfolio(all_data, FixedAmountPositionSizer(1000.)),
+    }
+
+    results = {}
+    for name, run in stages.items():
+        seconds, peak = _measure(run, repeat)
+        results[name] = {
+            "seconds": seconds,
+            "bars_per_second": n_total_bars / seconds,
+            "peak_memory_mb": peak / 2**20,
+        }
+
+    meta = {
+        "n_tickers": n_tickers,
+        "n_bars": n_bars,
+        "seed": seed,
+        "repeat": repeat,
+        "n_processes": n_processes,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "machine": platform.machine(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+    return {"meta": meta, "results": results}
+
+
+def save_baseline(report, path):
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2)
+
+
+def load_baseline(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def compare(baseline, report, tolerance=0.2):
+    """
+    Per-stage comparison of report against baseline as a DataFrame, with
+    the time ratio (current / baseline) and whether the stage got slower
+    by more than tolerance.
+    """
+    rows = []
+    for name, current in report["results"].items():
+        if name not in baseline["results"]:
+            continue
+        base = baseline["results"][name]
+        ratio = current["seconds"] / base["seconds"]
+        rows.append({
+            "stage": name,
+            "baseline_seconds": base["seconds"],
+            "seconds": current["seconds"],
+            "time_ratio": ratio,
+            "baseline_peak_mb": base["peak_memory_mb"],
+            "peak_memory_mb": current["peak_memory_mb"],
+            "regression": ratio > 1 + tolerance,
+        })
+    return pd.DataFrame(rows)
+
+
+def print_report(report):
+    meta = report["meta"]
+    print(f"\n{meta['n_tickers']} tickers x {meta['n_bars']} bars (seed {meta['seed']}):")
+    for name, result in report["results"].items():
+        print(
+            f"{name:28s} {result['seconds']:9.4f}s "
+            f"{result['bars_per_second']:14,.0f} bars/s "
+            f"{result['peak_memory_mb']:9.1f} MB peak"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline benchmarks of the indicators and backtest")
+    parser.add_argument("--tickers", type=int, default=50)
+    parser.add_argument("--bars", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--processes", type=int, default=None)
+    parser.add_argument("--output", help="save the results as a JSON baseline")
+    parser.add_argument("--baseline", help="compare against a saved JSON baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+
+    report = run_benchmarks(args.tickers, args.bars, args.seed, args.repeat, args.processes)
+    print_report(report)
+
+    if args.output:
+        save_baseline(report, args.output)
+        print(f"\nSaved baseline to {args.output}")
+    if args.baseline:
+        comparison = compare(load_baseline(args.baseline), report, args.tolerance)
+        print("\nAgainst baseline:")
+        print(comparison.to_string(index=False))
+        if comparison["regression"].any():
+            raise SystemExit(1)
@@ -0,0 +1,152 @@
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+import numpy as np
+
+from backtest import prepare_data, backtest_portfolio, INITIAL_CAPITAL
+from metrics import equity_metrics
+from sizing import FixedAmountPositionSizer
+from tickers import get_sp500_tickers
+
+"""
+    Bootstrap robustness of a backtest.
+
+    Resamples the daily returns of portfolio_df (or the P&L of the trades in
+    trades_df) into many equity paths, with blocks of consecutive steps to
+    keep some of the serial dependence, and reports confidence intervals of
+    Sharpe, max drawdown and final PnL over the paths.
+
+    Paths are generated as (paths x steps) matrices, chunk_size paths at a
+    time so memory stays bounded, and each chunk has its own seed spawned
+    from the base seed: results depend on the seed and chunk_size only, not
+    on how many processes ran the chunks.
+"""
+
+CHUNK_SIZE = 2_000
+METRICS = ("sharpe_ratio", "max_drawdown", "final_pnl")
+
+
+def block_indices(rng, n_obs, n_paths, n_steps, block_size=1):
+    """
+    (n_paths, n_steps) indices into n_obs observations, made of blocks of
+    block_size consecutive indices starting at uniform random positions
+    (moving block bootstrap; block_size=1 is the plain bootstrap).
+    """
+    block_size = min(block_size, n_obs)
+    n_blocks = -(-n_steps // block_size)
+    starts = rng.integers(0, n_obs - block_size + 1, size=(n_paths, n_blocks))
+    indices = starts[:, :, None] + np.arange(block_size)
+    return indices.reshape(n_paths, -1)[:, :n_steps]
+
+
+def path_stats(step_returns, periods_per_year, initial_capital=INITIAL_CAPITAL):
+    """
+    Sharpe, max drawdown (%) and final PnL of each row of a
+    (paths x steps) matrix of returns, as arrays over the paths.
+    """
+    equity = np.empty((len(step_returns), step_returns.shape[1] + 1))
+    equity[:, 0] = initial_capital
+    np.cumprod(1 + step_returns, axis=1, out=equity[:, 1:])
+    equity[:, 1:] *= initial_capital
+    metrics = equity_metrics(equity, initial_capital, periods_per_year)
+    return {
+        "sharpe_ratio": metrics["sharpe_ratio"],
+        "max_drawdown": metrics["max_drawdown"],
+        "final_pnl": metrics["pnl"],
+    }
+
+
+def _bootstrap_chunk(returns, n_paths, n_steps, block_size, periods_per_year, initial_capital, seed):
+    rng = np.random.default_rng(seed)
+    paths = returns[block_indices(rng, len(returns), n_paths, n_steps, block_size)]
+    return path_stats(paths, periods_per_year, initial_capital)
+
+
+def bootstrap_returns(
+    returns, n_paths=10_000, block_size=1, n_steps=None, periods_per_year=252,
+    initial_capital=INITIAL_CAPITAL, seed=0, chunk_size=CHUNK_SIZE, n_processes=None,
+):
+    """
+    Stats (see path_stats) of n_paths resampled paths of n_steps returns
+    (default: as many as given). Returns a dict of arrays over the paths.
+    """
+    returns = np.asarray(returns, dtype=float)
+    n_steps = len(returns) if n_steps is None else n_steps
+    sizes = [min(chunk_size, n_paths - lo) for lo in range(0, n_paths, chunk_size)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    args = [
+        (returns, size, n_steps, block_size, periods_per_year, initial_capital, chunk_seed)
+        for size, chunk_seed in zip(sizes, seeds)
+    ]
+
+    if n_processes:
+        with ProcessPoolExecutor(n_processes) as executor:
+            chunks = list(executor.map(_bootstrap_chunk, *zip(*args)))
+    else:
+        chunks = [_bootstrap_chunk(*chunk_args) for chunk_args in args]
+    return {metric: np.concatenate([chunk[metric] for chunk in chunks]) for metric in METRICS}
+
+
+def trade_returns(trades_df, initial_capital=INITIAL_CAPITAL):
+    """
+    Each trade's dollar P&L as a return on the capital of a path that
+    starts at initial_capital and books the trades in exit order.
+    """
+    pnl = (trades_df["final_value"] - trades_df["initial_value"]).to_numpy()
+    pnl = pnl[np.argsort(trades_df["exit_date"].to_numpy(), kind="stable")]
+    equity_before = initial_capital + np.concatenate([[0.0], np.cumsum(pnl)[:-1]])
+    return pnl / equity_before
+
+
+def confidence_intervals(stats, levels=(0.05, 0.95)):
+    """Mean, median and the given quantiles of every metric, one row each."""
+    rows = []
+    for metric, values in stats.items():
+        values = values[np.isfinite(values)]
+        row = {"metric": metric, "mean": values.mean(), "median": np.median(values)}
+        for level, quantile in zip(levels, np.quantile(values, levels)):
+            row[f"q{level:g}"] = quantile
+        rows.append(row)
+    return pd.DataFrame(rows).set_index("metric")
+
+
+def bootstrap_backtest(
+    portfolio_df, trades_df=None, method="daily", n_paths=10_000, block_size=20,
+    levels=(0.05, 0.95), seed=0, n_processes=None, initial_capital=INITIAL_CAPITAL,
+):
+    """
+    Confidence intervals of a backtest's Sharpe, max drawdown and final
+    PnL. method="daily" resamples blocks of the portfolio's daily returns,
+    method="trades" resamples the trades (Sharpe annualized at the
+    backtest's number of trades per year).
+    """
+    if method == "daily":
+        returns = portfolio_df["portfolio_value"].pct_change().to_numpy()[1:]
+        periods_per_year = 252
+    elif method == "trades":
+        returns = trade_returns(trades_df, initial_capital)
+        years = len(portfolio_df) / 252
+        periods_per_year = len(returns) / years
+    else:
+        raise ValueError(f"Unknown method {method!r}, expected 'daily' or 'trades'")
+
+    stats = bootstrap_returns(
+        returns, n_paths, block_size, periods_per_year=periods_per_year,
+        initial_capital=initial_capital, seed=seed, n_processes=n_processes,
+    )
+    return confidence_intervals(stats, levels)
+
+
+def print_confidence_intervals(intervals):
+    print("\nBootstrap Confidence Intervals:")
+    print(intervals.to_string(float_format=lambda x: f"{x:,.2f}"))
+
+
+if __name__ == "__main__":
+    tickers = get_sp500_tickers()
+    tickers.append("^GSPC")
+    all_data = prepare_data(tickers, panel=True)
+    portfolio_df, trades_df, diagnostics = backtest_portfolio(all_data, FixedAmountPositionSizer(1000.))
+
+    for method in ("daily", "trades"):
+        print(f"\nResampling {method}:")
+        print_confidence_intervals(bootstrap_backtest(portfolio_df, trades_df, method, n_paths=100_000, n_processes=4))
@@ -7,199 +7,175 @@ from utils_demark import plot_data, yf_retry_download
 from setup_demark import identify_td_sell_setup, identify_td_buy_setup
 
 MAX_TIMEDELTA = 50
+COUNTDOWN_LENGTH = 13
+# Sell countdown bars 11-13 use the relaxed Version II condition
+RELAXED_FROM_COUNT = 10
+
+
+def _next_beyond(values, eligible, greater):
+    """
+    Single forward pass: for every eligible bar, the first later eligible bar
+    whose value is strictly greater (or smaller) than it, -1 if none.
+
+    Bars still waiting for their next count sit on a monotonic stack, so each
+    bar is pushed and popped at most once.
+    """
+    n = len(values)
+    next_bar = np.full(n, -1, dtype=np.int64)
+    stack = np.empty(n, dtype=np.int64)
+    top = 0
+    values = values.tolist()
+    eligible = (eligible & ~np.isnan(np.asarray(values, dtype=float))).tolist()
+
+    for j in range(n):
+        if not eligible[j]:
+            continue
+        value = values[j]
+        if greater:
+            while top and values[stack[top - 1]] < value:
+                top -= 1
+                next_bar[stack[top]] = j
+        else:
+            while top and values[stack[top - 1]] > value:
+                top -= 1
+                next_bar[stack[top]] = j
+        stack[top] = j
+        top += 1
+
+    return next_bar
+
+
+def _first_eligible_from(eligible):
+    """For every bar, the first eligible bar at or after it, -1 if none."""
+    n = len(eligible)
+    positions = np.where(eligible, np.arange(n), n)
+    first = np.minimum.accumulate(positions[::-1])[::-1]
+    return np.where(first == n, -1, first)
+
+
+def find_td_countdowns(high, low, close, setup_start_bars, side, max_timedelta=MAX_TIMEDELTA):
+    """
+    Countdown engine for all setups at once.
+
+    Every countdown is a chain of bars where each bar is the first later bar
+    that qualifies given the previous count, so the qualifying "next bar" is
+    precomputed once for every bar and each setup just follows 13 pointers.
+
+    Returns (countdown_numbers, countdown_bars): the number each countdown
+    would get in the original loops (tests/reference_impl.py), and an
+    (n_countdowns, 13) array of the bars holding counts 1..13. Only countdowns reaching 13 within
+    max_timedelta bars of their 1 are returned.
+    """
+    high = np.asarray(high, dtype=float)
+    low = np.asarray(low, dtype=float)
+    close = np.asarray(close, dtype=float)
+    n = len(close)
+
+    # Bar-only part of the countdown conditions (everything except the
+    # comparison with the previous countdown bar)
+    qualifies = np.zeros(n, dtype=bool)
+    if side == "buy":
+        qualifies[2:] = (
+            (close[2:] <= low[:-2])
+            & (low[2:] < low[1:-1])
+            & (close[2:] < close[1:-1])
+        )
+        next_strict = _next_beyond(close, qualifies, greater=False)
+        # Buy countdowns use the same conditions all the way to 13
+        next_relaxed = next_strict
+    elif side == "sell":
+        qualifies[2:] = (
+            (close[2:] >= high[:-2])
+            & (high[2:] >= high[1:-1])
+            & (close[2:] > close[1:-1])
+        )
+        next_strict = _next_beyond(close, qualifies, greater=True)
+        # Higher high or higher close than the previous countdown bar
+        all_bars = np.ones(n, dtype=bool)
+        next_high = _next_beyond(high, all_bars, greater=True)
+        next_close = _next_beyond(close, all_bars, greater=True)
+        next_relaxed = np.where(
+            (next_high >= 0) & ((next_close < 0) | (next_high < next_close)),
+            next_high,
+            next_close,
+        )
+    else:
+        raise ValueError(f"Unknown countdown side: {side}")
+
+    first_qualifying = _first_eligible_from(qualifies)
+
+    setup_start_bars = np.asarray(setup_start_bars, dtype=np.int64)
+    countdown_bars = np.full((len(setup_start_bars), COUNTDOWN_LENGTH), -1, dtype=np.int64)
+    if n:
+        countdown_bars[:, 0] = first_qualifying[setup_start_bars]
+    for count in range(1, COUNTDOWN_LENGTH):
+        previous = countdown_bars[:, count - 1]
+        active = previous >= 0
+        step = next_strict if count < RELAXED_FROM_COUNT else next_relaxed
+        countdown_bars[active, count] = step[previous[active]]
+
+    # Every countdown reaching 1 uses up a number, completed or not
+    started = countdown_bars[:, 0] >= 0
+    countdown_numbers = np.cumsum(started)
+    completed = (countdown_bars[:, -1] >= 0) & (
+        countdown_bars[:, -1] - countdown_bars[:, 0] <= max_timedelta
+    )
+    return countdown_numbers[completed], countdown_bars[completed]
+
+
+def _setup_start_bars(df, prefix):
+    """Bar of the 1 for every 9 in the setup columns, in the order the loops see them."""
+    setup_columns = [col for col in df.columns if col.startswith(prefix)]
+    if not setup_columns:
+        return np.empty(0, dtype=np.int64)
+    setups = df[setup_columns].to_numpy()
+    # np.nonzero walks row-major: by bar, then by column order
+    nine_bars, nine_cols = np.nonzero(setups == 9)
+    start_bars = nine_bars - 8
+    valid = start_bars >= 0
+    valid[valid] = setups[start_bars[valid], nine_cols[valid]] == 1
+    return start_bars[valid]
+
+
+def countdown_columns_from_bars(n, countdown_numbers, countdown_bars, prefix):
+    """Expand countdown bars into dense 0-13 columns named prefix + number."""
+    countdown_columns = {}
+    counts = np.arange(1, COUNTDOWN_LENGTH + 1, dtype=float)
+    for countdown_num, bars in zip(countdown_numbers, countdown_bars):
+        values = np.zeros(n)
+        values[bars] = counts
+        countdown_columns[f"{prefix}{countdown_num}"] = values
+    return countdown_columns
+
 
 def identify_td_buy_countdown(df):
-    # Create a copy of the DataFrame to ensure we're not dealing with a view
     df = df.copy()
-
-    # Dictionary to keep track of active countdowns and their column names
-    countdown_columns = {}
-    current_countdown_num = 1
-
-    # Get all setup columns
-    setup_columns = [col for col in df.columns if col.startswith("TD_Buy_Setup_")]
-
-    for i in range(len(df)):
-        current_date = mdates.num2date(df["Date"][i]).strftime("%Y-%m-%d")
-
-        # Check for 9's across all setup columns
-        for setup_column in setup_columns:
-            if df[setup_column][i] == 9:
-                countdown = 0
-                previous_countdown_close = None
-                start_index = i - 8
-
-                # Verify setup sequence starts with 1
-                if start_index >= 0:  # Add boundary check
-                    if df[setup_column][start_index] == 1:
-                        countdown_started = False
-                        countdown_reached_13 = False
-                        countdown_values = np.zeros(len(df))
-                        countdown_start_index = None  # Track when countdown 1 occurs
-
-                        for j, bar in enumerate(range(start_index, len(df))):
-                            bar_date = mdates.num2date(df["Date"][bar]).strftime("%Y-%m-%d")
-                            if countdown < 13:
-                                if bar >= 2:
-                                    condition1 = df["Close"][bar] <= df["Low"][bar - 2]
-                                else:
-                                    condition1 = False
-
-                                if bar >= 1:
-                                    condition2 = df["Low"][bar] < df["Low"][bar - 1]
-                                    condition4 = df["Close"][bar] < df["Close"][bar - 1]
-                                else:
-                                    condition2 = False
-                                    condition4 = False
-
-                                if previous_countdown_close is not None:
-                                    condition3 = df["Close"][bar] < previous_countdown_close
-                                else:
-                                    condition3 = True
-
-                                if condition1 and condition2 and condition3 and condition4:
-                                    countdown += 1
-                                    countdown_values[bar] = countdown
-                                    previous_countdown_close = df["Close"][bar]
-
-                                    if countdown == 1:
-                                        countdown_started = True
-                                        countdown_start_index = bar  # Record when countdown 1 occurs
-                                        column_name = f"TD_Buy_Countdown_{current_countdown_num}"
-                                        countdown_columns[column_name] = countdown_values.copy()
-                                        current_countdown_num += 1
-
-                            """
-                            elif countdown >= 10 and countdown < 13:
-                                if bar >= 1:
-                                    condition5 = df["Close"][bar] < previous_countdown_close
-                                    if condition5:
-                                        countdown += 1
-                                        countdown_values[bar] = countdown
-                                        previous_countdown_close = df["Close"][bar]
-                            """
-
-                            if countdown == 13:
-                                #print(f"Reached a buy countdown 13 on {bar_date}")
-                                countdown_reached_13 = True
-
-                                # Check if the duration between 1 and 13 is less than or equal to 50 days
-                                days_between = bar - countdown_start_index
-                                if days_between <= MAX_TIMEDELTA:
-                                    countdown_columns[column_name] = countdown_values
-                                else:
-                                    # Remove the countdown if it took too long to complete
-                                    if column_name in countdown_columns:
-                                        del countdown_columns[column_name]
-                                break
-
-    # Add all countdown columns to the DataFrame
-    for column_name, values in countdown_columns.items():
-        if 13 in set(values):
-            df[column_name] = values
-
-    return df
+    countdown_numbers, countdown_bars = find_td_countdowns(
+        df["High"].to_numpy(),
+        df["Low"].to_numpy(),
+        df["Close"].to_numpy(),
+        _setup_start_bars(df, "TD_Buy_Setup_"),
+        "buy",
+    )
+    countdown_columns = countdown_columns_from_bars(
+        len(df), countdown_numbers, countdown_bars, "TD_Buy_Countdown_"
+    )
+    return df.assign(**countdown_columns)
 
 
 def identify_td_sell_countdown(df):
     df = df.copy()
-
-    countdown_columns = {}
-    current_countdown_num = 1
-
-    setup_columns = [col for col in df.columns if col.startswith("TD_Sell_Setup_")]
-
-    for i in range(len(df)):
-        current_date = mdates.num2date(df["Date"][i]).strftime("%Y-%m-%d")
-
-        # Check for 9's across all setup columns
-        for setup_column in setup_columns:
-            if df[setup_column][i] == 9:
-                countdown = 0
-                previous_countdown_close = None
-                start_index = i - 8
-
-                # Verify setup sequence starts with 1
-                if start_index >= 0:  # Add boundary check
-                    assert df[setup_column][start_index] == 1
-                    if df[setup_column][start_index] == 1:
-                        countdown_started = False
-                        countdown_reached_13 = False
-                        countdown_values = np.zeros(len(df))
-                        countdown_start_index = None  # Track when countdown 1 occurs
-
-                        for bar in range(start_index, len(df)):
-                            bar_date = mdates.num2date(df["Date"][bar]).strftime("%Y-%m-%d")
-                            # Different conditions for bars 1-10 vs 11-13
-                            if countdown < 10:
-                                # Version II conditions for bars 1-10
-                                if bar >= 2:
-                                    condition1 = df["Close"][bar] >= df["High"][bar - 2]
-                                else:
-                                    condition1 = False
-
-                                if bar >= 1:
-                                    condition2 = df["High"][bar] >= df["High"][bar - 1]
-                                    condition4 = df["Close"][bar] > df["Close"][bar - 1]
-                                else:
-                                    condition2 = False
-                                    condition4 = False
-
-                                if previous_countdown_close is not None:
-                                    condition3 = df["Close"][bar] > previous_countdown_close
-                                else:
-                                    condition3 = True
-
-                                if countdown == 0:
-                                    assert True #condition1 and condition2 and condition3 and condition4
-
-                                if condition1 and condition2 and condition3 and condition4:
-                                    countdown += 1
-                                    countdown_values[bar] = countdown
-                                    previous_countdown_close = df["Close"][bar]
-                                    previous_countdown_high = df["High"][bar]
-
-                                    if countdown == 1:
-                                        countdown_started = True
-                                        countdown_start_index = bar  # Record when countdown 1 occurs
-                                        column_name = f"TD_Sell_Countdown_{current_countdown_num}"
-                                        countdown_columns[column_name] = countdown_values.copy()
-                                        current_countdown_num += 1
-
-                            elif countdown >= 10 and countdown < 13:
-                                # Version II conditions for bars 11-13 (less strict)
-                                # Only need successive higher closes for bars 11-13
-                                condition5_v1 = df["High"][bar] > previous_countdown_high
-                                condition5_v2 = df["Close"][bar] > previous_countdown_close
-                                #condition5_v3 = df["High"][bar] > 
-                                condition5 = condition5_v1 or condition5_v2
-
-                                if condition5:
-                                    countdown += 1
-                                    countdown_values[bar] = countdown
-                                    previous_countdown_close = df["Close"][bar]
-                                    previous_countdown_high = df["High"][bar]
-
-                            if countdown == 13:
-                                print(f"Reached a sell countdown 13 on {bar_date}")
-                                countdown_reached_13 = True
-                                
-                                # Check if the duration between 1 and 13 is less than or equal to 50 days
-                                days_between = bar - countdown_start_index
-                                if days_between <= MAX_TIMEDELTA:
-                                    countdown_columns[column_name] = countdown_values
-                                #else:
-                                    #print(f"Discarding countdown sequence - took {days_between} days to complete")
-
-                                    del countdown_columns[column_name]
-                                break
-
-    # Add all countdown columns to the DataFrame
-    for column_name, values in countdown_columns.items():
-        if 13 in set(values):
-            df[column_name] = values
-
-    return df
+    countdown_numbers, countdown_bars = find_td_countdowns(
+        df["High"].to_numpy(),
+        df["Low"].to_numpy(),
+        df["Close"].to_numpy(),
+        _setup_start_bars(df, "TD_Sell_Setup_"),
+        "sell",
+    )
+    countdown_columns = countdown_columns_from_bars(
+        len(df), countdown_numbers, countdown_bars, "TD_Sell_Countdown_"
+    )
+    return df.assign(**countdown_columns)
 
 
 if __name__ == "__main__":
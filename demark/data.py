@@ -0,0 +1,305 @@
+import json
+import logging
+import os
+import re
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+
+"""
+    Persistent on-disk OHLCV cache.
+
+    Each symbol gets a directory with one .npy file per column (plus the
+    dates), memory-mapped on read, and a meta.json recording the date range
+    that has been fetched and when. Only the part of a request outside that
+    range is downloaded. Least recently used symbols are evicted once the
+    cache grows past max_bytes.
+
+    A symbol's last access is the modification time of its meta.json, so a
+    read only touches the file. The size and last access of every symbol
+    are scanned once per cache object and kept up to date on writes, so
+    filling the cache does not rescan it for every symbol.
+"""
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "demark")
+DEFAULT_MAX_BYTES = 2 * 1024**3
+DEFAULT_MAX_AGE = timedelta(hours=12)
+
+
+def _flatten_columns(data):
+    if isinstance(data.columns, pd.MultiIndex):
+        # yf.download returns (Price, Ticker) columns, even for one symbol
+        data = data.copy()
+        data.columns = data.columns.get_level_values(0)
+    return data
+
+
+def _merge(cached, fetched):
+    """Combine cached bars with newly fetched ones, the new bars winning."""
+    merged = pd.concat([df for df in [cached] + fetched if df is not None])
+    return merged[~merged.index.duplicated(keep="last")].sort_index()
+
+
+class OHLCVCache:
+    """
+    downloader(symbol, start, end) must return a DataFrame indexed by date
+    (end exclusive, like yf.download) or None when there is no data, so a
+    fake downloader can be plugged in to use the cache offline.
+    """
+    def __init__(self, cache_dir, downloader, max_bytes=DEFAULT_MAX_BYTES,
+                 max_age=DEFAULT_MAX_AGE, clock=time.time):
+        self.cache_dir = cache_dir
+        self.downloader = downloader
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.clock = clock
+        # symbol directory -> [last access, bytes], see _usage
+        self._index = None
+        self._total_bytes = 0
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def get(self, symbol, start_date, end_date):
+        """Bars for symbol in [start_date, end_date), or None if there are none."""
+        start = pd.Timestamp(start_date)
+        end = pd.Timestamp(end_date)
+        meta = self._read_meta(symbol)
+
+        if meta is None:
+            data = self._download(symbol, start, end)
+            if data is None:
+                return None
+            meta = self._write(symbol, data, start, end)
+        else:
+            meta = self._fill_gaps(symbol, meta, start, end)
+            self._touch(symbol)
+
+        return self._load(symbol, meta, start, end)
+
+    def covers(self, symbol, start_date, end_date):
+        """True if get() would be served without downloading anything."""
+        meta = self._read_meta(symbol)
+        if meta is None:
+            return False
+        return (
+            pd.Timestamp(meta["start"]) <= pd.Timestamp(start_date)
+            and pd.Timestamp(end_date) <= self._fresh_end(meta)
+        )
+
+    def put(self, symbol, data, start_date, end_date):
+        """Store bars downloaded elsewhere for [start_date, end_date)."""
+        start = pd.Timestamp(start_date)
+        end = pd.Timestamp(end_date)
+        data = _flatten_columns(data)
+        meta = self._read_meta(symbol)
+
+        if meta is not None:
+            cached_start = pd.Timestamp(meta["start"])
+            cached_end = pd.Timestamp(meta["end"])
+            # Only merge ranges that touch, so the cached range stays contiguous
+            if start <= cached_end and end >= cached_start:
+                cached = self._load(symbol, meta, cached_start, cached_end)
+                data = _merge(cached, [data])
+                start, end = min(start, cached_start), max(end, cached_end)
+
+        self._write(symbol, data, start, end)
+
+    def _download(self, symbol, start, end):
+        data = self.downloader(symbol, start.strftime("%Y-%m-%d"), end.strftime("%Y-%m-%d"))
+        if data is None or data.empty:
+            return None
+        return _flatten_columns(data)
+
+    def _fresh_end(self, meta):
+        """End of the cached range that can be trusted as complete."""
+        end = pd.Timestamp(meta["end"])
+        fetched_at = meta["fetched_at"]
+        if self.clock() - fetched_at <= self.max_age.total_seconds():
+            return end
+        # Bars from the day of the last fetch onwards may have been partial
+        fetched_day = pd.Timestamp(fetched_at, unit="s").normalize()
+        return min(end, fetched_day)
+
+    def _fill_gaps(self, symbol, meta, start, end):
+        cached_start = pd.Timestamp(meta["start"])
+        cached_end = self._fresh_end(meta)
+
+        new_start, new_end = cached_start, pd.Timestamp(meta["end"])
+        fetched = []
+        if start < cached_start:
+            data = self._download(symbol, start, cached_start)
+            if data is not None:
+                fetched.append(data)
+                new_start = start
+            else:
+                logging.warning(f"Could not extend cache for {symbol} back to {start.date()}")
+        if end > cached_end:
+            data = self._download(symbol, cached_end, end)
+            if data is not None:
+                fetched.append(data)
+            else:
+                # No bars yet (weekend, holiday, end in the future): the tail
+                # counts as fetched now, so it is only retried once it is stale
+                logging.info(f"No new bars for {symbol} up to {end.date()}")
+            new_end = max(new_end, end)
+
+        if not fetched:
+            if end > cached_end:
+                meta = dict(meta, end=new_end.strftime("%Y-%m-%d"), fetched_at=self.clock())
+                self._write_meta(symbol, meta)
+            return meta
+
+        cached = self._load(symbol, meta, cached_start, pd.Timestamp(meta["end"]))
+        return self._write(symbol, _merge(cached, fetched), new_start, new_end)
+
+    def _symbol_dir(self, symbol):
+        return os.path.join(self.cache_dir, re.sub(r"[^A-Za-z0-9._=^-]", "_", symbol))
+
+    def _read_meta(self, symbol):
+        path = os.path.join(self._symbol_dir(symbol), "meta.json")
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            return json.load(f)
+
+    def _write_meta(self, symbol, meta):
+        path = os.path.join(self._symbol_dir(symbol), "meta.json")
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, path)
+        self._touch(symbol)
+
+    def _touch(self, symbol):
+        """Mark symbol as accessed now."""
+        now = self.clock()
+        os.utime(os.path.join(self._symbol_dir(symbol), "meta.json"), (now, now))
+        if self._index is not None:
+            entry = self._index.get(os.path.basename(self._symbol_dir(symbol)))
+            if entry is not None:
+                entry[0] = now
+
+    def _write(self, symbol, data, start, end):
+        symbol_dir = self._symbol_dir(symbol)
+        os.makedirs(symbol_dir, exist_ok=True)
+
+        columns = [str(col) for col in data.columns]
+        arrays = {"Date": data.index.to_numpy()}
+        arrays.update({col: data[col].to_numpy() for col in columns})
+        for name, values in arrays.items():
+            tmp_path = os.path.join(symbol_dir, f"{name}.tmp.npy")
+            np.save(tmp_path, values)
+            os.replace(tmp_path, os.path.join(symbol_dir, f"{name}.npy"))
+
+        meta = {
+            "symbol": symbol,
+            "columns": columns,
+            "start": start.strftime("%Y-%m-%d"),
+            "end": end.strftime("%Y-%m-%d"),
+            "fetched_at": self.clock(),
+        }
+        self._write_meta(symbol, meta)
+        # The cache only grows on writes, so that is when to check its size
+        index = self._usage()
+        name = os.path.basename(symbol_dir)
+        size = sum(entry.stat().st_size for entry in os.scandir(symbol_dir))
+        self._total_bytes += size - index.get(name, [0, 0])[1]
+        index[name] = [self.clock(), size]
+        if self._total_bytes > self.max_bytes:
+            self._evict(keep=name)
+        return meta
+
+    def _load(self, symbol, meta, start, end):
+        symbol_dir = self._symbol_dir(symbol)
+        dates = np.load(os.path.join(symbol_dir, "Date.npy"), mmap_mode="r")
+        lo = np.searchsorted(dates, start.to_datetime64().astype(dates.dtype), side="left")
+        hi = np.searchsorted(dates, end.to_datetime64().astype(dates.dtype), side="left")
+        if lo >= hi:
+            return None
+
+        # Only the requested rows are copied out of the memory maps
+        columns = {
+            col: np.array(np.load(os.path.join(symbol_dir, f"{col}.npy"), mmap_mode="r")[lo:hi])
+            for col in meta["columns"]
+        }
+        index = pd.DatetimeIndex(np.array(dates[lo:hi]), name="Date")
+        return pd.DataFrame(columns, index=index)
+
+    def _usage(self):
+        """The index of every symbol's last access and size, scanned on first use."""
+        if self._index is None:
+            self._index = {}
+            self._total_bytes = 0
+            for entry in os.scandir(self.cache_dir):
+                meta_path = os.path.join(entry.path, "meta.json")
+                if not entry.is_dir() or not os.path.exists(meta_path):
+                    continue
+                size = sum(item.stat().st_size for item in os.scandir(entry.path))
+                self._index[entry.name] = [os.stat(meta_path).st_mtime, size]
+                self._total_bytes += size
+        return self._index
+
+    def _evict(self, keep):
+        """Drop least recently used symbols until the cache fits in max_bytes."""
+        index = self._usage()
+        for _, name in sorted((entry[0], name) for name, entry in index.items()):
+            if self._total_bytes <= self.max_bytes:
+                break
+            if name == keep:
+                continue
+            shutil.rmtree(os.path.join(self.cache_dir, name), ignore_errors=True)
+            self._total_bytes -= index.pop(name)[1]
+
+
+def download_universe(symbols, start_date, end_date, fetch_batch, cache=None,
+                      max_workers=8, batch_size=20):
+    """
+    Download many symbols concurrently, yielding (symbol, data, error) as
+    each one becomes available so callers can work on it while the rest are
+    still in flight. Results come in completion order, not symbol order.
+
+    fetch_batch(symbols, start_date, end_date) must return a pair of dicts
+    ({symbol: DataFrame}, {symbol: error message}). Symbols the cache already
+    covers are served from it, everything downloaded is stored in it.
+    """
+    to_fetch = []
+    cached = []
+    for symbol in symbols:
+        if cache is not None and cache.covers(symbol, start_date, end_date):
+            cached.append(symbol)
+        else:
+            to_fetch.append(symbol)
+
+    batches = [to_fetch[i : i + batch_size] for i in range(0, len(to_fetch), batch_size)]
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        # Downloads start right away, cached symbols are handed out meanwhile
+        futures = {
+            pool.submit(fetch_batch, batch, start_date, end_date): batch
+            for batch in batches
+        }
+
+        for symbol in cached:
+            data = cache.get(symbol, start_date, end_date)
+            yield symbol, data, None if data is not None else "No data in range"
+
+        for future in as_completed(futures):
+            batch = futures[future]
+            try:
+                results, errors = future.result()
+            except Exception as e:
+                for symbol in batch:
+                    yield symbol, None, str(e)
+                continue
+
+            for symbol in batch:
+                data = results.get(symbol)
+                if data is None or data.empty:
+                    yield symbol, None, errors.get(symbol, "Empty dataset received")
+                    continue
+                if cache is not None:
+                    cache.put(symbol, data, start_date, end_date)
+                yield symbol, _flatten_columns(data), None
@@ -0,0 +1,153 @@
+import pandas as pd
+import numpy as np
+
+"""
+    Portfolio metrics.
+
+    equity_metrics takes a NumPy equity curve, or a (runs x bars) batch of
+    curves on the same calendar, and computes every curve metric from one
+    set of returns and running maxima, as arrays over the runs. A sweep
+    stacks its runs and scores them all in one call (score_runs), a single
+    backtest is a batch of one (portfolio_metrics).
+
+    Returns, drawdowns and CAGR are in %, drawdown durations in bars,
+    turnover in multiples of the average equity per year.
+"""
+
+PERIODS_PER_YEAR = 252
+
+
+def equity_metrics(equity, initial_capital=None, periods_per_year=PERIODS_PER_YEAR):
+    """
+    Metrics of each row of equity (1-D for a single curve, which returns
+    floats). initial_capital defaults to the first value of each curve.
+    """
+    equity = np.asarray(equity, dtype=float)
+    single = equity.ndim == 1
+    equity = np.atleast_2d(equity)
+    n_bars = equity.shape[1]
+    start = equity[:, 0] if initial_capital is None else np.full(len(equity), float(initial_capital))
+    final = equity[:, -1]
+
+    returns = equity[:, 1:] / equity[:, :-1] - 1
+    running_max = np.maximum.accumulate(equity, axis=1)
+    underwater = equity < running_max
+    bars = np.arange(n_bars)
+    last_peak = np.maximum.accumulate(np.where(underwater, 0, bars), axis=1)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean = returns.mean(axis=1)
+        downside = np.sqrt((np.minimum(returns, 0) ** 2).mean(axis=1))
+        years = n_bars / periods_per_year
+        cagr = ((final / start) ** (1 / years) - 1) * 100
+        max_drawdown = ((equity - running_max) / running_max).min(axis=1) * 100
+        metrics = {
+            "final_value": final,
+            "pnl": final - start,
+            "total_return": (final - start) / start * 100,
+            "cagr": cagr,
+            "sharpe_ratio": np.sqrt(periods_per_year) * mean / returns.std(axis=1, ddof=1),
+            "sortino_ratio": np.sqrt(periods_per_year) * mean / downside,
+            "max_drawdown": max_drawdown,
+            "max_drawdown_duration": (bars - last_peak).max(axis=1),
+            "calmar_ratio": np.where(max_drawdown < 0, cagr / -max_drawdown, np.nan),
+        }
+    if single:
+        return {name: value[0].item() for name, value in metrics.items()}
+    return metrics
+
+
+def exposure(n_positions):
+    """% of bars with at least one open position, per row for a batch."""
+    return (np.asarray(n_positions) > 0).mean(axis=-1) * 100
+
+
+def trade_metrics(trades_df):
+    """Trade count, win rate and average return (%), and the dollar value traded."""
+    if len(trades_df) == 0:
+        return {"total_trades": 0, "win_rate": np.nan, "avg_return": np.nan, "traded_value": 0.0}
+    returns = trades_df["return"].to_numpy()
+    return {
+        "total_trades": len(trades_df),
+        "win_rate": (returns > 0).mean() * 100,
+        "avg_return": returns.mean() * 100,
+        "traded_value": float((trades_df["initial_value"] + trades_df["final_value"]).sum()),
+    }
+
+
+def turnover(traded_value, equity, periods_per_year=PERIODS_PER_YEAR):
+    """Dollar value traded per year over the average equity, per row for a batch."""
+    equity = np.asarray(equity, dtype=float)
+    years = equity.shape[-1] / periods_per_year
+    return np.asarray(traded_value) / years / equity.mean(axis=-1)
+
+
+def ticker_breakdown(trades_df):
+    """Trades, win rate (%), average return (%) and PnL of each ticker, by PnL."""
+    if len(trades_df) == 0:
+        return pd.DataFrame(columns=["trades", "win_rate", "avg_return", "pnl"])
+    trades = trades_df.assign(
+        win=trades_df["return"] > 0, pnl=trades_df["final_value"] - trades_df["initial_value"]
+    )
+    breakdown = trades.groupby("ticker").agg(
+        trades=("return", "size"),
+        win_rate=("win", "mean"),
+        avg_return=("return", "mean"),
+        pnl=("pnl", "sum"),
+    )
+    breakdown[["win_rate", "avg_return"]] *= 100
+    return breakdown.sort_values("pnl", ascending=False)
+
+
+def portfolio_metrics(portfolio_df, trades_df, initial_capital, periods_per_year=PERIODS_PER_YEAR):
+    """
+    All metrics of one backtest as a dict, with its per-ticker breakdown
+    DataFrame under "per_ticker".
+    """
+    equity = portfolio_df["portfolio_value"].to_numpy(dtype=float)
+    metrics = equity_metrics(equity, initial_capital, periods_per_year)
+    trades = trade_metrics(trades_df)
+    metrics.update(trades)
+    metrics["exposure"] = float(exposure(portfolio_df["n_positions"].to_numpy()))
+    metrics["turnover"] = float(turnover(trades["traded_value"], equity, periods_per_year))
+    metrics["per_ticker"] = ticker_breakdown(trades_df)
+    return metrics
+
+
+def score_runs(equities, n_positions, trades, initial_capital, periods_per_year=PERIODS_PER_YEAR):
+    """
+    Metrics of many backtests over the same calendar, one row per run:
+    equities and n_positions are (runs x bars), trades holds each run's
+    trade_metrics dict (or its trades_df).
+    """
+    equities = np.asarray(equities, dtype=float)
+    trades = [t if isinstance(t, dict) else trade_metrics(t) for t in trades]
+    table = pd.DataFrame(equity_metrics(equities, initial_capital, periods_per_year))
+    table = pd.concat([table, pd.DataFrame(trades)], axis=1)
+    table["exposure"] = exposure(n_positions)
+    table["turnover"] = turnover(table["traded_value"].to_numpy(), equities, periods_per_year)
+    return table
+
+
+def print_metrics(metrics, initial_capital, top_tickers=5):
+    print("\nStrategy Results:")
+    print(f"Initial Capital: ${initial_capital:,.2f}")
+    print(f"Final Portfolio Value: ${metrics['final_value']:,.2f}")
+    print(f"Total Return: {metrics['total_return']:.2f}%")
+    print(f"CAGR: {metrics['cagr']:.2f}%")
+    print(f"PnL: {metrics['pnl']}")
+    print(f"Total Trades: {metrics['total_trades']}")
+    print(f"Win Rate: {metrics['win_rate']:.2f}%")
+    print(f"Average Trade Return: {metrics['avg_return']:.2f}%")
+    print(f"Sharpe Ratio: {metrics['sharpe_ratio']:.2f}")
+    print(f"Sortino Ratio: {metrics['sortino_ratio']:.2f}")
+    print(f"Calmar Ratio: {metrics['calmar_ratio']:.2f}")
+    print(f"Max Drawdown: {metrics['max_drawdown']:.2f}%")
+    print(f"Max Drawdown Duration: {metrics['max_drawdown_duration']} bars")
+    print(f"Exposure: {metrics['exposure']:.2f}%")
+    print(f"Turnover: {metrics['turnover']:.2f}x per year")
+
+    per_ticker = metrics["per_ticker"]
+    if len(per_ticker) > 0:
+        print(f"\nBest Tickers:\n{per_ticker.head(top_tickers).to_string(float_format=lambda x: f'{x:,.2f}')}")
+        print(f"\nWorst Tickers:\n{per_ticker.tail(top_tickers).to_string(float_format=lambda x: f'{x:,.2f}')}")
@@ -0,0 +1,124 @@
+from collections import OrderedDict
+from collections.abc import Mapping
+import pandas as pd
+import numpy as np
+
+"""
+    Columnar multi-ticker container.
+
+    A Panel holds every field (Open, High, ..., TD_Signal) as one aligned
+    (dates x tickers) array over the sorted union of the tickers' trading
+    days, with a `valid` mask of where a ticker has a bar. Prices are NaN
+    and signals False where it has none.
+
+    It is also a read-only mapping of ticker -> DataFrame of that ticker's
+    own bars, so code written for prepare_data's {ticker: DataFrame} (the
+    sizers, find_potential_trades) runs on it unchanged, while the
+    simulator reads the arrays directly.
+"""
+
+PRICE_FIELDS = ("Open", "High", "Low", "Close", "Volume")
+SIGNAL_FIELDS = ("TD_Signal",)
+FRAME_CACHE_SIZE = 32  # per-ticker DataFrames kept, least recently used dropped first
+
+
+class Panel(Mapping):
+    def __init__(self, dates, tickers, fields, valid):
+        self.dates = pd.DatetimeIndex(dates)
+        self.tickers = list(tickers)
+        self.fields = dict(fields)
+        self.valid = valid
+        self._columns = {ticker: col for col, ticker in enumerate(self.tickers)}
+        self._frames = OrderedDict()
+
+    @classmethod
+    def from_frames(cls, all_data, fields=None, dtype=np.float64):
+        """
+        Stack {ticker: DataFrame} into a panel. fields defaults to the
+        PRICE_FIELDS and SIGNAL_FIELDS present in the first frame; boolean
+        columns stay bool, the rest are stored as dtype. np.float32 halves
+        the memory of a large universe, but rounds the prices, so backtest
+        results drift from the DataFrame path.
+        """
+        tickers = list(all_data)
+        frames = [all_data[ticker] for ticker in tickers]
+        if fields is None:
+            columns = frames[0].columns if frames else []
+            fields = [field for field in PRICE_FIELDS + SIGNAL_FIELDS if field in columns]
+
+        indexes = [frame.index for frame in frames]
+        dates = indexes[0].append(indexes[1:]).unique().sort_values() if frames else pd.DatetimeIndex([])
+        shape = (len(dates), len(tickers))
+
+        valid = np.zeros(shape, dtype=bool)
+        arrays = {}
+        for field in fields:
+            is_signal = bool(frames) and frames[0][field].dtype == bool
+            arrays[field] = np.zeros(shape, dtype=bool) if is_signal else np.full(shape, np.nan, dtype=dtype)
+
+        for col, frame in enumerate(frames):
+            rows = dates.get_indexer(frame.index)
+            valid[rows, col] = True
+            for field in fields:
+                arrays[field][rows, col] = frame[field].to_numpy()
+
+        return cls(dates, tickers, arrays, valid)
+
+    def field(self, name):
+        """The (dates x tickers) array of one field."""
+        return self.fields[name]
+
+    def row(self, date):
+        """Row of date in the calendar."""
+        return self.dates.get_loc(date)
+
+    def column(self, ticker):
+        return self._columns[ticker]
+
+    def slice_dates(self, start=None, end=None):
+        """Panel over the dates in [start, end], sharing memory with this one."""
+        rows = self.dates.slice_indexer(start, end)
+        return Panel(
+            self.dates[rows],
+            self.tickers,
+            {name: array[rows] for name, array in self.fields.items()},
+            self.valid[rows],
+        )
+
+    def select(self, tickers):
+        """Panel of a subset of the tickers, in the given order."""
+        cols = [self._columns[ticker] for ticker in tickers]
+        return Panel(
+            self.dates,
+            tickers,
+            {name: array[:, cols] for name, array in self.fields.items()},
+            self.valid[:, cols],
+        )
+
+    def __getitem__(self, ticker):
+        """DataFrame of ticker on the dates it has a bar."""
+        frame = self._frames.get(ticker)
+        if frame is not None:
+            self._frames.move_to_end(ticker)
+            return frame
+
+        col = self._columns[ticker]
+        rows = self.valid[:, col]
+        frame = pd.DataFrame(
+            {name: array[rows, col] for name, array in self.fields.items()},
+            index=pd.DatetimeIndex(self.dates[rows], name="Date"),
+        )
+        # Bounded, so iterating a memory-mapped universe does not load all of it
+        self._frames[ticker] = frame
+        if len(self._frames) > FRAME_CACHE_SIZE:
+            self._frames.popitem(last=False)
+        return frame
+
+    def __iter__(self):
+        return iter(self.tickers)
+
+    def __len__(self):
+        return len(self.tickers)
+
+    def __contains__(self, ticker):
+        return ticker in self._columns
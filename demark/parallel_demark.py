@@ -0,0 +1,95 @@
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import numpy as np
+
+from signals_demark import identify_td_events_arrays, ALL_KINDS
+
+"""
+    Process-pool indicator computation across tickers.
+
+    The High/Low/Close arrays of each ticker are written once into a shared
+    memory block that the worker reads in place, and only the small events
+    table (see signals_demark) is pickled back.
+"""
+
+SHARED_COLUMNS = ("High", "Low", "Close")
+
+
+def _events_from_shared(name, n_bars, kinds):
+    # Pool workers share the parent's resource tracker, so attaching here
+    # does not hand ownership of the block to this process
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        hlc = np.ndarray((len(SHARED_COLUMNS), n_bars), dtype=np.float64, buffer=shm.buf)
+        events = identify_td_events_arrays(hlc[0], hlc[1], hlc[2], kinds)
+        # The views must be gone before the block can be closed
+        del hlc
+        return events
+    finally:
+        shm.close()
+
+
+class IndicatorPool:
+    """
+    Compute TD events for many tickers on a ProcessPoolExecutor.
+
+    submit() tickers as their data becomes available, then results() yields
+    (ticker, events) in submission order, so the output does not depend on
+    which worker finishes first.
+    """
+    def __init__(self, n_processes, kinds=ALL_KINDS):
+        self.executor = ProcessPoolExecutor(max_workers=n_processes)
+        self.kinds = kinds
+        self.pending = []
+
+    def submit(self, ticker, data):
+        n_bars = len(data)
+        shm = shared_memory.SharedMemory(
+            create=True, size=max(1, len(SHARED_COLUMNS) * n_bars * 8)
+        )
+        try:
+            hlc = np.ndarray((len(SHARED_COLUMNS), n_bars), dtype=np.float64, buffer=shm.buf)
+            for row, column in enumerate(SHARED_COLUMNS):
+                hlc[row] = data[column].to_numpy(dtype=np.float64)
+            del hlc
+            future = self.executor.submit(_events_from_shared, shm.name, n_bars, self.kinds)
+        except BaseException:
+            # e.g. a missing column: the block is not pending yet, free it here
+            hlc = None
+            shm.close()
+            shm.unlink()
+            raise
+        self.pending.append((ticker, future, shm))
+
+    def results(self):
+        pending, self.pending = self.pending, []
+        released = 0
+        try:
+            for ticker, future, shm in pending:
+                try:
+                    events = future.result()
+                finally:
+                    released += 1
+                    shm.close()
+                    shm.unlink()
+                yield ticker, events
+        finally:
+            # Free the blocks of anything not consumed (e.g. after an error)
+            for ticker, future, shm in pending[released:]:
+                future.cancel()
+                shm.close()
+                shm.unlink()
+
+    def shutdown(self):
+        self.executor.shutdown(cancel_futures=True)
+        # Free the blocks of tickers whose results were never read
+        pending, self.pending = self.pending, []
+        for ticker, future, shm in pending:
+            shm.close()
+            shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
@@ -0,0 +1,251 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import matplotlib.dates as mdates
+from matplotlib.collections import LineCollection
+from matplotlib.dates import DateFormatter, AutoDateLocator
+from matplotlib.figure import Figure
+
+from signals_demark import (
+    events_from_wide, ALL_KINDS, BUY_SETUP, SELL_SETUP, BUY_COUNTDOWN, SELL_COUNTDOWN,
+)
+
+"""
+    Batched OHLC chart renderer.
+
+    All high-low lines and open/close ticks are one LineCollection, and the
+    counts are drawn from the sparse events table with one scatter of text
+    markers per (count, color) instead of one ax.text per count. Above
+    max_bars visible bars, consecutive bars are merged into one and only
+    the completed counts (setup 9s, countdown 13s) are labelled; zooming in
+    redraws the visible range at full detail.
+"""
+
+MAX_BARS = 600
+TICK_WIDTH = 0.2  # days, open tick to the left and close tick to the right
+LABEL_SIZE = 12
+
+SETUP_COLOR = "green"
+# Dark to light purple for buy countdowns, dark to light blue for sell countdowns
+PURPLE_SHADES = ["#800080", "#9932CC", "#BA55D3", "#D8BFD8", "#DDA0DD"]
+BLUE_SHADES = ["#00008B", "#0000CD", "#4169E1", "#6495ED", "#87CEEB"]
+
+COMPLETED_COUNTS = {BUY_SETUP: 9, SELL_SETUP: 9, BUY_COUNTDOWN: 13, SELL_COUNTDOWN: 13}
+ABOVE_BAR_KINDS = (BUY_SETUP, SELL_SETUP)
+KIND_SHADES = {
+    BUY_SETUP: [SETUP_COLOR],
+    SELL_SETUP: [SETUP_COLOR],
+    BUY_COUNTDOWN: PURPLE_SHADES,
+    SELL_COUNTDOWN: BLUE_SHADES,
+}
+
+
+def chart_arrays(df):
+    """Date numbers and Open, High, Low, Close arrays of df (Date column or index)."""
+    dates = np.asarray(df["Date"] if "Date" in df.columns else df.index)
+    if np.issubdtype(dates.dtype, np.datetime64):
+        dates = mdates.date2num(dates)
+    ohlc = [df[column].to_numpy(dtype=float) for column in ("Open", "High", "Low", "Close")]
+    return (dates.astype(float), *ohlc)
+
+
+def downsample_ohlc(dates, open_, high, low, close, max_bars=MAX_BARS):
+    """
+    Merge every `factor` consecutive bars into one so at most max_bars are
+    left: first open, highest high, lowest low, last close, first date.
+    Returns (dates, open, high, low, close, factor).
+    """
+    n_bars = len(dates)
+    factor = max(1, -(-n_bars // max_bars))
+    if factor == 1:
+        return dates, open_, high, low, close, 1
+    starts = np.arange(0, n_bars, factor)
+    ends = np.minimum(starts + factor, n_bars) - 1
+    return (
+        dates[starts],
+        open_[starts],
+        np.maximum.reduceat(high, starts),
+        np.minimum.reduceat(low, starts),
+        close[ends],
+        factor,
+    )
+
+
+def ohlc_segments(dates, open_, high, low, close, tick_width=TICK_WIDTH):
+    """(3 * n_bars, 2, 2) line segments: high-low line, open tick, close tick."""
+    high_low = np.stack([np.column_stack([dates, low]), np.column_stack([dates, high])], axis=1)
+    open_tick = np.stack([np.column_stack([dates - tick_width, open_]), np.column_stack([dates, open_])], axis=1)
+    close_tick = np.stack([np.column_stack([dates, close]), np.column_stack([dates + tick_width, close])], axis=1)
+    return np.concatenate([high_low, open_tick, close_tick])
+
+
+def label_positions(events, dates, high, low, text_offset, factor=1, first_bar=0, n_bars=None):
+    """
+    Where to write each count of events over bars drawn with dates/high/low
+    (the n_bars bars from first_bar, after downsample_ohlc by factor;
+    n_bars is required when factor > 1). Setups go
+    above the high and countdowns below the low, stacked by the order of
+    their sequence like the TD_*_N columns. With factor > 1 only completed
+    counts are kept.
+
+    Returns a dict of (count, color) -> (x, y) arrays.
+    """
+    kinds = events["kind"].to_numpy()
+    sequence_ids = events["sequence_id"].to_numpy()
+    bars = events["bar_index"].to_numpy() - first_bar
+    counts = events["count"].to_numpy()
+    if n_bars is None:
+        if factor > 1:
+            raise ValueError("n_bars is needed for downsampled bars")
+        n_bars = len(dates)
+    visible = (bars >= 0) & (bars < n_bars)
+
+    positions = {}
+    for kind, shades in KIND_SHADES.items():
+        of_kind = kinds == kind
+        if not of_kind.any():
+            continue
+        # Rank of each sequence among those of this kind, as the column index
+        _, ranks = np.unique(sequence_ids[of_kind], return_inverse=True)
+        rows = visible[of_kind]
+        if factor > 1:
+            rows &= counts[of_kind] == COMPLETED_COUNTS[kind]
+        ranks = ranks[rows]
+        bins = bars[of_kind][rows] // factor
+        kind_counts = counts[of_kind][rows]
+
+        x = dates[bins]
+        if kind in ABOVE_BAR_KINDS:
+            y = high[bins] + text_offset * (ranks + 1)
+        else:
+            y = low[bins] - text_offset * (ranks + 1)
+
+        shade = ranks % len(shades)
+        for shade_idx, count in set(zip(shade.tolist(), kind_counts.tolist())):
+            rows = (shade == shade_idx) & (kind_counts == count)
+            key = (count, shades[shade_idx])
+            xs, ys = positions.get(key, ((), ()))
+            positions[key] = (np.concatenate([xs, x[rows]]), np.concatenate([ys, y[rows]]))
+    return positions
+
+
+class OHLCChart:
+    """
+    OHLC bars and TD counts of df on ax. events defaults to the TD_*_N
+    columns of df. Redraws the visible range when the x limits change.
+    """
+    def __init__(self, ax, df, events=None, kinds=ALL_KINDS, max_bars=MAX_BARS):
+        self.ax = ax
+        self.dates, self.open, self.high, self.low, self.close = chart_arrays(df)
+        self.events = events_from_wide(df, kinds) if events is None else events
+        self.max_bars = max_bars
+        self.visible = None
+        self.labels = []
+
+        # 2% of total price range for vertical spacing
+        self.text_offset = (self.high.max() - self.low.min()) * 0.02
+        self.bars = LineCollection([], colors="black", linewidths=1)
+        ax.add_collection(self.bars)
+
+        n_levels = 1
+        if len(self.events):
+            n_levels += self.events.groupby("kind")["sequence_id"].nunique().max()
+        padding = self.text_offset * (n_levels + 1)
+        ax.set_xlim(self.dates[0] - 1, self.dates[-1] + 1)
+        ax.set_ylim(self.low.min() - padding, self.high.max() + padding)
+
+        self.draw(0, len(self.dates))
+        ax.callbacks.connect("xlim_changed", self._on_xlim_changed)
+
+    def draw(self, lo, hi):
+        """Render bars lo:hi, downsampled to at most max_bars."""
+        if self.visible == (lo, hi):
+            return
+        self.visible = (lo, hi)
+
+        dates, open_, high, low, close, factor = downsample_ohlc(
+            self.dates[lo:hi], self.open[lo:hi], self.high[lo:hi],
+            self.low[lo:hi], self.close[lo:hi], self.max_bars,
+        )
+        self.bars.set_segments(ohlc_segments(dates, open_, high, low, close, TICK_WIDTH * factor))
+
+        for label in self.labels:
+            label.remove()
+        self.labels = []
+        positions = label_positions(self.events, dates, high, low, self.text_offset, factor, lo, hi - lo)
+        for (count, color), (x, y) in positions.items():
+            self.labels.append(self.ax.scatter(
+                x, y, s=LABEL_SIZE ** 2 * len(str(count)),
+                marker=f"${count}$", color=color, linewidths=0,
+            ))
+
+    def _on_xlim_changed(self, ax):
+        xmin, xmax = ax.get_xlim()
+        lo = max(0, np.searchsorted(self.dates, xmin) - 1)
+        hi = min(len(self.dates), np.searchsorted(self.dates, xmax, side="right") + 1)
+        if hi > lo:
+            self.draw(lo, hi)
+
+
+def format_chart(ax, title):
+    # Format x-axis dates
+    ax.xaxis.set_major_locator(AutoDateLocator())
+    ax.xaxis.set_major_formatter(DateFormatter("%Y-%m-%d"))
+    for label in ax.get_xticklabels():
+        label.set_rotation(45)
+
+    # Set labels and title
+    ax.set_xlabel("Date")
+    ax.set_ylabel("Price")
+    ax.set_title(title)
+
+
+def _save_chart_batch(charts, output_dir, dpi):
+    # One figure for the whole batch, cleared between charts
+    fig = Figure(figsize=(15, 7))
+    ax = fig.add_subplot()
+    paths = []
+    for ticker, (df, events, title) in charts.items():
+        ax.clear()
+        OHLCChart(ax, df, events)
+        format_chart(ax, title)
+        fig.tight_layout()
+        path = os.path.join(output_dir, f"{ticker}.png")
+        fig.savefig(path, dpi=dpi)
+        paths.append(path)
+    return paths
+
+
+def save_charts(all_data, output_dir, all_events=None, n_processes=None, dpi=100, batch_size=25):
+    """
+    Write one PNG per ticker of all_data into output_dir, without a display.
+    all_events optionally gives the sparse events of each ticker (see
+    prepare_data(sparse=True)). With n_processes the batches of batch_size
+    tickers are rendered on a process pool. Returns the written paths.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    all_events = all_events or {}
+    charts = {
+        ticker: (df, all_events.get(ticker), ticker)
+        for ticker, df in all_data.items()
+    }
+    tickers = list(charts)
+    batches = [
+        {ticker: charts[ticker] for ticker in tickers[i : i + batch_size]}
+        for i in range(0, len(tickers), batch_size)
+    ]
+
+    if not n_processes:
+        return [path for batch in batches for path in _save_chart_batch(batch, output_dir, dpi)]
+    with ProcessPoolExecutor(n_processes) as executor:
+        futures = [executor.submit(_save_chart_batch, batch, output_dir, dpi) for batch in batches]
+        return [path for future in futures for path in future.result()]
+
+
+if __name__ == "__main__":
+    from backtest import prepare_data
+    from tickers import get_sp500_tickers
+
+    all_data, all_events = prepare_data(get_sp500_tickers(), sparse=True)
+    paths = save_charts(all_data, "charts", all_events, n_processes=os.cpu_count())
+    print(f"Wrote {len(paths)} charts to charts/")
@@ -0,0 +1,163 @@
+import numpy as np
+import pandas as pd
+
+from panel import Panel
+from trading_calendar import schedule_exits, exit_buckets, NO_EXIT
+
+"""
+    Event-driven, array-backed portfolio simulator.
+
+    All closes live in one (dates x tickers) array over the union of the
+    tickers' dates. Open positions are stored as parallel arrays (struct of
+    arrays). Every exit row is known before the run (see trading_calendar)
+    and executed positions go into that row's bucket, so the simulation
+    only stops on rows where something may be entered or exited and values
+    every stretch of rows in between with one matrix product.
+"""
+
+
+def align_closes(all_data):
+    """
+    Stack the Close of every ticker into one (dates x tickers) array over the
+    sorted union of all dates, NaN where a ticker has no bar. A Panel
+    already is laid out that way.
+    """
+    if isinstance(all_data, Panel):
+        # No copy, the array may be memory-mapped (see store)
+        return all_data.dates, all_data.tickers, all_data.field("Close")
+
+    tickers = list(all_data)
+    indexes = [all_data[ticker].index for ticker in tickers]
+    dates = indexes[0].append(indexes[1:]).unique().sort_values()
+
+    close = np.full((len(dates), len(tickers)), np.nan)
+    for col, ticker in enumerate(tickers):
+        rows = dates.get_indexer(all_data[ticker].index)
+        close[rows, col] = all_data[ticker]["Close"].to_numpy()
+    return dates, tickers, close
+
+
+def simulate_portfolio(
+    all_data, potential_trades, position_sizer, initial_capital, holding_bars=None, prepare_sizer=True
+):
+    """
+    Run the portfolio over potential_trades (sorted by entry_date), with the
+    same rules as the original per-date loop (backtest_portfolio_reference
+    in tests/reference_impl.py):
+
+    - exits are processed before entries, in the order positions were opened
+    - a position exits on the first date on or after its exit_date where its
+      ticker has a bar, at that close (or, with holding_bars, on the
+      holding_bars-th bar of its ticker after the entry)
+    - a trade is sized with the previous date's portfolio value and skipped
+      if there is not enough cash
+    - positions are valued at the day's close and count as 0 on dates their
+      ticker has no bar
+
+    Pass prepare_sizer=False when position_sizer was already prepared on
+    data covering all_data, e.g. the full history of a window.
+
+    Returns (portfolio_df, trades_df, stats) where stats counts
+    trades_executed, insufficient_cash and max_concurrent_positions.
+    """
+    if prepare_sizer:
+        position_sizer.prepare(all_data)
+    dates, tickers, close = align_closes(all_data)
+    column_of = {ticker: col for col, ticker in enumerate(tickers)}
+    n_dates = len(dates)
+
+    n_trades = len(potential_trades)
+    entry_rows = dates.get_indexer([trade["entry_date"] for trade in potential_trades])
+    trade_cols = [column_of[trade["ticker"]] for trade in potential_trades]
+    exit_rows = schedule_exits(
+        dates, close, trade_cols, entry_rows,
+        [trade["exit_date"] for trade in potential_trades], holding_bars,
+    )
+    # The only rows where anything can happen
+    event_rows = np.union1d(entry_rows, exit_rows[exit_rows != NO_EXIT])
+
+    # One slot per potential trade, filled when the trade is executed
+    pos_col = np.zeros(n_trades, dtype=np.int64)
+    pos_shares = np.zeros(n_trades)
+    pos_entry_price = np.zeros(n_trades)
+    active = np.zeros(n_trades, dtype=bool)
+    active_slots = np.flatnonzero(active)
+
+    portfolio_values = np.empty(n_dates)
+    n_positions = np.zeros(n_dates, dtype=np.int64)
+    exits = exit_buckets(n_dates)  # slots exiting on each row, in entry order
+    closed_positions = []
+    stats = {"trades_executed": 0, "insufficient_cash": 0}
+
+    cash = initial_capital
+    trade_idx = 0
+    valued_to = 0
+
+    def value_rows(lo, hi):
+        # Only the rows and columns held are read, close can stay on disk
+        held = np.nan_to_num(close[lo:hi][:, pos_col[active_slots]].astype(float))
+        portfolio_values[lo:hi] = cash + held @ pos_shares[active_slots]
+        n_positions[lo:hi] = len(active_slots)
+
+    for row in event_rows:
+        # Nothing happens between events, value that stretch in one go
+        value_rows(valued_to, row)
+        current_date = dates[row]
+
+        for slot in exits[row]:
+            trade = potential_trades[slot]
+            exit_price = float(close[row, pos_col[slot]])
+            shares = pos_shares[slot]
+            cash += shares * exit_price
+
+            trade_result = {
+                "ticker": trade["ticker"],
+                "entry_date": trade["entry_date"],
+                "exit_date": current_date,
+                "entry_price": trade["entry_price"],
+                "exit_price": exit_price,
+                "shares": shares,
+                "initial_value": shares * trade["entry_price"],
+                "final_value": shares * exit_price,
+                "return": (exit_price - trade["entry_price"]) / trade["entry_price"],
+            }
+            closed_positions.append(trade_result)
+            position_sizer.update_trade_history(trade_result)
+            active[slot] = False
+        exits[row] = []
+
+        portfolio_value = portfolio_values[row - 1] if row > 0 else initial_capital
+        while trade_idx < n_trades and entry_rows[trade_idx] == row:
+            slot = trade_idx
+            trade = potential_trades[slot]
+            trade_idx += 1
+
+            dollar_size, position_size_pct = position_sizer.position_size_on(
+                trade["ticker"], current_date, portfolio_value
+            )
+            if dollar_size <= cash:
+                pos_col[slot] = trade_cols[slot]
+                pos_shares[slot] = dollar_size / trade["entry_price"]
+                pos_entry_price[slot] = trade["entry_price"]
+                active[slot] = True
+                cash -= dollar_size
+                stats["trades_executed"] += 1
+                if exit_rows[slot] != NO_EXIT:
+                    exits[exit_rows[slot]].append(slot)
+            else:
+                stats["insufficient_cash"] += 1
+
+        active_slots = np.flatnonzero(active)
+        value_rows(row, row + 1)
+        valued_to = row + 1
+
+    value_rows(valued_to, n_dates)
+
+    portfolio_df = pd.DataFrame({
+        "date": dates,
+        "portfolio_value": portfolio_values,
+        "n_positions": n_positions,
+    })
+    trades_df = pd.DataFrame(closed_positions)
+    stats["max_concurrent_positions"] = int(n_positions.max()) if n_dates else 0
+    return portfolio_df, trades_df, stats
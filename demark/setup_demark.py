@@ -1,120 +1,76 @@
 import pandas as pd
 import numpy as np
-import matplotlib.dates as mdates
 
 
-def identify_td_sell_setup(df):
-    # Create a copy of the DataFrame to ensure we're not dealing with a view
-    df = df.copy()
-
-    # Dictionary to keep track of active setups and their column names
+SETUP_LENGTH = 9
+SETUP_COUNTS = np.arange(1, SETUP_LENGTH + 1, dtype=float)
+
+
+def find_td_setups(close, side):
+    """
+    Vectorized setup engine working on the raw Close array.
+
+    Every price flip gets a setup number (in flip order, like the original
+    loops in tests/reference_impl.py), but only setups whose run of 4-bar
+    comparisons reaches 9 are returned. Returns (setup_numbers, start_bars)
+    where start_bars is the bar holding the count of 1.
+    """
+    close = np.asarray(close, dtype=float)
+    n = len(close)
+
+    # Bars that continue a setup (count) and bars that are the opposite
+    # comparison (first bar of a flip), both relative to close 4 bars before
+    continues = np.zeros(n, dtype=bool)
+    opposite = np.zeros(n, dtype=bool)
+    if side == "sell":
+        continues[4:] = close[4:] > close[:-4]
+        opposite[4:] = close[4:] < close[:-4]
+    elif side == "buy":
+        continues[4:] = close[4:] < close[:-4]
+        opposite[4:] = close[4:] > close[:-4]
+    else:
+        raise ValueError(f"Unknown setup side: {side}")
+
+    # Price flips are checked on bars 4 .. n-5, same range as the loops
+    candidates = np.arange(4, n - 4)
+    flips = candidates[opposite[candidates] & continues[candidates + 1]]
+    setup_numbers = np.arange(1, len(flips) + 1)
+
+    # A setup completes if bars flip+1 .. flip+9 all continue it
+    run_sums = np.concatenate(([0], np.cumsum(continues)))
+    completed = np.zeros(len(flips), dtype=bool)
+    in_range = flips + SETUP_LENGTH <= n - 1
+    starts = flips[in_range] + 1
+    completed[in_range] = (
+        run_sums[starts + SETUP_LENGTH] - run_sums[starts] == SETUP_LENGTH
+    )
+
+    return setup_numbers[completed], flips[completed] + 1
+
+
+def setup_columns_from_starts(n, setup_numbers, start_bars, prefix):
+    """Expand setup start bars into dense 0-9 columns named prefix + number."""
     setup_columns = {}
-    current_setup_num = 1
-
-    for i in range(4, len(df) - 4):
-        current_date = mdates.num2date(df["Date"][i]).strftime("%Y-%m-%d")
-
-        # Check for Bullish TD Price Flip:
-        # First bar's close must be LESS THAN close 4 bars before
-        # Second bar's close must be GREATER THAN close 4 bars before
-        bullish_price_flip = (
-            df["Close"][i] < df["Close"][i - 4]
-            and df["Close"][i + 1] > df["Close"][i + 1 - 4]
-        )
-
-        if bullish_price_flip:
-            count = 0
-            setup_started = False
-            setup_reached_9 = False
-            setup_values = np.zeros(len(df))
-
-            # Start counting from the bar AFTER the flip is complete i+2 <--
-            # no??
-            for bar in range(i + 1, len(df)):
-                bar_date = mdates.num2date(df["Date"][bar]).strftime("%Y-%m-%d")
+    for setup_num, start in zip(setup_numbers, start_bars):
+        values = np.zeros(n)
+        values[start : start + SETUP_LENGTH] = SETUP_COUNTS
+        setup_columns[f"{prefix}{setup_num}"] = values
+    return setup_columns
 
-                if df["Close"][bar] > df["Close"][bar - 4]:
-                    count += 1
-                    setup_values[bar] = count
 
-                    if count == 1:
-                        setup_started = True
-                        column_name = f"TD_Sell_Setup_{current_setup_num}"
-                        setup_columns[column_name] = setup_values.copy()
-                        current_setup_num += 1
-
-                    if count == 9:
-                        setup_reached_9 = True
-                        setup_columns[column_name] = setup_values
-                        break
-                else:
-                    break
-
-    # Add all setup columns to the DataFrame
-    for column_name, values in setup_columns.items():
-        if 9 in set(values):
-            df[column_name] = values
-
-    return df
+def identify_td_sell_setup(df):
+    df = df.copy()
+    setup_numbers, start_bars = find_td_setups(df["Close"].to_numpy(), "sell")
+    setup_columns = setup_columns_from_starts(
+        len(df), setup_numbers, start_bars, "TD_Sell_Setup_"
+    )
+    return df.assign(**setup_columns)
 
 
 def identify_td_buy_setup(df):
-    # Create a copy of the DataFrame to ensure we're not dealing with a view
     df = df.copy()
-
-    # Dictionary to keep track of active setups and their column names
-    setup_columns = {}
-    current_setup_num = 1
-
-    for i in range(4, len(df) - 4):
-        current_date = mdates.num2date(df["Date"][i]).strftime("%Y-%m-%d")
-        
-        # Prevent index out of bounds
-        if i + 1 >= len(df):
-            break
-
-        # Check for Bearish TD Price Flip
-        bearish_price_flip = (
-            df["Close"][i] > df["Close"][i - 4]
-            and df["Close"][i + 1] < df["Close"][i + 1 - 4]
-        )
-
-        if bearish_price_flip:
-            count = 0
-            setup_started = False
-            setup_reached_9 = False
-            setup_values = np.zeros(len(df))
-
-            # Start counting from the bar AFTER the flip is complete (i+2)
-            for bar in range(i + 1, len(df)):
-                bar_date = mdates.num2date(df["Date"][bar]).strftime("%Y-%m-%d")
-
-                if bar - 4 >= 0:
-                    if df["Close"][bar] < df["Close"][bar - 4]:
-                        count += 1
-                        setup_values[bar] = count
-
-                        if count == 1:
-                            setup_started = True
-                            column_name = f"TD_Buy_Setup_{current_setup_num}"
-                            setup_columns[column_name] = setup_values.copy()
-                            current_setup_num += 1
-
-                        if count == 9:
-                            #print(f"Reached a buy setup 9 on {bar_date}")
-                            setup_reached_9 = True
-                            setup_columns[column_name] = setup_values
-                            break
-                    else:
-                        break
-                else:
-                    break
-
-    # Add all setup columns to the DataFrame
-    for column_name, values in setup_columns.items():
-        if 9 in set(values):
-            df[column_name] = values
-
-    return df
-
-
+    setup_numbers, start_bars = find_td_setups(df["Close"].to_numpy(), "buy")
+    setup_columns = setup_columns_from_starts(
+        len(df), setup_numbers, start_bars, "TD_Buy_Setup_"
+    )
+    return df.assign(**setup_columns)
@@ -0,0 +1,169 @@
+import pandas as pd
+import numpy as np
+
+from setup_demark import find_td_setups, SETUP_LENGTH
+from countdown_demark import find_td_countdowns
+
+"""
+    Sparse, long-format TD signal output.
+
+    Instead of one dense float64 column per setup/countdown, every count is
+    one row of a small events table with columns
+    (sequence_id, kind, bar_index, count), where sequence_id is the N of the
+    equivalent TD_*_N column. events_to_wide rebuilds the dense columns for
+    callers that still expect them.
+"""
+
+BUY_SETUP = 0
+SELL_SETUP = 1
+BUY_COUNTDOWN = 2
+SELL_COUNTDOWN = 3
+ALL_KINDS = (BUY_SETUP, SELL_SETUP, BUY_COUNTDOWN, SELL_COUNTDOWN)
+
+KIND_PREFIXES = {
+    BUY_SETUP: "TD_Buy_Setup_",
+    SELL_SETUP: "TD_Sell_Setup_",
+    BUY_COUNTDOWN: "TD_Buy_Countdown_",
+    SELL_COUNTDOWN: "TD_Sell_Countdown_",
+}
+
+# sequence_id and bar_index are int32 so multi-decade intraday histories still fit
+EVENT_DTYPES = {
+    "sequence_id": np.int32,
+    "kind": np.int8,
+    "bar_index": np.int32,
+    "count": np.int8,
+}
+
+
+def _sequence_events(kind, sequence_ids, bars):
+    """Events for sequences given as an (n_sequences, length) array of bars."""
+    n_sequences, length = bars.shape
+    return pd.DataFrame({
+        "sequence_id": np.repeat(sequence_ids, length).astype(EVENT_DTYPES["sequence_id"]),
+        "kind": np.full(n_sequences * length, kind, dtype=EVENT_DTYPES["kind"]),
+        "bar_index": bars.ravel().astype(EVENT_DTYPES["bar_index"]),
+        "count": np.tile(np.arange(1, length + 1), n_sequences).astype(EVENT_DTYPES["count"]),
+    })
+
+
+def empty_events():
+    return pd.DataFrame({col: np.empty(0, dtype=dtype) for col, dtype in EVENT_DTYPES.items()})
+
+
+def identify_td_events(df, kinds=ALL_KINDS):
+    """
+    Run the setup and countdown engines on an OHLC frame and return the
+    events table for the requested kinds, without touching df.
+    """
+    return identify_td_events_arrays(
+        df["High"].to_numpy(), df["Low"].to_numpy(), df["Close"].to_numpy(), kinds
+    )
+
+
+def identify_td_events_arrays(high, low, close, kinds=ALL_KINDS):
+    """identify_td_events on bare arrays, e.g. views into shared memory."""
+    parts = {}
+    for side, setup_kind, countdown_kind in (
+        ("buy", BUY_SETUP, BUY_COUNTDOWN),
+        ("sell", SELL_SETUP, SELL_COUNTDOWN),
+    ):
+        if setup_kind not in kinds and countdown_kind not in kinds:
+            continue
+
+        setup_numbers, start_bars = find_td_setups(close, side)
+        if setup_kind in kinds:
+            setup_bars = start_bars[:, None] + np.arange(SETUP_LENGTH)
+            parts[setup_kind] = _sequence_events(setup_kind, setup_numbers, setup_bars)
+
+        if countdown_kind in kinds:
+            countdown_numbers, countdown_bars = find_td_countdowns(high, low, close, start_bars, side)
+            parts[countdown_kind] = _sequence_events(countdown_kind, countdown_numbers, countdown_bars)
+
+    if not parts:
+        return empty_events()
+    # Rows grouped by kind in the order requested
+    return pd.concat([parts[kind] for kind in kinds if kind in parts], ignore_index=True)
+
+
+def events_from_sequences(sequences, kinds=ALL_KINDS):
+    """
+    Events table for a list of (kind, sequence_id, bars) sequences, e.g. as
+    emitted by streaming_demark, in the same row order as identify_td_events.
+    """
+    parts = []
+    for kind in kinds:
+        of_kind = sorted((seq_id, bars) for k, seq_id, bars in sequences if k == kind)
+        if not of_kind:
+            continue
+        sequence_ids = np.array([seq_id for seq_id, _ in of_kind])
+        bars = np.array([bars for _, bars in of_kind])
+        parts.append(_sequence_events(kind, sequence_ids, bars))
+
+    if not parts:
+        return empty_events()
+    return pd.concat(parts, ignore_index=True)
+
+
+def events_to_wide(df, events, kinds=ALL_KINDS):
+    """
+    Adapter for existing callers: add the dense TD_*_N columns described by
+    events to a copy of df, kind by kind in the order given.
+    """
+    df = df.copy()
+    n = len(df)
+    kind_codes = events["kind"].to_numpy()
+
+    for kind in kinds:
+        rows = kind_codes == kind
+        if not rows.any():
+            continue
+        sequence_ids = events["sequence_id"].to_numpy()[rows]
+        bars = events["bar_index"].to_numpy()[rows]
+        counts = events["count"].to_numpy()[rows]
+
+        # pd.unique keeps first-seen order, which is the sequence order
+        unique_ids = pd.unique(sequence_ids)
+        column_of = pd.Index(unique_ids).get_indexer(sequence_ids)
+        values = np.zeros((n, len(unique_ids)))
+        values[bars, column_of] = counts
+
+        columns = {
+            f"{KIND_PREFIXES[kind]}{sequence_id}": values[:, j]
+            for j, sequence_id in enumerate(unique_ids)
+        }
+        df = df.assign(**columns)
+
+    return df
+
+
+def events_from_wide(df, kinds=ALL_KINDS):
+    """Inverse of events_to_wide: collect the non-zero counts of TD_*_N columns."""
+    parts = []
+    for kind in kinds:
+        prefix = KIND_PREFIXES[kind]
+        columns = [col for col in df.columns if col.startswith(prefix)]
+        if not columns:
+            continue
+        values = df[columns].to_numpy()
+        # Walk column by column so rows come out grouped by sequence
+        col_idx, bars = np.nonzero(values.T > 0)
+        sequence_ids = np.array([int(col[len(prefix):]) for col in columns])
+        parts.append(pd.DataFrame({
+            "sequence_id": sequence_ids[col_idx].astype(EVENT_DTYPES["sequence_id"]),
+            "kind": np.full(len(bars), kind, dtype=EVENT_DTYPES["kind"]),
+            "bar_index": bars.astype(EVENT_DTYPES["bar_index"]),
+            "count": values[bars, col_idx].astype(EVENT_DTYPES["count"]),
+        }))
+
+    if not parts:
+        return empty_events()
+    return pd.concat(parts, ignore_index=True)
+
+
+def signal_mask(events, n_bars, kind, count):
+    """Boolean array over bars, True where some sequence of this kind hits count."""
+    mask = np.zeros(n_bars, dtype=bool)
+    rows = (events["kind"].to_numpy() == kind) & (events["count"].to_numpy() == count)
+    mask[events["bar_index"].to_numpy()[rows]] = True
+    return mask
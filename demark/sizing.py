@@ -16,6 +16,26 @@ class PositionSizer:
     def update_trade_history(self, trade):
         pass  # Optional: Override in subclasses if needed
 
+    def prepare(self, all_data, market_ticker="^GSPC"):
+        """
+        Called once before a backtest with all the data it will run on.
+        Subclasses can precompute per-ticker series here (call super).
+        """
+        self.all_data = all_data
+        self.market_ticker = market_ticker
+
+    def position_size_on(self, ticker, date, portfolio_value):
+        """
+        Size a trade in ticker entered on date. By default this slices the
+        history up to date and calls calculate_position_size.
+        """
+        return self.calculate_position_size(
+            ticker,
+            self.all_data[ticker].loc[:date],
+            self.all_data[self.market_ticker].loc[:date],
+            portfolio_value,
+        )
+
 
 class FixedAmountPositionSizer(PositionSizer):
     """
@@ -32,16 +52,76 @@ class FixedAmountPositionSizer(PositionSizer):
         position_size_pct = dollar_size / portfolio_value
         return dollar_size, position_size_pct
 
+    def position_size_on(self, ticker, date, portfolio_value):
+        # No history needed, skip the slicing
+        return self.calculate_position_size(ticker, None, None, portfolio_value)
+
+
+class TradeReturnsBuffer:
+    """
+    Ring buffer of the most recent trade returns with running win/loss sums,
+    so the Kelly statistics cost O(1) per trade instead of a DataFrame.
+    """
+    def __init__(self, size=100):
+        self.returns = np.zeros(size)
+        self.size = size
+        self.count = 0
+        self.next = 0
+        self.n_wins = 0
+        self.win_sum = 0.0
+        self.n_losses = 0
+        self.loss_sum = 0.0
+
+    def _account(self, ret, sign):
+        if ret > 0:
+            self.n_wins += sign
+            self.win_sum += sign * ret
+        elif ret < 0:
+            self.n_losses += sign
+            self.loss_sum += sign * ret
+
+    def add(self, ret):
+        if self.count == self.size:
+            self._account(self.returns[self.next], -1)
+        else:
+            self.count += 1
+        self.returns[self.next] = ret
+        self._account(ret, 1)
+        self.next = (self.next + 1) % self.size
+
+    def kelly_fraction(self, min_trades=20):
+        """Same rules as calculate_kelly_fraction over the buffered returns."""
+        if self.count < min_trades:  # Need minimum sample size
+            return 0.1  # Default to 10%
+
+        p = self.n_wins / self.count
+        avg_win = self.win_sum / self.n_wins if self.n_wins else float("nan")
+        avg_loss = abs(self.loss_sum / self.n_losses) if self.n_losses else float("nan")
+
+        if avg_loss == 0:
+            return 0.1
+
+        b = avg_win / avg_loss
+        kelly = (p * (b + 1) - 1) / b
+
+        # Apply constraints and adjustments
+        kelly = max(0, kelly)  # No negative bets
+        kelly = min(kelly, 0.25)  # Cap at 25%
+
+        # Use half-Kelly for safety
+        return kelly * 0.5
+
 
 class KellyPositionSizer(PositionSizer):
     """
     Kelly-based position sizer.
     """
-    def __init__(self, initial_capital):
+    def __init__(self, initial_capital, lookback_window=100, concentration_limit=0.25):
         self.capital = initial_capital
-        self.historical_trades = []
+        self.trade_returns = TradeReturnsBuffer(lookback_window)
         self.current_correlation = 0
-        self.concentration_limit = 0.25  # Maximum portfolio concentration
+        self.concentration_limit = concentration_limit  # Maximum portfolio concentration
+        self.features = {}
 
     def calculate_position_size(self, ticker, data, market_data, portfolio_value):
         """
@@ -51,14 +131,31 @@ class KellyPositionSizer(PositionSizer):
         3. Market correlation adjustment
         4. Portfolio concentration limits
         """
+        return self._size(
+            calculate_volatility_scalar(data),
+            estimate_market_correlation(data, market_data),
+            portfolio_value,
+        )
+
+    def prepare(self, all_data, market_ticker="^GSPC"):
+        """Precompute the rolling volatility scalar and market correlation of every ticker."""
+        super().prepare(all_data, market_ticker)
+        market = all_data[market_ticker]
+        self.features = {
+            ticker: (data.index,) + rolling_sizing_features(data, market)
+            for ticker, data in all_data.items()
+        }
+
+    def position_size_on(self, ticker, date, portfolio_value):
+        if ticker not in self.features:
+            return super().position_size_on(ticker, date, portfolio_value)
+        index, vol_scalars, correlations = self.features[ticker]
+        row = index.get_loc(date)
+        return self._size(vol_scalars[row], correlations[row], portfolio_value)
+
+    def _size(self, vol_scalar, correlation, portfolio_value):
         # Calculate base Kelly fraction
-        kelly_fraction = calculate_kelly_fraction(pd.DataFrame(self.historical_trades))
-
-        # Calculate volatility scalar
-        vol_scalar = calculate_volatility_scalar(data)
-
-        # Estimate market correlation
-        correlation = estimate_market_correlation(data, market_data)
+        kelly_fraction = self.trade_returns.kelly_fraction()
 
         # Adjust kelly fraction based on correlation
         # Reduce size when correlation is high
@@ -77,10 +174,7 @@ class KellyPositionSizer(PositionSizer):
 
     def update_trade_history(self, trade):
         """Update trade history for Kelly calculations"""
-        self.historical_trades.append(trade)
-        # Keep only recent history
-        if len(self.historical_trades) > 1000:
-            self.historical_trades.pop(0)
+        self.trade_returns.add(trade["return"])
 
 
 def calculate_kelly_fraction(historical_trades_df, lookback_window=100):
@@ -146,3 +240,30 @@ def estimate_market_correlation(data, market_data, lookback=60):
     return correlation
 
 
+def rolling_sizing_features(data, market_data, vol_lookback=20, corr_lookback=60):
+    """
+    calculate_volatility_scalar and estimate_market_correlation for every
+    date of data at once, as arrays aligned with data.index.
+
+    The correlation pairs the ticker's returns with the market's returns on
+    the same dates, so it equals estimate_market_correlation whenever the
+    two calendars agree.
+    """
+    returns = data["Close"].pct_change()
+
+    current_vol = returns.rolling(vol_lookback, min_periods=2).std().to_numpy() * np.sqrt(252)
+    with np.errstate(divide="ignore"):
+        vol_scalars = np.clip(0.20 / current_vol, 0.5, 2.0)
+    # Not enough returns for a std: max(0.5, min(nan, 2.0)) is 0.5
+    vol_scalars[np.isnan(vol_scalars)] = 0.5
+
+    market_returns = market_data["Close"].pct_change().reindex(data.index)
+    correlations = returns.rolling(corr_lookback, min_periods=2).corr(market_returns).to_numpy()
+    n_bars = np.arange(1, len(data) + 1)
+    n_market_bars = market_data.index.searchsorted(data.index, side="right")
+    # Default if not enough data
+    correlations = np.where(
+        (n_bars < corr_lookback) | (n_market_bars < corr_lookback), 0.5, correlations
+    )
+
+    return vol_scalars, correlations
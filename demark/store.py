@@ -0,0 +1,210 @@
+import json
+import os
+import pandas as pd
+import numpy as np
+
+from data import download_universe
+from panel import Panel, PRICE_FIELDS
+from signals_demark import identify_td_events_arrays, signal_mask, SELL_SETUP
+
+"""
+    Memory-mapped universe store.
+
+    A store is a directory with one raw (dates x tickers) array file per
+    field, a valid mask, the calendar and a meta.json:
+
+        store/meta.json      tickers, number of dates, field dtypes
+        store/dates.npy      datetime64, tz-naive
+        store/valid.dat      bool, True where a ticker has a bar
+        store/Close.dat ...  one per field, NaN (or False) without a bar
+
+    It is built once (StoreWriter / build_store) and opened with np.memmap,
+    so opening costs nothing and only the pages a computation touches are
+    read. Rows are dates, so date chunks are contiguous on disk.
+"""
+
+META_FILE = "meta.json"
+DATES_FILE = "dates.npy"
+VALID_FIELD = "valid"
+
+
+def _naive(index):
+    index = pd.DatetimeIndex(index)
+    return index.tz_convert(None) if index.tz is not None else index
+
+
+class StoreWriter:
+    """
+    Write a store over a fixed calendar of dates, one ticker at a time.
+    Bars outside the calendar are dropped. close() removes the dates no
+    ticker has a bar on (e.g. holidays of a business-day calendar).
+    """
+    def __init__(self, path, dates, tickers, fields=PRICE_FIELDS, dtype=np.float32):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.dates = _naive(dates)
+        self.tickers = list(tickers)
+        self.columns = {ticker: col for col, ticker in enumerate(self.tickers)}
+        self.dtypes = {field: np.dtype(dtype).name for field in fields}
+        shape = (len(self.dates), len(self.tickers))
+
+        self.arrays = {}
+        for field, field_dtype in self.dtypes.items():
+            self.arrays[field] = np.memmap(self._file(field), dtype=field_dtype, mode="w+", shape=shape)
+            self.arrays[field][:] = np.nan
+        self.valid = np.memmap(self._file(VALID_FIELD), dtype=bool, mode="w+", shape=shape)
+
+    def _file(self, field):
+        return os.path.join(self.path, f"{field}.dat")
+
+    def write(self, ticker, data):
+        col = self.columns[ticker]
+        rows = self.dates.get_indexer(_naive(data.index))
+        inside = rows >= 0
+        rows = rows[inside]
+        self.valid[rows, col] = True
+        for field, array in self.arrays.items():
+            array[rows, col] = data[field].to_numpy()[inside]
+
+    def close(self):
+        has_bars = self.valid.any(axis=1)
+        dates = self.dates
+        arrays = dict(self.arrays, **{VALID_FIELD: self.valid})
+        self.arrays = {}
+        self.valid = None
+
+        keep = np.flatnonzero(has_bars)
+        for field in list(arrays):
+            array = arrays.pop(field)
+            if len(keep) == len(dates):
+                array.flush()
+                continue
+            # Rewrite without the empty dates, one field in memory at a time
+            compacted = np.array(array[keep])
+            del array
+            compacted.tofile(self._file(field))
+        dates = dates[keep]
+
+        np.save(os.path.join(self.path, DATES_FILE), dates.to_numpy())
+        _write_meta(self.path, {"tickers": self.tickers, "n_dates": len(dates), "fields": self.dtypes})
+
+
+def _write_meta(path, meta):
+    with open(os.path.join(path, META_FILE), "w") as f:
+        json.dump(meta, f)
+
+
+def build_store(path, symbols, start_date, end_date, fetch_batch, cache=None, dates=None,
+                fields=PRICE_FIELDS, dtype=np.float32, max_workers=8, batch_size=20):
+    """
+    Download symbols (see data.download_universe) straight into a store at
+    path, without holding the universe in memory. dates defaults to the
+    business days in [start_date, end_date); pass a calendar for markets
+    that also trade on weekends. Returns the opened UniverseStore.
+    """
+    if dates is None:
+        dates = pd.bdate_range(start_date, end_date, inclusive="left")
+    writer = StoreWriter(path, dates, symbols, fields, dtype)
+    failed = {}
+    downloads = download_universe(
+        symbols, start_date, end_date, fetch_batch, cache=cache,
+        max_workers=max_workers, batch_size=batch_size,
+    )
+    for symbol, data, error in downloads:
+        if data is None:
+            failed[symbol] = error
+            continue
+        writer.write(symbol, data)
+    writer.close()
+
+    if failed:
+        print(f"Failed to download {len(failed)} tickers:")
+        for symbol, error in failed.items():
+            print(f"  {symbol}: {error}")
+    return UniverseStore(path)
+
+
+class UniverseStore:
+    def __init__(self, path, mode="r"):
+        self.path = path
+        self.mode = mode
+        with open(os.path.join(path, META_FILE)) as f:
+            self.meta = json.load(f)
+        self.tickers = self.meta["tickers"]
+        self.dates = pd.DatetimeIndex(np.load(os.path.join(path, DATES_FILE)), name="Date")
+        self.shape = (self.meta["n_dates"], len(self.tickers))
+        self.valid = self._open(VALID_FIELD, bool)
+        self.fields = {field: self._open(field, dtype) for field, dtype in self.meta["fields"].items()}
+
+    def _open(self, field, dtype, mode=None):
+        return np.memmap(
+            os.path.join(self.path, f"{field}.dat"), dtype=dtype, mode=mode or self.mode, shape=self.shape
+        )
+
+    def field(self, name):
+        return self.fields[name]
+
+    def add_field(self, name, dtype):
+        """Create a new (dates x tickers) field, zero filled, open for writing."""
+        array = np.memmap(os.path.join(self.path, f"{name}.dat"), dtype=dtype, mode="w+", shape=self.shape)
+        self.meta["fields"][name] = np.dtype(dtype).name
+        _write_meta(self.path, self.meta)
+        self.fields[name] = array
+        return array
+
+    def panel(self, start=None, end=None, tickers=None):
+        """
+        Panel over the memory-mapped arrays, nothing is read until used.
+        Selecting tickers reads those columns into memory.
+        """
+        panel = Panel(self.dates, self.tickers, self.fields, self.valid)
+        if start is not None or end is not None:
+            panel = panel.slice_dates(start, end)
+        if tickers is not None:
+            panel = panel.select(tickers)
+        return panel
+
+    def date_chunks(self, chunk_size):
+        """Panels of consecutive dates, chunk_size rows at a time (views)."""
+        for lo in range(0, self.shape[0], chunk_size):
+            rows = slice(lo, lo + chunk_size)
+            yield Panel(
+                self.dates[rows],
+                self.tickers,
+                {name: array[rows] for name, array in self.fields.items()},
+                self.valid[rows],
+            )
+
+    def ticker_chunks(self, chunk_size, fields=None):
+        """In-memory Panels of chunk_size tickers at a time, over all dates."""
+        fields = list(self.fields) if fields is None else fields
+        for lo in range(0, len(self.tickers), chunk_size):
+            cols = slice(lo, lo + chunk_size)
+            yield Panel(
+                self.dates,
+                self.tickers[cols],
+                {name: np.array(self.fields[name][:, cols]) for name in fields},
+                np.array(self.valid[:, cols]),
+            )
+
+
+def compute_store_signals(path, chunk_size=500):
+    """
+    Add the backtest's TD_Signal (a sell setup reaching 9, as in
+    add_aggregated_countdown_signal) to the store at path, streaming
+    through it chunk_size tickers at a time.
+    """
+    store = UniverseStore(path)
+    signal = store.add_field("TD_Signal", bool)
+    col = 0
+    for chunk in store.ticker_chunks(chunk_size, fields=["High", "Low", "Close"]):
+        high, low, close = chunk.field("High"), chunk.field("Low"), chunk.field("Close")
+        for chunk_col in range(len(chunk.tickers)):
+            rows = np.flatnonzero(chunk.valid[:, chunk_col])
+            events = identify_td_events_arrays(
+                high[rows, chunk_col], low[rows, chunk_col], close[rows, chunk_col], kinds=(SELL_SETUP,)
+            )
+            signal[rows[signal_mask(events, len(rows), SELL_SETUP, 9)], col] = True
+            col += 1
+    signal.flush()
+    return UniverseStore(path)
@@ -0,0 +1,205 @@
+import copy
+import json
+
+from setup_demark import SETUP_LENGTH
+from countdown_demark import MAX_TIMEDELTA, COUNTDOWN_LENGTH, RELAXED_FROM_COUNT
+from signals_demark import BUY_SETUP, SELL_SETUP, BUY_COUNTDOWN, SELL_COUNTDOWN
+
+"""
+    Incremental TD Sequential for live daily bars.
+
+    TDSequentialState keeps just enough state to advance the setups and
+    countdowns one bar at a time: the last few bars, the running setup of
+    each side and the countdowns still in progress. Fed the same bars it
+    finds exactly the sequences of identify_td_events, and it can be saved
+    to / restored from JSON between end-of-day runs.
+"""
+
+# A new countdown is replayed from its setup's 1 (8 bars before the 9),
+# and its conditions look 2 bars further back
+HISTORY_BARS = SETUP_LENGTH + 2
+
+SIDES = {
+    "buy": (BUY_SETUP, BUY_COUNTDOWN),
+    "sell": (SELL_SETUP, SELL_COUNTDOWN),
+}
+
+
+class TDSequentialState:
+    def __init__(self, max_timedelta=MAX_TIMEDELTA):
+        self.max_timedelta = max_timedelta
+        self.n_bars = 0
+        self.bars = []  # last HISTORY_BARS bars as [high, low, close]
+        self.sides = {
+            side: {
+                "previous_opposite": False,
+                "flips": 0,
+                "run_number": 0,
+                "run_start": 0,
+                "run_count": 0,
+                "countdowns_started": 0,
+                "countdowns": [],
+            }
+            for side in SIDES
+        }
+
+    @classmethod
+    def from_history(cls, df, max_timedelta=MAX_TIMEDELTA):
+        """State after streaming every bar of df. Returns (state, sequences)."""
+        state = cls(max_timedelta)
+        sequences = state.replay(df["High"].to_numpy(), df["Low"].to_numpy(), df["Close"].to_numpy())
+        return state, sequences
+
+    def replay(self, high, low, close):
+        sequences = []
+        for bar in zip(high, low, close):
+            sequences.extend(self.update(*bar))
+        return sequences
+
+    def update(self, high, low, close):
+        """
+        Advance by one bar. Returns the sequences completed on it as a list
+        of (kind, sequence_id, bars): a setup reaching 9 or a countdown
+        reaching 13 within max_timedelta, with the bar indexes of each count.
+        """
+        bar = self.n_bars
+        self.bars.append([float(high), float(low), float(close)])
+        if len(self.bars) > HISTORY_BARS:
+            self.bars.pop(0)
+        self.n_bars += 1
+
+        completed = []
+        for side, (setup_kind, countdown_kind) in SIDES.items():
+            state = self.sides[side]
+
+            # Countdowns of earlier setups first, so they keep lower numbers
+            qualifies = self._qualifies(side, bar)
+            still_active = []
+            for countdown in state["countdowns"]:
+                result = self._advance(side, state, countdown, bar, qualifies)
+                if result is None:
+                    still_active.append(countdown)
+                elif result:
+                    completed.append((countdown_kind, countdown["number"], countdown["bars"]))
+            state["countdowns"] = still_active
+
+            setup = self._advance_setup(side, state, bar)
+            if setup is None:
+                continue
+            setup_number, setup_start = setup
+            completed.append((setup_kind, setup_number, list(range(setup_start, bar + 1))))
+
+            # The countdown counts from the setup's 1, catch up on those bars
+            countdown = {"count": 0, "number": 0, "bars": [], "close": 0.0, "high": 0.0}
+            for past_bar in range(setup_start, bar + 1):
+                result = self._advance(side, state, countdown, past_bar, self._qualifies(side, past_bar))
+                if result is not None:
+                    break
+            if result is None:
+                state["countdowns"].append(countdown)
+            elif result:
+                completed.append((countdown_kind, countdown["number"], countdown["bars"]))
+
+        return completed
+
+    def _bar(self, bar):
+        return self.bars[bar - (self.n_bars - len(self.bars))]
+
+    def _qualifies(self, side, bar):
+        """Bar-only countdown conditions (find_td_countdowns' `qualifies`)."""
+        if bar < 2:
+            return False
+        high, low, close = self._bar(bar)
+        high_1, low_1, close_1 = self._bar(bar - 1)
+        high_2, low_2, close_2 = self._bar(bar - 2)
+        if side == "buy":
+            return close <= low_2 and low < low_1 and close < close_1
+        return close >= high_2 and high >= high_1 and close > close_1
+
+    def _advance_setup(self, side, state, bar):
+        """Returns (setup_number, start_bar) if a setup reaches 9 on this bar."""
+        continues = opposite = False
+        if bar >= 4:
+            close = self._bar(bar)[2]
+            close_4 = self._bar(bar - 4)[2]
+            if side == "sell":
+                continues, opposite = close > close_4, close < close_4
+            else:
+                continues, opposite = close < close_4, close > close_4
+
+        reached_9 = None
+        if state["run_count"]:
+            if continues:
+                state["run_count"] += 1
+                if state["run_count"] == SETUP_LENGTH:
+                    reached_9 = (state["run_number"], state["run_start"])
+                    state["run_count"] = 0
+            else:
+                state["run_count"] = 0
+        elif state["previous_opposite"] and continues:
+            # Price flip on the previous bar, this bar is the 1
+            state["flips"] += 1
+            state["run_number"] = state["flips"]
+            state["run_start"] = bar
+            state["run_count"] = 1
+
+        state["previous_opposite"] = opposite
+        return reached_9
+
+    def _advance(self, side, state, countdown, bar, qualifies):
+        """
+        Move one countdown over bar. Returns None while it is still running,
+        True when it completes and False when it is dropped.
+        """
+        high, low, close = self._bar(bar)
+        count = countdown["count"]
+
+        if count == 0:
+            counts = qualifies
+        elif side == "buy":
+            counts = qualifies and close < countdown["close"]
+        elif count < RELAXED_FROM_COUNT:
+            counts = qualifies and close > countdown["close"]
+        else:
+            counts = high > countdown["high"] or close > countdown["close"]
+
+        if counts:
+            countdown["count"] += 1
+            countdown["bars"].append(bar)
+            countdown["close"] = close
+            countdown["high"] = high
+            if countdown["count"] == 1:
+                state["countdowns_started"] += 1
+                countdown["number"] = state["countdowns_started"]
+            if countdown["count"] == COUNTDOWN_LENGTH:
+                return countdown["bars"][-1] - countdown["bars"][0] <= self.max_timedelta
+
+        # Past max_timedelta it can no longer complete, stop tracking it
+        if countdown["count"] and bar - countdown["bars"][0] >= self.max_timedelta:
+            return False
+        return None
+
+    def to_dict(self):
+        return {
+            "max_timedelta": self.max_timedelta,
+            "n_bars": self.n_bars,
+            "bars": self.bars,
+            "sides": self.sides,
+        }
+
+    @classmethod
+    def from_dict(cls, state_dict):
+        state = cls(state_dict["max_timedelta"])
+        state.n_bars = state_dict["n_bars"]
+        state.bars = [list(bar) for bar in state_dict["bars"]]
+        state.sides = copy.deepcopy(state_dict["sides"])
+        return state
+
+    def save(self, path):
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f)
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            return cls.from_dict(json.load(f))
@@ -0,0 +1,140 @@
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+import pandas as pd
+import numpy as np
+
+from backtest import (
+    find_potential_trades, prepare_data,
+    HOLDING_PERIOD_DAYS, NUM_RISING_CLOSES, INITIAL_CAPITAL,
+)
+from metrics import score_runs, trade_metrics
+from portfolio import simulate_portfolio
+from sizing import FixedAmountPositionSizer, KellyPositionSizer
+from tickers import get_sp500_tickers
+
+"""
+    Grid search over the backtest constants.
+
+    The indicators are computed once per ticker (prepare_data) and the
+    entries are found once per number of rising closes: grid points that
+    only differ in holding period or sizing reuse the same entries with
+    their exits moved. Grid points run on a process pool that receives the
+    prepared data once per worker, and send back their equity curves, which
+    are scored together once the grid is done (metrics.score_runs).
+"""
+
+DEFAULT_SIZERS = {
+    "fixed_1000": (FixedAmountPositionSizer, {"fixed_amount": 1000.}),
+}
+
+RESULT_COLUMNS = [
+    "sharpe_ratio", "sortino_ratio", "calmar_ratio", "max_drawdown", "max_drawdown_duration",
+    "win_rate", "total_trades", "total_return", "cagr", "exposure", "turnover",
+]
+
+_all_data = None
+
+
+def _init_worker(all_data):
+    global _all_data
+    _all_data = all_data
+
+
+def _run_point(sizer_spec, potential_trades):
+    sizer_class, sizer_kwargs = sizer_spec
+    portfolio_df, trades_df, _ = simulate_portfolio(
+        _all_data, potential_trades, sizer_class(**sizer_kwargs), INITIAL_CAPITAL
+    )
+    return (
+        portfolio_df["portfolio_value"].to_numpy(),
+        portfolio_df["n_positions"].to_numpy(),
+        trade_metrics(trades_df),
+    )
+
+
+def with_holding_period(potential_trades, holding_period_days):
+    """The same entries, each exiting holding_period_days after entry."""
+    holding_period = timedelta(days=holding_period_days)
+    return [
+        dict(trade, exit_date=trade["entry_date"] + holding_period)
+        for trade in potential_trades
+    ]
+
+
+def run_sweep(
+    all_data,
+    holding_periods=(HOLDING_PERIOD_DAYS,),
+    rising_closes=(NUM_RISING_CLOSES,),
+    sizers=None,
+    n_processes=None,
+    output_path=None,
+):
+    """
+    Backtest every combination of holding_periods, rising_closes and sizers,
+    a dict of label -> (PositionSizer class, constructor kwargs).
+
+    Returns one row per grid point with its parameters, the number of TD
+    signals that passed the rising closes and the RESULT_COLUMNS, and
+    writes it to output_path as CSV if given. Without n_processes the grid
+    runs in this process.
+    """
+    sizers = sizers or DEFAULT_SIZERS
+
+    entries = {}
+    for num_rising_closes in rising_closes:
+        diagnostics = {"total_td_signals": 0, "signals_with_rising_closes": 0}
+        entries[num_rising_closes] = find_potential_trades(
+            all_data, diagnostics, num_rising_closes=num_rising_closes
+        )
+
+    points = list(itertools.product(rising_closes, holding_periods, sizers))
+    sizer_specs = [sizers[label] for _, _, label in points]
+    trade_lists = [
+        with_holding_period(entries[num_rising_closes], holding_period_days)
+        for num_rising_closes, holding_period_days, _ in points
+    ]
+
+    if n_processes:
+        with ProcessPoolExecutor(
+            n_processes, initializer=_init_worker, initargs=(all_data,)
+        ) as executor:
+            results = list(executor.map(_run_point, sizer_specs, trade_lists))
+    else:
+        _init_worker(all_data)
+        results = list(map(_run_point, sizer_specs, trade_lists))
+
+    equities, n_positions, trades = zip(*results)
+    scores = score_runs(np.array(equities), np.array(n_positions), trades, INITIAL_CAPITAL)
+    table = pd.DataFrame({
+        "num_rising_closes": [num_rising_closes for num_rising_closes, _, _ in points],
+        "holding_period_days": [holding_period_days for _, holding_period_days, _ in points],
+        "sizer": [label for _, _, label in points],
+        "potential_trades": [len(entries[num_rising_closes]) for num_rising_closes, _, _ in points],
+    })
+    table[RESULT_COLUMNS] = scores[RESULT_COLUMNS]
+
+    if output_path is not None:
+        table.to_csv(output_path, index=False)
+    return table
+
+
+if __name__ == "__main__":
+    tickers = get_sp500_tickers()
+    tickers.append("^GSPC")
+    all_data = prepare_data(tickers)
+
+    sizers = {
+        "fixed_1000": (FixedAmountPositionSizer, {"fixed_amount": 1000.}),
+        "kelly_10": (KellyPositionSizer, {"initial_capital": INITIAL_CAPITAL, "concentration_limit": 0.10}),
+        "kelly_25": (KellyPositionSizer, {"initial_capital": INITIAL_CAPITAL, "concentration_limit": 0.25}),
+    }
+    table = run_sweep(
+        all_data,
+        holding_periods=(5, 10, 20),
+        rising_closes=(1, 2, 3),
+        sizers=sizers,
+        n_processes=4,
+        output_path="sweep_results.csv",
+    )
+    print(table.sort_values("sharpe_ratio", ascending=False).to_string(index=False))
@@ -0,0 +1,499 @@
+from datetime import timedelta
+import pandas as pd
+import numpy as np
+import matplotlib.dates as mdates
+from tqdm import tqdm
+
+from countdown_demark import MAX_TIMEDELTA
+from backtest import HOLDING_PERIOD_DAYS, NUM_RISING_CLOSES, INITIAL_CAPITAL, report_backtest
+
+"""
+    Original bar-by-bar implementations the vectorized engines are checked
+    against. They live with the tests only, as oracles.
+"""
+
+
+def identify_td_sell_setup_reference(df):
+    # Create a copy of the DataFrame to ensure we're not dealing with a view
+    df = df.copy()
+
+    # Dictionary to keep track of active setups and their column names
+    setup_columns = {}
+    current_setup_num = 1
+
+    for i in range(4, len(df) - 4):
+        current_date = mdates.num2date(df["Date"][i]).strftime("%Y-%m-%d")
+
+        # Check for Bullish TD Price Flip:
+        # First bar's close must be LESS THAN close 4 bars before
+        # Second bar's close must be GREATER THAN close 4 bars before
+        bullish_price_flip = (
+            df["Close"][i] < df["Close"][i - 4]
+            and df["Close"][i + 1] > df["Close"][i + 1 - 4]
+        )
+
+        if bullish_price_flip:
+            count = 0
+            setup_started = False
+            setup_reached_9 = False
+            setup_values = np.zeros(len(df))
+
+            # Start counting from the bar AFTER the flip is complete i+2 <--
+            # no??
+            for bar in range(i + 1, len(df)):
+                bar_date = mdates.num2date(df["Date"][bar]).strftime("%Y-%m-%d")
+
+                if df["Close"][bar] > df["Close"][bar - 4]:
+                    count += 1
+                    setup_values[bar] = count
+
+                    if count == 1:
+                        setup_started = True
+                        column_name = f"TD_Sell_Setup_{current_setup_num}"
+                        setup_columns[column_name] = setup_values.copy()
+                        current_setup_num += 1
+
+                    if count == 9:
+                        setup_reached_9 = True
+                        setup_columns[column_name] = setup_values
+                        break
+                else:
+                    break
+
+    # Add all setup columns to the DataFrame
+    for column_name, values in setup_columns.items():
+        if 9 in set(values):
+            df[column_name] = values
+
+    return df
+
+
+def identify_td_buy_setup_reference(df):
+    # Create a copy of the DataFrame to ensure we're not dealing with a view
+    df = df.copy()
+
+    # Dictionary to keep track of active setups and their column names
+    setup_columns = {}
+    current_setup_num = 1
+
+    for i in range(4, len(df) - 4):
+        current_date = mdates.num2date(df["Date"][i]).strftime("%Y-%m-%d")
+        
+        # Prevent index out of bounds
+        if i + 1 >= len(df):
+            break
+
+        # Check for Bearish TD Price Flip
+        bearish_price_flip = (
+            df["Close"][i] > df["Close"][i - 4]
+            and df["Close"][i + 1] < df["Close"][i + 1 - 4]
+        )
+
+        if bearish_price_flip:
+            count = 0
+            setup_started = False
+            setup_reached_9 = False
+            setup_values = np.zeros(len(df))
+
+            # Start counting from the bar AFTER the flip is complete (i+2)
+            for bar in range(i + 1, len(df)):
+                bar_date = mdates.num2date(df["Date"][bar]).strftime("%Y-%m-%d")
+
+                if bar - 4 >= 0:
+                    if df["Close"][bar] < df["Close"][bar - 4]:
+                        count += 1
+                        setup_values[bar] = count
+
+                        if count == 1:
+                            setup_started = True
+                            column_name = f"TD_Buy_Setup_{current_setup_num}"
+                            setup_columns[column_name] = setup_values.copy()
+                            current_setup_num += 1
+
+                        if count == 9:
+                            #print(f"Reached a buy setup 9 on {bar_date}")
+                            setup_reached_9 = True
+                            setup_columns[column_name] = setup_values
+                            break
+                    else:
+                        break
+                else:
+                    break
+
+    # Add all setup columns to the DataFrame
+    for column_name, values in setup_columns.items():
+        if 9 in set(values):
+            df[column_name] = values
+
+    return df
+
+
+def identify_td_buy_countdown_reference(df):
+    # Create a copy of the DataFrame to ensure we're not dealing with a view
+    df = df.copy()
+
+    # Dictionary to keep track of active countdowns and their column names
+    countdown_columns = {}
+    current_countdown_num = 1
+
+    # Get all setup columns
+    setup_columns = [col for col in df.columns if col.startswith("TD_Buy_Setup_")]
+
+    for i in range(len(df)):
+        current_date = mdates.num2date(df["Date"][i]).strftime("%Y-%m-%d")
+
+        # Check for 9's across all setup columns
+        for setup_column in setup_columns:
+            if df[setup_column][i] == 9:
+                countdown = 0
+                previous_countdown_close = None
+                start_index = i - 8
+
+                # Verify setup sequence starts with 1
+                if start_index >= 0:  # Add boundary check
+                    if df[setup_column][start_index] == 1:
+                        countdown_started = False
+                        countdown_reached_13 = False
+                        countdown_values = np.zeros(len(df))
+                        countdown_start_index = None  # Track when countdown 1 occurs
+
+                        for j, bar in enumerate(range(start_index, len(df))):
+                            bar_date = mdates.num2date(df["Date"][bar]).strftime("%Y-%m-%d")
+                            if countdown < 13:
+                                if bar >= 2:
+                                    condition1 = df["Close"][bar] <= df["Low"][bar - 2]
+                                else:
+                                    condition1 = False
+
+                                if bar >= 1:
+                                    condition2 = df["Low"][bar] < df["Low"][bar - 1]
+                                    condition4 = df["Close"][bar] < df["Close"][bar - 1]
+                                else:
+                                    condition2 = False
+                                    condition4 = False
+
+                                if previous_countdown_close is not None:
+                                    condition3 = df["Close"][bar] < previous_countdown_close
+                                else:
+                                    condition3 = True
+
+                                if condition1 and condition2 and condition3 and condition4:
+                                    countdown += 1
+                                    countdown_values[bar] = countdown
+                                    previous_countdown_close = df["Close"][bar]
+
+                                    if countdown == 1:
+                                        countdown_started = True
+                                        countdown_start_index = bar  # Record when countdown 1 occurs
+                                        column_name = f"TD_Buy_Countdown_{current_countdown_num}"
+                                        countdown_columns[column_name] = countdown_values.copy()
+                                        current_countdown_num += 1
+
+                            """
+                            elif countdown >= 10 and countdown < 13:
+                                if bar >= 1:
+                                    condition5 = df["Close"][bar] < previous_countdown_close
+                                    if condition5:
+                                        countdown += 1
+                                        countdown_values[bar] = countdown
+                                        previous_countdown_close = df["Close"][bar]
+                            """
+
+                            if countdown == 13:
+                                #print(f"Reached a buy countdown 13 on {bar_date}")
+                                countdown_reached_13 = True
+
+                                # Check if the duration between 1 and 13 is less than or equal to 50 days
+                                days_between = bar - countdown_start_index
+                                if days_between <= MAX_TIMEDELTA:
+                                    countdown_columns[column_name] = countdown_values
+                                else:
+                                    # Remove the countdown if it took too long to complete
+                                    if column_name in countdown_columns:
+                                        del countdown_columns[column_name]
+                                break
+
+    # Add all countdown columns to the DataFrame
+    for column_name, values in countdown_columns.items():
+        if 13 in set(values):
+            df[column_name] = values
+
+    return df
+
+
+def identify_td_sell_countdown_reference(df):
+    df = df.copy()
+
+    countdown_columns = {}
+    current_countdown_num = 1
+
+    setup_columns = [col for col in df.columns if col.startswith("TD_Sell_Setup_")]
+
+    for i in range(len(df)):
+        current_date = mdates.num2date(df["Date"][i]).strftime("%Y-%m-%d")
+
+        # Check for 9's across all setup columns
+        for setup_column in setup_columns:
+            if df[setup_column][i] == 9:
+                countdown = 0
+                previous_countdown_close = None
+                start_index = i - 8
+
+                # Verify setup sequence starts with 1
+                if start_index >= 0:  # Add boundary check
+                    assert df[setup_column][start_index] == 1
+                    if df[setup_column][start_index] == 1:
+                        countdown_started = False
+                        countdown_reached_13 = False
+                        countdown_values = np.zeros(len(df))
+                        countdown_start_index = None  # Track when countdown 1 occurs
+
+                        for bar in range(start_index, len(df)):
+                            bar_date = mdates.num2date(df["Date"][bar]).strftime("%Y-%m-%d")
+                            # Different conditions for bars 1-10 vs 11-13
+                            if countdown < 10:
+                                # Version II conditions for bars 1-10
+                                if bar >= 2:
+                                    condition1 = df["Close"][bar] >= df["High"][bar - 2]
+                                else:
+                                    condition1 = False
+
+                                if bar >= 1:
+                                    condition2 = df["High"][bar] >= df["High"][bar - 1]
+                                    condition4 = df["Close"][bar] > df["Close"][bar - 1]
+                                else:
+                                    condition2 = False
+                                    condition4 = False
+
+                                if previous_countdown_close is not None:
+                                    condition3 = df["Close"][bar] > previous_countdown_close
+                                else:
+                                    condition3 = True
+
+                                if countdown == 0:
+                                    assert True #condition1 and condition2 and condition3 and condition4
+
+                                if condition1 and condition2 and condition3 and condition4:
+                                    countdown += 1
+                                    countdown_values[bar] = countdown
+                                    previous_countdown_close = df["Close"][bar]
+                                    previous_countdown_high = df["High"][bar]
+
+                                    if countdown == 1:
+                                        countdown_started = True
+                                        countdown_start_index = bar  # Record when countdown 1 occurs
+                                        column_name = f"TD_Sell_Countdown_{current_countdown_num}"
+                                        countdown_columns[column_name] = countdown_values.copy()
+                                        current_countdown_num += 1
+
+                            elif countdown >= 10 and countdown < 13:
+                                # Version II conditions for bars 11-13 (less strict)
+                                # Only need successive higher closes for bars 11-13
+                                condition5_v1 = df["High"][bar] > previous_countdown_high
+                                condition5_v2 = df["Close"][bar] > previous_countdown_close
+                                #condition5_v3 = df["High"][bar] > 
+                                condition5 = condition5_v1 or condition5_v2
+
+                                if condition5:
+                                    countdown += 1
+                                    countdown_values[bar] = countdown
+                                    previous_countdown_close = df["Close"][bar]
+                                    previous_countdown_high = df["High"][bar]
+
+                            if countdown == 13:
+                                countdown_reached_13 = True
+                                
+                                # Check if the duration between 1 and 13 is less than or equal to 50 days
+                                days_between = bar - countdown_start_index
+                                if days_between <= MAX_TIMEDELTA:
+                                    countdown_columns[column_name] = countdown_values
+                                else:
+                                    #print(f"Discarding countdown sequence - took {days_between} days to complete")
+                                    del countdown_columns[column_name]
+                                break
+
+    # Add all countdown columns to the DataFrame
+    for column_name, values in countdown_columns.items():
+        if 13 in set(values):
+            df[column_name] = values
+
+    return df
+
+
+def find_potential_trades_reference(
+    all_data, diagnostics, holding_period_days=HOLDING_PERIOD_DAYS, num_rising_closes=NUM_RISING_CLOSES
+):
+    """The original per-signal loop find_candidate_trades is checked against."""
+    lookback_days = num_rising_closes + 1
+    # Collect all potential trades
+    potential_trades = []
+
+    for ticker, data in all_data.items():
+        if ticker == "^GSPC":
+            continue
+
+        signal_dates = data.index[data["TD_Signal"] == True]
+
+        diagnostics["total_td_signals"] += len(signal_dates)
+
+        for signal_date in signal_dates:
+            signal_idx = data.index.get_loc(signal_date)
+
+            # Check if there are at least lookback_days of data after the signal
+            if signal_idx + lookback_days >= len(data):
+                continue
+
+            # Get the next lookback_days closing prices
+            closes = data["Close"].iloc[signal_idx + 1 : signal_idx + lookback_days + 1].values
+
+            # Check if the closes are rising consecutively
+            is_rising = all(closes[i] > closes[i - 1] for i in range(1, len(closes)))
+
+            if is_rising:
+                diagnostics["signals_with_rising_closes"] += 1
+
+                entry_idx = signal_idx + lookback_days + 1  # Day after the last rising close
+
+                # Ensure entry index is within data range
+                if entry_idx >= len(data):
+                    continue
+
+                entry_date = data.index[entry_idx]
+                entry_price = data["Open"].iloc[entry_idx]
+                exit_date = entry_date + timedelta(days=holding_period_days)
+
+                potential_trades.append({
+                    "ticker": ticker,
+                    "entry_date": entry_date,
+                    "entry_price": entry_price,
+                    "exit_date": exit_date,
+                })
+
+    # Sort potential trades by entry_date
+    potential_trades.sort(key=lambda x: x["entry_date"])
+    return potential_trades
+
+
+def backtest_portfolio_reference(all_data, position_sizer):
+    """The original per-date dict loop simulate_portfolio is checked against."""
+    # Diagnostics
+    diagnostics = {
+        "total_td_signals": 0,
+        "signals_with_rising_closes": 0,
+        "trades_executed": 0,
+        "insufficient_cash": 0,
+    }
+
+    potential_trades = find_potential_trades_reference(all_data, diagnostics)
+
+    print("\nRunning portfolio backtest...")
+    position_sizer.prepare(all_data)
+
+    # Simulate the portfolio over time
+    portfolio_value = INITIAL_CAPITAL
+    cash = INITIAL_CAPITAL
+    active_positions = []
+    closed_positions = []
+    daily_portfolio_values = []
+    max_concurrent_positions = 0
+
+    # Build a list of all dates in the data
+    all_dates = sorted(
+        set(date for data in all_data.values() for date in data.index)
+    )
+
+    # Convert all_dates to a set for faster lookup
+    all_dates_set = set(all_dates)
+
+    # Index potential_trades
+    trade_idx = 0
+    total_trades = len(potential_trades)
+
+    for current_date in tqdm(all_dates):
+        # First, check for positions that need to be closed
+        positions_to_remove = []
+        for position in active_positions:
+            if current_date >= position["exit_date"]:
+                exit_date = current_date
+                # Ensure the exit date is within the data range
+                if exit_date not in all_data[position["ticker"]].index:
+                    # Skip if exit date is not available (e.g., market holiday)
+                    continue
+                exit_price = all_data[position["ticker"]].loc[exit_date, "Close"]
+                position_return = (exit_price - position["entry_price"]) / position["entry_price"]
+                cash += position["shares"] * exit_price
+
+                trade_result = {
+                    "ticker": position["ticker"],
+                    "entry_date": position["entry_date"],
+                    "exit_date": exit_date,
+                    "entry_price": position["entry_price"],
+                    "exit_price": exit_price,
+                    "shares": position["shares"],
+                    "initial_value": position["shares"] * position["entry_price"],
+                    "final_value": position["shares"] * exit_price,
+                    "return": position_return,
+                }
+
+                closed_positions.append(trade_result)
+                position_sizer.update_trade_history(trade_result)
+                positions_to_remove.append(position)
+
+        for position in positions_to_remove:
+            active_positions.remove(position)
+
+        # Now, check if any trades are to be entered today
+        while trade_idx < total_trades and potential_trades[trade_idx]["entry_date"] == current_date:
+            trade = potential_trades[trade_idx]
+            trade_idx += 1
+
+            # Calculate position size
+            dollar_size, position_size_pct = position_sizer.position_size_on(
+                trade["ticker"], current_date, portfolio_value
+            )
+
+            # Check if we have enough cash
+            if dollar_size <= cash:
+                shares = dollar_size / trade["entry_price"]
+
+                new_position = {
+                    "ticker": trade["ticker"],
+                    "entry_date": trade["entry_date"],
+                    "exit_date": trade["exit_date"],
+                    "entry_price": trade["entry_price"],
+                    "shares": shares,
+                }
+
+                active_positions.append(new_position)
+                cash -= dollar_size
+                diagnostics["trades_executed"] += 1
+            else:
+                diagnostics["insufficient_cash"] += 1
+
+        # Calculate current portfolio value
+        current_portfolio_value = cash
+        for position in active_positions:
+            if current_date not in all_data[position["ticker"]].index:
+                # Skip if current date is not available (e.g., market holiday)
+                continue
+            current_price = all_data[position["ticker"]].loc[current_date, "Close"]
+            current_portfolio_value += position["shares"] * current_price
+
+        portfolio_value = current_portfolio_value
+        daily_portfolio_values.append(
+            {
+                "date": current_date,
+                "portfolio_value": portfolio_value,
+                "n_positions": len(active_positions),
+            }
+        )
+
+        max_concurrent_positions = max(max_concurrent_positions, len(active_positions))
+
+    # Prepare results
+    portfolio_df = pd.DataFrame(daily_portfolio_values)
+    trades_df = pd.DataFrame(closed_positions)
+
+    report_backtest(diagnostics, portfolio_df, trades_df, max_concurrent_positions)
+
+    return portfolio_df, trades_df, diagnostics
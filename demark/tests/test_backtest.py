@@ -0,0 +1,118 @@
+import pandas as pd
+import numpy as np
+import pytest
+
+import parallel_demark
+from backtest import (
+    prepare_data, backtest_portfolio, prepare_ticker_data, check_rising_closes,
+    find_candidate_trades, find_potential_trades,
+)
+from reference_impl import backtest_portfolio_reference, find_potential_trades_reference
+from panel import Panel
+from sizing import FixedAmountPositionSizer, KellyPositionSizer
+from test_setup_demark import make_ohlc
+
+"""
+    Parity of the array-backed simulator against the original per-date loop.
+"""
+
+
+def make_universe(n_tickers, n_bars, seed, drop_fraction=0.02):
+    """Prepared all_data for synthetic tickers, some with missing bars."""
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range("2020-01-01", periods=n_bars)
+    all_data = {}
+    for i, ticker in enumerate([f"T{i}" for i in range(n_tickers)] + ["^GSPC"]):
+        df = make_ohlc(n_bars, seed * 100 + i).drop(columns="Date")
+        df.index = pd.DatetimeIndex(dates.values, name="Date")
+        if i % 2:
+            # Missing bars exercise the exit/valuation skips
+            df = df[rng.random(n_bars) > drop_fraction]
+        data, _ = prepare_ticker_data(df)
+        all_data[ticker] = data
+    return all_data
+
+
+@pytest.mark.parametrize("seed", range(3))
+@pytest.mark.parametrize("make_sizer", [
+    lambda: FixedAmountPositionSizer(1000.),
+    lambda: FixedAmountPositionSizer(30000.),
+    lambda: KellyPositionSizer(100000),
+])
+def test_simulator_matches_reference(seed, make_sizer):
+    all_data = make_universe(8, 500, seed)
+
+    portfolio_df, trades_df, diagnostics = backtest_portfolio(all_data, make_sizer())
+    ref_portfolio_df, ref_trades_df, ref_diagnostics = backtest_portfolio_reference(
+        all_data, make_sizer()
+    )
+
+    assert diagnostics == ref_diagnostics
+    assert len(trades_df) > 0
+    pd.testing.assert_frame_equal(trades_df, ref_trades_df)
+    pd.testing.assert_frame_equal(portfolio_df, ref_portfolio_df)
+
+
+@pytest.mark.parametrize("seed", range(3))
+@pytest.mark.parametrize("num_rising_closes", [0, 1, 2, 3])
+def test_candidate_trades_match_reference(seed, num_rising_closes):
+    all_data = make_universe(8, 400, seed, drop_fraction=0.1)
+    counts = {"total_td_signals": 0, "signals_with_rising_closes": 0}
+    ref_counts = dict(counts)
+
+    trades = find_potential_trades(all_data, counts, 7, num_rising_closes)
+    ref_trades = find_potential_trades_reference(all_data, ref_counts, 7, num_rising_closes)
+    assert counts == ref_counts
+    assert len(trades) > 0
+    assert trades == ref_trades
+
+    # Small chunks give the same candidates
+    panel = Panel.from_frames(all_data, dtype=np.float64)
+    candidates, _ = find_candidate_trades(panel, num_rising_closes)
+    chunked, _ = find_candidate_trades(panel, num_rising_closes, chunk_size=3)
+    np.testing.assert_array_equal(candidates, chunked)
+
+
+def test_check_rising_closes_agrees_with_candidates():
+    all_data = make_universe(4, 400, 5)
+    panel = Panel.from_frames(all_data, dtype=np.float64)
+    candidates, _ = find_candidate_trades(panel)
+    for candidate in candidates:
+        ticker = panel.tickers[candidate["ticker"]]
+        signal_idx = all_data[ticker].index.get_loc(panel.dates[candidate["signal_row"]])
+        assert check_rising_closes(all_data, ticker, signal_idx)
+
+
+def fake_fetch_batch(symbols, start_date, end_date):
+    results = {}
+    for symbol in symbols:
+        df = make_ohlc(300, int(symbol[1:])).drop(columns="Date")
+        df.index = pd.DatetimeIndex(pd.bdate_range("2020-01-01", periods=300).values, name="Date")
+        results[symbol] = df.drop(columns="High") if symbol == "T99" else df
+    return results, {}
+
+
+def test_prepare_data_on_pool_matches_serial():
+    tickers = [f"T{i}" for i in range(5)]
+    serial = prepare_data(tickers, fetch_batch=fake_fetch_batch, use_cache=False, batch_size=2)
+    pooled = prepare_data(tickers, fetch_batch=fake_fetch_batch, use_cache=False, batch_size=2, n_processes=2)
+    assert list(pooled) == tickers
+    for ticker in tickers:
+        pd.testing.assert_frame_equal(pooled[ticker], serial[ticker])
+
+    panel = prepare_data(tickers, fetch_batch=fake_fetch_batch, use_cache=False, panel=True)
+    assert panel.field("Close").dtype == np.float64
+    small = prepare_data(tickers, fetch_batch=fake_fetch_batch, use_cache=False, panel=True, panel_dtype=np.float32)
+    assert small.field("Close").dtype == np.float32
+
+
+def test_prepare_data_shuts_pool_down_on_error(monkeypatch):
+    shutdowns = []
+    shutdown = parallel_demark.IndicatorPool.shutdown
+    monkeypatch.setattr(
+        parallel_demark.IndicatorPool, "shutdown", lambda self: shutdowns.append(shutdown(self))
+    )
+    with pytest.raises(KeyError):
+        # T99 has no High column, so submitting it to the pool fails
+        prepare_data(["T0", "T99"], fetch_batch=fake_fetch_batch, use_cache=False, batch_size=1, n_processes=1)
+    assert len(shutdowns) == 1
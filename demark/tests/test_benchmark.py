@@ -0,0 +1,46 @@
+import pandas as pd
+import pytest
+
+from benchmark import (
+    synthetic_ohlcv, synthetic_universe, run_benchmarks, compare, save_baseline, load_baseline, REGIMES,
+)
+
+"""
+    The synthetic data generator and the benchmark report / baseline round trip.
+"""
+
+
+@pytest.mark.parametrize("regime", REGIMES)
+def test_synthetic_ohlcv_is_seeded_and_consistent(regime):
+    df = synthetic_ohlcv(500, regime, seed=3)
+    pd.testing.assert_frame_equal(df, synthetic_ohlcv(500, regime, seed=3))
+    assert len(df) == 500 and df.index.is_monotonic_increasing
+    assert (df["High"] >= df[["Open", "Close"]].max(axis=1)).all()
+    assert (df["Low"] <= df[["Open", "Close"]].min(axis=1)).all()
+    assert (df["Low"] > 0).all()
+
+
+def test_synthetic_universe_has_market():
+    universe = synthetic_universe(5, 100)
+    assert len(universe) == 6 and "^GSPC" in universe
+
+
+def test_benchmark_report_round_trip(tmp_path):
+    report = run_benchmarks(n_tickers=3, n_bars=200, repeat=1)
+    assert set(report["results"]) == {
+        "identify_td_buy_setup", "identify_td_sell_setup",
+        "identify_td_buy_countdown", "identify_td_sell_countdown",
+        "prepare_data", "backtest_portfolio",
+    }
+    for result in report["results"].values():
+        assert result["seconds"] > 0 and result["bars_per_second"] > 0 and result["peak_memory_mb"] > 0
+
+    path = tmp_path / "baseline.json"
+    save_baseline(report, path)
+    comparison = compare(load_baseline(path), report)
+    assert (comparison["time_ratio"] == 1).all() and not comparison["regression"].any()
+
+    slower = {"meta": report["meta"], "results": {
+        name: dict(result, seconds=result["seconds"] * 2) for name, result in report["results"].items()
+    }}
+    assert compare(report, slower)["regression"].all()
@@ -0,0 +1,72 @@
+import numpy as np
+import pytest
+
+from backtest import backtest_portfolio, backtest_stats
+from bootstrap import block_indices, path_stats, bootstrap_returns, bootstrap_backtest, trade_returns
+from sizing import FixedAmountPositionSizer
+from test_backtest import make_universe
+
+"""
+    Bootstrap paths and statistics.
+"""
+
+
+@pytest.fixture(scope="module")
+def backtest():
+    portfolio_df, trades_df, _ = backtest_portfolio(make_universe(8, 500, 1), FixedAmountPositionSizer(5000.))
+    return portfolio_df, trades_df
+
+
+def test_block_indices_are_consecutive_runs():
+    indices = block_indices(np.random.default_rng(0), 50, 100, 37, block_size=5)
+    assert indices.shape == (100, 37)
+    assert indices.min() >= 0 and indices.max() < 50
+    # Inside a block each index follows the previous one
+    steps = np.diff(indices, axis=1)
+    assert (steps[:, np.arange(36) % 5 != 4] == 1).all()
+
+
+def test_path_stats_match_backtest_stats(backtest):
+    portfolio_df, trades_df = backtest
+    returns = portfolio_df["portfolio_value"].pct_change().to_numpy()[1:]
+    stats = path_stats(returns[None, :], 252)
+    expected = backtest_stats(portfolio_df, trades_df)
+
+    assert stats["sharpe_ratio"][0] == pytest.approx(expected["sharpe_ratio"])
+    assert stats["max_drawdown"][0] == pytest.approx(expected["max_drawdown"])
+    assert stats["final_pnl"][0] == pytest.approx(expected["pnl"])
+
+
+def test_results_depend_on_seed_not_processes():
+    returns = np.random.default_rng(0).normal(0.0005, 0.01, 300)
+    serial = bootstrap_returns(returns, 2500, 10, seed=3, chunk_size=1000)
+    parallel = bootstrap_returns(returns, 2500, 10, seed=3, chunk_size=1000, n_processes=2)
+    other = bootstrap_returns(returns, 2500, 10, seed=4, chunk_size=1000)
+
+    for metric, values in serial.items():
+        assert len(values) == 2500
+        np.testing.assert_array_equal(parallel[metric], values)
+    assert not np.array_equal(other["final_pnl"], serial["final_pnl"])
+
+
+def test_trade_returns_rebuild_pnl(backtest):
+    _, trades_df = backtest
+    returns = trade_returns(trades_df, 100000)
+    pnl = (trades_df["final_value"] - trades_df["initial_value"]).sum()
+    assert 100000 * np.prod(1 + returns) - 100000 == pytest.approx(pnl)
+
+
+@pytest.mark.parametrize("method", ["daily", "trades"])
+def test_bootstrap_backtest_intervals(backtest, method):
+    portfolio_df, trades_df = backtest
+    intervals = bootstrap_backtest(portfolio_df, trades_df, method, n_paths=2000)
+    assert list(intervals.index) == ["sharpe_ratio", "max_drawdown", "final_pnl"]
+    assert list(intervals.columns) == ["mean", "median", "q0.05", "q0.95"]
+    assert (intervals["q0.05"] <= intervals["median"]).all()
+    assert (intervals["median"] <= intervals["q0.95"]).all()
+    assert (intervals.loc["max_drawdown"] <= 0).all()
+
+
+def test_unknown_method(backtest):
+    with pytest.raises(ValueError):
+        bootstrap_backtest(*backtest, method="weekly")
@@ -0,0 +1,35 @@
+import pandas as pd
+import pytest
+
+from setup_demark import identify_td_buy_setup, identify_td_sell_setup
+from countdown_demark import identify_td_buy_countdown, identify_td_sell_countdown
+from reference_impl import identify_td_buy_countdown_reference, identify_td_sell_countdown_reference
+from test_setup_demark import make_ohlc
+
+"""
+    Parity of the single-pass countdown engine against the original loops.
+"""
+
+
+@pytest.mark.parametrize("seed", range(4))
+@pytest.mark.parametrize("drift", [-0.001, 0.0, 0.001])
+def test_buy_countdown_matches_reference(seed, drift):
+    df = identify_td_buy_setup(make_ohlc(1000, seed, drift=drift))
+    pd.testing.assert_frame_equal(
+        identify_td_buy_countdown(df), identify_td_buy_countdown_reference(df)
+    )
+
+
+@pytest.mark.parametrize("seed", range(4))
+@pytest.mark.parametrize("drift", [-0.001, 0.0, 0.001])
+def test_sell_countdown_matches_reference(seed, drift):
+    df = identify_td_sell_setup(make_ohlc(1000, seed, drift=drift))
+    pd.testing.assert_frame_equal(
+        identify_td_sell_countdown(df), identify_td_sell_countdown_reference(df)
+    )
+
+
+def test_countdown_without_setups_adds_nothing():
+    df = make_ohlc(100, seed=3)
+    pd.testing.assert_frame_equal(identify_td_buy_countdown(df), df)
+    pd.testing.assert_frame_equal(identify_td_sell_countdown(df), df)
@@ -0,0 +1,214 @@
+import os
+import pandas as pd
+import numpy as np
+import pytest
+
+from data import OHLCVCache, download_universe
+
+"""
+    OHLCV cache against a fake, offline downloader.
+"""
+
+
+class FakeDownloader:
+    def __init__(self):
+        # Like yf.download, the index carries no freq
+        dates = pd.DatetimeIndex(pd.bdate_range("2010-01-01", "2024-12-31").values, name="Date")
+        close = 100 + np.arange(len(dates), dtype=float)
+        self.history = pd.DataFrame({
+            "Open": close - 0.5,
+            "High": close + 1,
+            "Low": close - 1,
+            "Close": close,
+            "Volume": np.arange(len(dates), dtype=np.int64),
+        }, index=dates)
+        self.calls = []
+
+    def __call__(self, symbol, start_date, end_date):
+        self.calls.append((symbol, start_date, end_date))
+        data = self.history.loc[start_date:end_date]
+        data = data[data.index < pd.Timestamp(end_date)]
+        return data if not data.empty else None
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = pd.Timestamp("2025-01-10").timestamp()
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def downloader():
+    return FakeDownloader()
+
+
+@pytest.fixture
+def cache(tmp_path, downloader):
+    return OHLCVCache(str(tmp_path), downloader, clock=FakeClock())
+
+
+def expected(downloader, start_date, end_date):
+    data = downloader.history
+    return data[(data.index >= start_date) & (data.index < end_date)]
+
+
+def test_warm_read_does_not_download(cache, downloader):
+    first = cache.get("AAPL", "2020-01-01", "2023-01-01")
+    second = cache.get("AAPL", "2020-01-01", "2023-01-01")
+
+    assert len(downloader.calls) == 1
+    pd.testing.assert_frame_equal(first, expected(downloader, "2020-01-01", "2023-01-01"))
+    pd.testing.assert_frame_equal(second, first)
+
+
+def test_sub_range_is_served_from_cache(cache, downloader):
+    cache.get("AAPL", "2020-01-01", "2023-01-01")
+    sub = cache.get("AAPL", "2021-03-01", "2021-06-01")
+
+    assert len(downloader.calls) == 1
+    pd.testing.assert_frame_equal(sub, expected(downloader, "2021-03-01", "2021-06-01"))
+
+
+def test_only_missing_ranges_are_downloaded(cache, downloader):
+    cache.get("AAPL", "2020-01-01", "2023-01-01")
+    data = cache.get("AAPL", "2019-01-01", "2024-01-01")
+
+    assert downloader.calls[1:] == [
+        ("AAPL", "2019-01-01", "2020-01-01"),
+        ("AAPL", "2023-01-01", "2024-01-01"),
+    ]
+    pd.testing.assert_frame_equal(data, expected(downloader, "2019-01-01", "2024-01-01"))
+
+    cache.get("AAPL", "2019-06-01", "2023-06-01")
+    assert len(downloader.calls) == 3
+
+
+def test_stale_tail_is_refetched(cache, downloader):
+    cache.get("AAPL", "2024-01-01", "2025-01-15")
+    cache.get("AAPL", "2024-01-01", "2025-01-15")
+    assert len(downloader.calls) == 1
+
+    # A day later the bars from the previous fetch day onwards are refreshed
+    cache.clock.now += 24 * 3600
+    cache.get("AAPL", "2024-01-01", "2025-01-15")
+    assert downloader.calls[-1] == ("AAPL", "2025-01-10", "2025-01-15")
+
+
+def test_empty_stale_tail_is_not_refetched_until_stale_again(cache, downloader):
+    # The fake history ends on 2024-12-31, nothing trades after it
+    cache.get("SPY", "2024-12-01", "2025-01-20")
+    cache.clock.now += 24 * 3600
+    cache.get("SPY", "2024-12-01", "2025-01-20")
+    assert downloader.calls[-1] == ("SPY", "2025-01-10", "2025-01-20")
+
+    # The empty answer is recorded, so the next reads stay offline
+    cache.get("SPY", "2024-12-01", "2025-01-20")
+    assert cache.covers("SPY", "2025-01-11", "2025-01-20")
+    assert len(downloader.calls) == 2
+
+    cache.clock.now += 24 * 3600
+    data = cache.get("SPY", "2024-12-01", "2025-01-20")
+    assert downloader.calls[-1] == ("SPY", "2025-01-11", "2025-01-20")
+    pd.testing.assert_frame_equal(data, expected(downloader, "2024-12-01", "2025-01-20"), check_freq=False)
+
+
+def test_missing_symbol_returns_none(cache, downloader):
+    downloader.history = downloader.history.iloc[:0]
+    assert cache.get("NOPE", "2020-01-01", "2021-01-01") is None
+
+
+def test_least_recently_used_symbols_are_evicted(tmp_path, downloader):
+    clock = FakeClock()
+    cache = OHLCVCache(str(tmp_path), downloader, max_bytes=150_000, clock=clock)
+
+    for symbol in ["AAA", "BBB", "CCC"]:
+        clock.now += 1
+        cache.get(symbol, "2015-01-01", "2020-01-01")
+    clock.now += 1
+    cache.get("AAA", "2015-01-01", "2020-01-01")
+    clock.now += 1
+    cache.get("DDD", "2015-01-01", "2020-01-01")
+
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["AAA", "DDD"]
+
+
+class FakeBatchDownloader:
+    def __init__(self, downloader, missing=()):
+        self.downloader = downloader
+        self.missing = set(missing)
+        self.batches = []
+
+    def __call__(self, symbols, start_date, end_date):
+        self.batches.append(list(symbols))
+        results = {
+            symbol: self.downloader(symbol, start_date, end_date)
+            for symbol in symbols
+            if symbol not in self.missing
+        }
+        errors = {symbol: "delisted" for symbol in symbols if symbol in self.missing}
+        return results, errors
+
+
+def test_eviction_order_survives_a_new_cache_object(tmp_path, downloader):
+    clock = FakeClock()
+    cache = OHLCVCache(str(tmp_path), downloader, max_bytes=150_000, clock=clock)
+    for symbol in ["AAA", "BBB"]:
+        clock.now += 1
+        cache.get(symbol, "2015-01-01", "2020-01-01")
+    meta = (tmp_path / "AAA" / "meta.json").read_text()
+    clock.now += 1
+    cache.get("AAA", "2015-01-01", "2020-01-01")
+    # A warm read only touches meta.json
+    assert (tmp_path / "AAA" / "meta.json").read_text() == meta
+
+    clock.now += 1
+    OHLCVCache(str(tmp_path), downloader, max_bytes=150_000, clock=clock).get("CCC", "2015-01-01", "2020-01-01")
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["AAA", "CCC"]
+
+
+def test_cold_fill_scans_the_cache_once(tmp_path, downloader, monkeypatch):
+    scanned = []
+    scandir = os.scandir
+
+    def counting_scandir(path):
+        scanned.append(os.fspath(path))
+        return scandir(path)
+
+    monkeypatch.setattr(os, "scandir", counting_scandir)
+    cache = OHLCVCache(str(tmp_path), downloader, clock=FakeClock())
+    for i in range(20):
+        cache.get(f"S{i}", "2020-01-01", "2021-01-01")
+    assert scanned.count(str(tmp_path)) == 1
+
+
+def test_download_universe_batches_and_reports_errors(cache, downloader):
+    symbols = [f"S{i}" for i in range(7)]
+    fetch_batch = FakeBatchDownloader(downloader, missing={"S3"})
+
+    results = {
+        symbol: (data, error)
+        for symbol, data, error in download_universe(
+            symbols, "2020-01-01", "2021-01-01", fetch_batch,
+            cache=cache, max_workers=3, batch_size=3,
+        )
+    }
+
+    assert sorted(map(len, fetch_batch.batches)) == [1, 3, 3]
+    assert sorted(results) == symbols
+    assert results["S3"] == (None, "delisted")
+    pd.testing.assert_frame_equal(
+        results["S0"][0], expected(downloader, "2020-01-01", "2021-01-01")
+    )
+
+
+def test_download_universe_warm_run_does_not_download(cache, downloader):
+    symbols = ["AAA", "BBB"]
+    fetch_batch = FakeBatchDownloader(downloader)
+    list(download_universe(symbols, "2020-01-01", "2021-01-01", fetch_batch, cache=cache))
+    warm = list(download_universe(symbols, "2020-01-01", "2021-01-01", fetch_batch, cache=cache))
+
+    assert len(fetch_batch.batches) == 1
+    assert [symbol for symbol, _, _ in warm] == symbols
+    assert all(error is None for _, _, error in warm)
@@ -1,95 +1,198 @@
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
 import pandas as pd
 import numpy as np
-from datetime import datetime, timedelta
-import matplotlib.dates as mdates
+import pytest
 from utils_demark import yf_retry_download
 
-from setup_demark import identify_td_buy_setup
-from countdown_demark import identify_td_buy_countdown
+from signals_demark import identify_td_events, signal_mask, BUY_COUNTDOWN
 
 """
     Backtesting my TD Combo Buy indicator implementation.
+
+    The OHLC of every test case is frozen into FIXTURE_DIR (one CSV per
+    ticker, from the local download cache) so the accuracy report runs
+    offline and in parallel:
+
+        python tests/test_indicator.py --freeze   # once, needs network
+        python tests/test_indicator.py
+
+    The tests only check the matching and the evaluation on synthetic data.
 """
 
 start_date = "2023-01-01"
 end_date = "2024-11-09"
 window = 2
 
-def get_hits_and_misses(ticker, correct_dates):
-
-    try:
-        # Get the data
+FIXTURE_DIR = os.environ.get(
+    "DEMARK_FIXTURE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "ohlc")
+)
+
+TEST_CASES = {
+    "MMM": ["2023-10-04",
+            "2023-10-20",
+            "2023-09-21",
+            "2023-03-10"],
+    "ABT": ["2024-05-29",
+            "2023-09-25"],
+    "^HSI": ["2023-03-20",
+             "2023-10-20",
+             "2024-07-24"],
+    "^MXX": ["2023-10-13",
+             "2023-10-19"],
+    "ABNB": ["2023-10-27"],
+    "AEE": ["2023-09-27"],
+    "ADM": ["2023-03-10",
+            "2024-01-18"],
+    "BA": ["2024-03-18", #boeing
+           "2024-03-13",
+           "2023-09-25"],
+    "CPT": ["2023-03-23",
+            "2023-09-21",
+            "2023-10-30"],
+    "CVX": ["2024-09-04"], #chevron
+    "CINF": ["2023-03-16",
+             "2023-05-30"],
+    "CAG": ["2023-02-16",
+            "2023-07-31",
+            "2023-08-08",
+            "2023-08-21",
+            "2023-09-01",
+            "2023-10-04"],
+    "CSX": ["2024-04-24",
+            "2024-06-10"],
+    "DECK": ["2024-07-25"],
+    "DXCM": ["2023-09-18",
+             "2023-09-21"],
+    "DLTR": ["2024-11-06",
+             "2024-08-02",
+             "2024-05-22",
+             "2023-09-05"]
+    }
+
+
+def fixture_path(ticker, fixture_dir=FIXTURE_DIR):
+    return os.path.join(fixture_dir, f"{ticker}.csv")
+
+
+def freeze_fixtures(test_cases=TEST_CASES, fixture_dir=FIXTURE_DIR):
+    """Write the OHLC of every ticker (through the local cache) as a CSV fixture."""
+    os.makedirs(fixture_dir, exist_ok=True)
+    for ticker in test_cases:
         data = yf_retry_download(ticker, start_date, end_date)
-        if data is None or len(data) < 50:
-            print(f"Insufficient data for {ticker}")
-            return 0, len(correct_dates), 0
-
-        # Prepare data
-        data.reset_index(inplace=True)
-        data["Date"] = data["Date"].map(mdates.date2num)
+        if data is None:
+            print(f"No data for {ticker}, not frozen")
+            continue
+        data[["Open", "High", "Low", "Close"]].to_csv(fixture_path(ticker, fixture_dir))
 
-        # Calculate indicators
-        data = identify_td_buy_setup(data)
-        data = identify_td_buy_countdown(data)
 
-        # Convert dates back to datetime for comparison
-        data["Date"] = pd.to_datetime(mdates.num2date(data["Date"]))
+def load_fixture(ticker, fixture_dir=FIXTURE_DIR):
+    """Frozen OHLC of ticker, or None if it was never frozen."""
+    path = fixture_path(ticker, fixture_dir)
+    if not os.path.exists(path):
+        return None
+    return pd.read_csv(path, index_col="Date", parse_dates=["Date"])
 
-        # Find all countdown 13 signals
-        countdown_cols = [col for col in data.columns if col.startswith("TD_Buy_Countdown_")]
-        signal_dates = []
 
-        for col in countdown_cols:
-            dates = data[data[col] == 13]["Date"].dt.strftime("%Y-%m-%d").tolist()
-            signal_dates.extend(dates)
+def buy_signal_dates(data):
+    """Sorted datetime64[D] dates of every TD Buy Countdown 13 in data."""
+    events = identify_td_events(data, kinds=(BUY_COUNTDOWN,))
+    mask = signal_mask(events, len(data), BUY_COUNTDOWN, 13)
+    return np.unique(data.index.to_numpy()[mask].astype("datetime64[D]"))
 
-        signal_dates = sorted(list(set(signal_dates)))  # Remove duplicates
 
-        # Count hits and misses
-        hits = 0
-        used_signals = set()
+def _next_free(next_free, i):
+    """First unused signal at or after i (union-find with path halving)."""
+    while next_free[i] != i:
+        next_free[i] = next_free[next_free[i]]
+        i = next_free[i]
+    return i
 
-        # For each correct date, look for nearby signals
-        for correct_date in correct_dates:
-            correct_dt = datetime.strptime(correct_date, "%Y-%m-%d")
-            found_match = False
 
-            # Look for signals within the window
-            for signal_date in signal_dates:
-                signal_dt = datetime.strptime(signal_date, "%Y-%m-%d")
-                days_diff = abs((signal_dt - correct_dt).days)
+def match_signals(signal_dates, correct_dates, window=window):
+    """
+    Match each correct date, in order, to the earliest signal within window
+    days that no earlier correct date took. signal_dates must be sorted
+    datetime64 dates. Returns (hit per correct date, used per signal).
+    """
+    correct = np.asarray(correct_dates, dtype="datetime64[D]")
+    span = np.timedelta64(window, "D")
+    lo = np.searchsorted(signal_dates, correct - span, side="left")
+    hi = np.searchsorted(signal_dates, correct + span, side="right")
+
+    hits = np.zeros(len(correct), dtype=bool)
+    used = np.zeros(len(signal_dates), dtype=bool)
+    next_free = np.arange(len(signal_dates) + 1)
+    for i in range(len(correct)):
+        j = _next_free(next_free, lo[i])
+        if j < hi[i]:
+            hits[i] = True
+            used[j] = True
+            next_free[j] = j + 1
+    return hits, used
+
+
+def get_hits_and_misses(ticker, correct_dates, data=None):
+    """
+    Compare the Buy Countdown 13s on ticker with correct_dates. data is the
+    ticker's OHLC, downloaded when not given.
+    """
+    try:
+        # Get the data
+        if data is None:
+            data = yf_retry_download(ticker, start_date, end_date)
+        if data is None or len(data) < 50:
+            print(f"Insufficient data for {ticker}")
+            return 0, len(correct_dates), 0
 
-                if days_diff <= window and signal_date not in used_signals:
-                    hits += 1
-                    used_signals.add(signal_date)
-                    found_match = True
-                    break
+        signal_dates = buy_signal_dates(data)
+        hits, used = match_signals(signal_dates, correct_dates)
 
-            if not found_match:
-                print(f"Missed signal for {ticker} on {correct_date}")
+        for correct_date in np.asarray(correct_dates)[~hits]:
+            print(f"Missed signal for {ticker} on {correct_date}")
 
         # Calculate all types of errors
-        misses = len(correct_dates) - hits  # Signals we should have found but didn't
-        false_positives = len(signal_dates) - len(used_signals)  # Extra signals we generated
+        hit_count = int(hits.sum())
+        misses = len(correct_dates) - hit_count  # Signals we should have found but didn't
+        false_positives = int((~used).sum())  # Extra signals we generated
 
         if false_positives > 0:
             print(f"Warning: {false_positives} extra signals generated for {ticker}")
-            print("Extra signals on:", [d for d in signal_dates if d not in used_signals])
+            print("Extra signals on:", [str(d) for d in signal_dates[~used]])
 
-        return hits, misses, false_positives
+        return hit_count, misses, false_positives
 
     except Exception as e:
         print(f"Error processing {ticker}: {str(e)}")
         return 0, len(correct_dates), 0
 
 
-def test_buy_indicators(test_cases):
+def _evaluate_fixture(ticker, correct_dates, fixture_dir):
+    data = load_fixture(ticker, fixture_dir)
+    if data is None:
+        print(f"No fixture for {ticker} in {fixture_dir}")
+        return 0, len(correct_dates), 0
+    return get_hits_and_misses(ticker, correct_dates, data)
+
+
+def evaluate_buy_indicators(test_cases=TEST_CASES, fixture_dir=FIXTURE_DIR, n_processes=None):
     """
-    Test TD buy signals against known correct dates.
-    
+    Test TD buy signals against known correct dates, on the frozen fixtures.
+
     Args:
         test_cases (dict): Dictionary of ticker: [dates] pairs
+        n_processes (int): evaluate the tickers on a process pool of this size
     """
+    tickers = list(test_cases)
+    correct = [test_cases[ticker] for ticker in tickers]
+    dirs = [fixture_dir] * len(tickers)
+    if n_processes:
+        with ProcessPoolExecutor(n_processes) as executor:
+            outcomes = list(executor.map(_evaluate_fixture, tickers, correct, dirs))
+    else:
+        outcomes = list(map(_evaluate_fixture, tickers, correct, dirs))
+
     total_hits = 0
     total_misses = 0
     total_false_positives = 0
@@ -98,10 +201,7 @@ def test_buy_indicators(test_cases):
     print("Testing TD Buy Signals...")
     print("-" * 50)
 
-    for ticker, correct_dates in test_cases.items():
-        print(f"\nProcessing {ticker}...")
-        hits, misses, false_positives = get_hits_and_misses(ticker, correct_dates)
-
+    for ticker, (hits, misses, false_positives) in zip(tickers, outcomes):
         # Calculate accuracy including false positives as errors
         total_attempts = hits + misses + false_positives
         accuracy = hits / total_attempts if total_attempts > 0 else 0
@@ -117,7 +217,7 @@ def test_buy_indicators(test_cases):
         total_misses += misses
         total_false_positives += false_positives
 
-        print(f"Results for {ticker}:")
+        print(f"\nResults for {ticker}:")
         print(f"Hits: {hits}")
         print(f"Misses: {misses}")
         print(f"False Positives: {false_positives}")
@@ -137,49 +237,57 @@ def test_buy_indicators(test_cases):
     return results
 
 
-if __name__ == "__main__":
-    test_cases = {
-        "MMM": ["2023-10-04",
-                "2023-10-20",
-                "2023-09-21",
-                "2023-03-10"],
-        "ABT": ["2024-05-29",
-                "2023-09-25"],
-        "^HSI": ["2023-03-20",
-                 "2023-10-20",
-                 "2024-07-24"],
-        "^MXX": ["2023-10-13",
-                 "2023-10-19"],
-        "ABNB": ["2023-10-27"],
-        "AEE": ["2023-09-27"],
-        "ADM": ["2023-03-10",
-                "2024-01-18"],
-        "BA": ["2024-03-18", #boeing
-               "2024-03-13",
-               "2023-09-25"],
-        "CPT": ["2023-03-23",
-                "2023-09-21",
-                "2023-10-30"],
-        "CVX": ["2024-09-04"], #chevron
-        "CINF": ["2023-03-16",
-                 "2023-05-30"],
-        "CAG": ["2023-02-16",
-                "2023-07-31",
-                "2023-08-08",
-                "2023-08-21",
-                "2023-09-01",
-                "2023-10-04"],
-        "CSX": ["2024-04-24",
-                "2024-06-10"],
-        "DECK": ["2024-07-25"],
-        "DXCM": ["2023-09-18",
-                 "2023-09-21"],
-        "DLTR": ["2024-11-06",
-                 "2024-08-02",
-                 "2024-05-22",
-                 "2023-09-05"]
-        }
-
-    results = test_buy_indicators(test_cases)
+def match_signals_reference(signal_dates, correct_dates, window=window):
+    """The original nested loop over date strings, for the tests below."""
+    used_signals = set()
+    hits = []
+    for correct_date in correct_dates:
+        correct_dt = pd.Timestamp(correct_date)
+        found_match = False
+        for signal_date in signal_dates:
+            if abs((pd.Timestamp(signal_date) - correct_dt).days) <= window and signal_date not in used_signals:
+                used_signals.add(signal_date)
+                found_match = True
+                break
+        hits.append(found_match)
+    return hits, used_signals
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_match_signals_matches_nested_loop(seed):
+    rng = np.random.default_rng(seed)
+    days = np.datetime64("2023-01-01") + rng.integers(0, 120, 40).astype("timedelta64[D]")
+    signal_dates = np.unique(days[:25])
+    correct_dates = [str(d) for d in days[25:]]
+
+    hits, used = match_signals(signal_dates, correct_dates)
+    ref_hits, ref_used = match_signals_reference([str(d) for d in signal_dates], correct_dates)
+    assert hits.tolist() == ref_hits
+    assert {str(d) for d in signal_dates[used]} == ref_used
+
+
+def test_evaluate_offline_in_parallel(tmp_path):
+    # Synthetic fixtures whose truth is their own 13s, one day off
+    from test_setup_demark import make_ohlc
+
+    test_cases = {}
+    for i in range(4):
+        data = make_ohlc(500, i).drop(columns="Date")
+        data.index = pd.bdate_range(start_date, periods=len(data), name="Date")
+        data.to_csv(fixture_path(f"T{i}", tmp_path))
+        signals = buy_signal_dates(data)
+        test_cases[f"T{i}"] = [str(d + np.timedelta64(1, "D")) for d in signals]
+    test_cases["MISSING"] = ["2023-05-01"]
+
+    results = evaluate_buy_indicators(test_cases, tmp_path, n_processes=2)
+    assert results == evaluate_buy_indicators(test_cases, tmp_path)
+    for i in range(4):
+        assert results[f"T{i}"]["misses"] == 0
+        assert results[f"T{i}"]["false_positives"] == 0
+    assert results["MISSING"]["misses"] == 1
 
 
+if __name__ == "__main__":
+    if "--freeze" in sys.argv:
+        freeze_fixtures()
+    results = evaluate_buy_indicators(n_processes=os.cpu_count())
@@ -0,0 +1,71 @@
+import pandas as pd
+import numpy as np
+import pytest
+
+from backtest import backtest_portfolio, INITIAL_CAPITAL
+from metrics import equity_metrics, portfolio_metrics, score_runs, ticker_breakdown
+from sizing import FixedAmountPositionSizer
+from test_backtest import make_universe
+
+"""
+    Metrics against pandas computations of the same definitions.
+"""
+
+
+def make_equity(n_runs, n_bars, seed):
+    returns = np.random.default_rng(seed).normal(0.0005, 0.01, (n_runs, n_bars))
+    return INITIAL_CAPITAL * np.cumprod(1 + returns, axis=1)
+
+
+def test_single_curve_matches_pandas():
+    values = pd.Series(make_equity(1, 500, 0)[0])
+    metrics = equity_metrics(values.to_numpy(), INITIAL_CAPITAL)
+
+    daily_returns = values.pct_change()
+    rolling_max = values.expanding().max()
+    assert metrics["sharpe_ratio"] == pytest.approx(np.sqrt(252) * daily_returns.mean() / daily_returns.std())
+    assert metrics["max_drawdown"] == pytest.approx(((values - rolling_max) / rolling_max).min() * 100)
+    assert metrics["total_return"] == pytest.approx((values.iloc[-1] / INITIAL_CAPITAL - 1) * 100)
+    downside = np.sqrt((daily_returns.clip(upper=0) ** 2).mean())
+    assert metrics["sortino_ratio"] == pytest.approx(np.sqrt(252) * daily_returns.mean() / downside)
+    assert metrics["calmar_ratio"] == pytest.approx(metrics["cagr"] / -metrics["max_drawdown"])
+
+
+def test_drawdown_duration():
+    equity = np.array([100, 110, 105, 100, 108, 111, 90, 95, 112, 112])
+    metrics = equity_metrics(equity)
+    # 3 bars below 110, then 2 below 111
+    assert metrics["max_drawdown_duration"] == 3
+    assert metrics["max_drawdown"] == pytest.approx((90 / 111 - 1) * 100)
+    assert np.isnan(equity_metrics(np.arange(1, 10.))["calmar_ratio"])
+
+
+def test_batch_matches_single_curves():
+    equities = make_equity(5, 300, 1)
+    batch = equity_metrics(equities, INITIAL_CAPITAL)
+    for run, equity in enumerate(equities):
+        single = equity_metrics(equity, INITIAL_CAPITAL)
+        for name, value in single.items():
+            assert batch[name][run] == pytest.approx(value)
+
+
+def test_backtest_metrics_and_scoring():
+    portfolio_df, trades_df, _ = backtest_portfolio(make_universe(6, 400, 2), FixedAmountPositionSizer(5000.))
+    metrics = portfolio_metrics(portfolio_df, trades_df, INITIAL_CAPITAL)
+
+    assert metrics["total_trades"] == len(trades_df)
+    assert 0 < metrics["exposure"] <= 100
+    per_ticker = metrics["per_ticker"]
+    assert per_ticker["trades"].sum() == len(trades_df)
+    assert per_ticker["pnl"].sum() == pytest.approx((trades_df["final_value"] - trades_df["initial_value"]).sum())
+
+    table = score_runs(
+        [portfolio_df["portfolio_value"]] * 2, [portfolio_df["n_positions"]] * 2, [trades_df] * 2, INITIAL_CAPITAL
+    )
+    assert len(table) == 2
+    for name in ("sharpe_ratio", "max_drawdown", "exposure", "turnover", "win_rate"):
+        assert table[name].iloc[1] == pytest.approx(metrics[name])
+
+
+def test_empty_breakdown():
+    assert ticker_breakdown(pd.DataFrame()).empty
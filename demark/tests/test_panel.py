@@ -0,0 +1,85 @@
+import pandas as pd
+import numpy as np
+import pytest
+
+from backtest import backtest_portfolio
+import panel as panel_module
+from panel import Panel
+from sizing import FixedAmountPositionSizer, KellyPositionSizer
+from test_backtest import make_universe
+
+"""
+    The columnar Panel against the dict of frames it is built from.
+"""
+
+FIELDS = ["Open", "High", "Low", "Close", "TD_Signal"]
+
+
+@pytest.fixture(scope="module")
+def all_data():
+    return make_universe(6, 300, 1)
+
+
+def test_round_trip(all_data):
+    panel = Panel.from_frames(all_data, dtype=np.float64)
+    assert list(panel) == list(all_data) and len(panel) == len(all_data)
+    assert panel.field("TD_Signal").dtype == bool
+    for ticker, data in all_data.items():
+        pd.testing.assert_frame_equal(panel[ticker], data[FIELDS], check_freq=False)
+        col = panel.column(ticker)
+        assert panel.valid[:, col].sum() == len(data)
+        assert np.isnan(panel.field("Close")[~panel.valid[:, col], col]).all()
+
+    date = all_data["T1"].index[100]
+    assert panel.dates[panel.row(date)] == date
+
+
+def test_slicing(all_data):
+    assert Panel.from_frames(all_data).field("Close").dtype == np.float64
+    panel = Panel.from_frames(all_data, dtype=np.float32)
+    assert panel.field("Close").dtype == np.float32
+
+    window = panel.slice_dates("2020-03-01", "2020-06-30")
+    tz = panel.dates.tz
+    assert window.dates[0] >= pd.Timestamp("2020-03-01", tz=tz)
+    assert window.dates[-1] <= pd.Timestamp("2020-06-30", tz=tz)
+    assert np.shares_memory(window.field("Close"), panel.field("Close"))
+
+    subset = panel.select(["T3", "T0"])
+    assert subset.tickers == ["T3", "T0"]
+    np.testing.assert_array_equal(subset.field("High")[:, 0], panel.field("High")[:, panel.column("T3")])
+
+
+@pytest.mark.parametrize("make_sizer", [
+    lambda: FixedAmountPositionSizer(5000.),
+    lambda: KellyPositionSizer(100000),
+])
+def test_backtest_on_panel(all_data, make_sizer):
+    portfolio_df, trades_df, diagnostics = backtest_portfolio(all_data, make_sizer())
+
+    panel = Panel.from_frames(all_data)
+    panel_portfolio_df, panel_trades_df, panel_diagnostics = backtest_portfolio(panel, make_sizer())
+    assert panel_diagnostics == diagnostics
+    pd.testing.assert_frame_equal(panel_trades_df, trades_df)
+    pd.testing.assert_frame_equal(panel_portfolio_df, portfolio_df)
+
+    # float32 prices only move the results by rounding
+    panel = Panel.from_frames(all_data, dtype=np.float32)
+    f32_portfolio_df, f32_trades_df, _ = backtest_portfolio(panel, make_sizer())
+    assert len(f32_trades_df) == len(trades_df)
+    np.testing.assert_allclose(f32_portfolio_df["portfolio_value"], portfolio_df["portfolio_value"], rtol=1e-5)
+
+
+def test_frame_cache_is_bounded(all_data, monkeypatch):
+    monkeypatch.setattr(panel_module, "FRAME_CACHE_SIZE", 2)
+    panel = Panel.from_frames(all_data, dtype=np.float64)
+    tickers = list(panel)
+    first = panel[tickers[0]]
+    panel[tickers[1]]
+    assert panel[tickers[0]] is first
+    panel[tickers[2]]
+    # tickers[1] was the least recently used
+    assert list(panel._frames) == [tickers[0], tickers[2]]
+    for ticker in tickers:
+        panel[ticker]
+    assert len(panel._frames) == 2
@@ -0,0 +1,56 @@
+import os
+from multiprocessing import shared_memory
+import pandas as pd
+import pytest
+
+from parallel_demark import IndicatorPool
+from signals_demark import identify_td_events
+from test_setup_demark import make_ohlc
+
+"""
+    The process pool must give the same events as the serial engine, in
+    submission order.
+"""
+
+
+def test_pool_matches_serial_in_submission_order():
+    frames = {f"T{seed}": make_ohlc(800 + 50 * seed, seed) for seed in range(6)}
+
+    with IndicatorPool(n_processes=3) as pool:
+        for ticker, df in frames.items():
+            pool.submit(ticker, df)
+        results = list(pool.results())
+
+    assert [ticker for ticker, _ in results] == list(frames)
+    for ticker, events in results:
+        pd.testing.assert_frame_equal(events, identify_td_events(frames[ticker]))
+
+
+def test_pool_handles_empty_frame():
+    with IndicatorPool(n_processes=1) as pool:
+        pool.submit("EMPTY", make_ohlc(0, seed=0))
+        [(ticker, events)] = list(pool.results())
+
+    assert ticker == "EMPTY"
+    assert events.empty
+
+
+def test_pool_frees_unread_blocks_on_error():
+    with pytest.raises(KeyboardInterrupt):
+        with IndicatorPool(n_processes=1) as pool:
+            pool.submit("T0", make_ohlc(500, seed=0))
+            names = [shm.name for _, _, shm in pool.pending]
+            raise KeyboardInterrupt
+
+    for name in names:
+        with pytest.raises(FileNotFoundError):
+            shared_memory.SharedMemory(name=name)
+
+
+def test_submit_frees_its_block_when_a_column_is_missing():
+    before = set(os.listdir("/dev/shm"))
+    with IndicatorPool(n_processes=1) as pool:
+        with pytest.raises(KeyError):
+            pool.submit("T0", make_ohlc(500, seed=0).drop(columns="High"))
+        assert pool.pending == []
+    assert set(os.listdir("/dev/shm")) <= before
@@ -0,0 +1,108 @@
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+import numpy as np
+import pytest
+
+from plot_demark import (
+    OHLCChart, chart_arrays, downsample_ohlc, ohlc_segments, label_positions, save_charts,
+    COMPLETED_COUNTS,
+)
+from setup_demark import identify_td_buy_setup, identify_td_sell_setup
+from countdown_demark import identify_td_buy_countdown
+from signals_demark import events_from_wide
+from test_setup_demark import make_ohlc
+
+"""
+    The batched chart renderer: segments, downsampling and count labels.
+"""
+
+
+def make_chart_data(n_bars, seed):
+    df = make_ohlc(n_bars, seed)
+    df = identify_td_buy_setup(df)
+    df = identify_td_sell_setup(df)
+    return identify_td_buy_countdown(df)
+
+
+def test_segments_match_per_bar_lines():
+    df = make_ohlc(50, 0)
+    dates, open_, high, low, close = chart_arrays(df)
+    segments = ohlc_segments(dates, open_, high, low, close)
+    assert segments.shape == (150, 2, 2)
+    for i, row in enumerate(df.itertuples()):
+        np.testing.assert_allclose(segments[i], [[row.Date, row.Low], [row.Date, row.High]])
+        np.testing.assert_allclose(segments[50 + i], [[row.Date - 0.2, row.Open], [row.Date, row.Open]])
+        np.testing.assert_allclose(segments[100 + i], [[row.Date, row.Close], [row.Date + 0.2, row.Close]])
+
+
+def test_downsample_merges_bars():
+    dates, open_, high, low, close = chart_arrays(make_ohlc(1001, 1))
+    d, o, h, l, c, factor = downsample_ohlc(dates, open_, high, low, close, max_bars=100)
+    assert factor == 11 and len(d) == 91
+    assert o[3] == open_[33] and c[3] == close[43] and c[-1] == close[-1]
+    assert h[3] == high[33:44].max() and l[-1] == low[990:].min()
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_labels_cover_every_count(seed):
+    df = make_chart_data(400, seed)
+    events = events_from_wide(df)
+    dates, open_, high, low, close = chart_arrays(df)
+    positions = label_positions(events, dates, high, low, 1.0)
+
+    labelled = sum(len(x) for x, _ in positions.values())
+    assert labelled == len(events)
+    # Same spots as the old per-column text: column i is i + 1 offsets away
+    columns = [col for col in df.columns if col.startswith("TD_Buy_Setup_")]
+    for i, column in enumerate(columns):
+        for bar in np.flatnonzero(df[column].to_numpy() > 0):
+            x, y = positions[(int(df[column].iloc[bar]), "green")]
+            assert np.any((x == dates[bar]) & (y == high[bar] + i + 1))
+
+
+def test_zoomed_out_keeps_completed_counts():
+    df = make_chart_data(3000, 4)
+    events = events_from_wide(df)
+    dates, open_, high, low, close = chart_arrays(df)
+    d, o, h, l, c, factor = downsample_ohlc(dates, open_, high, low, close, max_bars=300)
+    positions = label_positions(events, d, h, l, 1.0, factor, n_bars=len(dates))
+    assert {count for count, _ in positions} <= {9, 13}
+    completed = events["count"] == events["kind"].map(COMPLETED_COUNTS)
+    assert sum(len(x) for x, _ in positions.values()) == completed.sum()
+
+
+def test_zoomed_out_slice_drops_counts_past_its_end():
+    df = make_chart_data(3000, 4)
+    events = events_from_wide(df)
+    dates, open_, high, low, close = chart_arrays(df)
+    completed = events[events["count"] == events["kind"].map(COMPLETED_COUNTS)]
+    # End the slice just before a completed count that falls in its last bin
+    lo, factor = 0, 7
+    hi = next(bar for bar in completed["bar_index"] if bar % factor and bar > 1000)
+    d, o, h, l, c, factor = downsample_ohlc(
+        dates[lo:hi], open_[lo:hi], high[lo:hi], low[lo:hi], close[lo:hi], max_bars=-(-hi // factor)
+    )
+    positions = label_positions(events, d, h, l, 1.0, factor, lo, hi - lo)
+    assert sum(len(x) for x, _ in positions.values()) == (completed["bar_index"] < hi).sum()
+    with pytest.raises(ValueError):
+        label_positions(events, d, h, l, 1.0, factor, lo)
+
+
+def test_chart_uses_few_artists_and_redraws_on_zoom():
+    df = make_chart_data(2000, 2)
+    fig, ax = plt.subplots()
+    chart = OHLCChart(ax, df, max_bars=500)
+    assert len(ax.collections) < 40
+    assert len(chart.bars.get_segments()) == 3 * 500
+
+    ax.set_xlim(df["Date"].iloc[100], df["Date"].iloc[200])
+    assert len(chart.bars.get_segments()) == 3 * 103
+    plt.close(fig)
+
+
+def test_save_charts(tmp_path):
+    all_data = {f"T{i}": make_chart_data(300, i) for i in range(4)}
+    paths = save_charts(all_data, tmp_path, n_processes=2, batch_size=2)
+    assert sorted(p.name for p in tmp_path.iterdir()) == [f"T{i}.png" for i in range(4)]
+    assert len(paths) == 4
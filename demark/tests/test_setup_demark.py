@@ -0,0 +1,56 @@
+import pandas as pd
+import numpy as np
+import matplotlib.dates as mdates
+import pytest
+
+from setup_demark import identify_td_buy_setup, identify_td_sell_setup
+from reference_impl import identify_td_buy_setup_reference, identify_td_sell_setup_reference
+
+"""
+    Parity of the vectorized setup engine against the original loops.
+"""
+
+
+def make_ohlc(n_bars, seed, drift=0.0, vol=0.02):
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(drift, vol, n_bars)))
+    open_ = close * (1 + rng.normal(0, vol / 4, n_bars))
+    high = np.maximum(open_, close) * (1 + np.abs(rng.normal(0, vol / 2, n_bars)))
+    low = np.minimum(open_, close) * (1 - np.abs(rng.normal(0, vol / 2, n_bars)))
+    dates = pd.bdate_range("2015-01-01", periods=n_bars)
+    return pd.DataFrame({
+        "Date": dates.map(mdates.date2num),
+        "Open": open_,
+        "High": high,
+        "Low": low,
+        "Close": close,
+    })
+
+
+@pytest.mark.parametrize("seed", range(5))
+@pytest.mark.parametrize("drift", [-0.002, 0.0, 0.002])
+def test_buy_setup_matches_reference(seed, drift):
+    df = make_ohlc(600, seed, drift=drift)
+    pd.testing.assert_frame_equal(
+        identify_td_buy_setup(df), identify_td_buy_setup_reference(df)
+    )
+
+
+@pytest.mark.parametrize("seed", range(5))
+@pytest.mark.parametrize("drift", [-0.002, 0.0, 0.002])
+def test_sell_setup_matches_reference(seed, drift):
+    df = make_ohlc(600, seed, drift=drift)
+    pd.testing.assert_frame_equal(
+        identify_td_sell_setup(df), identify_td_sell_setup_reference(df)
+    )
+
+
+@pytest.mark.parametrize("n_bars", [0, 5, 9, 13, 14, 20])
+def test_short_frames_match_reference(n_bars):
+    df = make_ohlc(n_bars, seed=7, drift=0.01)
+    pd.testing.assert_frame_equal(
+        identify_td_sell_setup(df), identify_td_sell_setup_reference(df)
+    )
+    pd.testing.assert_frame_equal(
+        identify_td_buy_setup(df), identify_td_buy_setup_reference(df)
+    )
@@ -0,0 +1,72 @@
+import pandas as pd
+import numpy as np
+import pytest
+
+from setup_demark import identify_td_buy_setup, identify_td_sell_setup
+from countdown_demark import identify_td_buy_countdown, identify_td_sell_countdown
+from signals_demark import (
+    identify_td_events,
+    events_to_wide,
+    events_from_wide,
+    signal_mask,
+    EVENT_DTYPES,
+    SELL_SETUP,
+)
+from test_setup_demark import make_ohlc
+
+"""
+    The sparse events table must describe exactly the dense TD_*_N columns.
+"""
+
+
+def dense_pipeline(df):
+    df = identify_td_buy_setup(df)
+    df = identify_td_sell_setup(df)
+    df = identify_td_buy_countdown(df)
+    df = identify_td_sell_countdown(df)
+    return df
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_events_rebuild_dense_columns(seed):
+    df = make_ohlc(1500, seed)
+    events = identify_td_events(df)
+
+    assert dict(events.dtypes) == {col: np.dtype(t) for col, t in EVENT_DTYPES.items()}
+    pd.testing.assert_frame_equal(events_to_wide(df, events), dense_pipeline(df))
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_events_round_trip_through_wide(seed):
+    df = make_ohlc(1500, seed)
+    events = identify_td_events(df)
+    pd.testing.assert_frame_equal(events_from_wide(dense_pipeline(df)), events)
+
+
+def test_signal_mask_matches_sell_setup_nines():
+    df = make_ohlc(1500, seed=11)
+    events = identify_td_events(df)
+    dense = dense_pipeline(df)
+    setup_cols = [col for col in dense.columns if col.startswith("TD_Sell_Setup")]
+    expected = dense[setup_cols].eq(9).any(axis=1).to_numpy()
+    np.testing.assert_array_equal(signal_mask(events, len(df), SELL_SETUP, 9), expected)
+
+
+def test_no_events_on_short_frame():
+    df = make_ohlc(8, seed=0)
+    events = identify_td_events(df)
+    assert events.empty
+    pd.testing.assert_frame_equal(events_to_wide(df, events), df)
+
+
+def test_sequence_ids_past_int16_stay_distinct():
+    df = make_ohlc(40, seed=0)
+    ids = np.array([40000, 40000 + 2**16])
+    events = pd.DataFrame({
+        "sequence_id": np.repeat(ids, 9),
+        "kind": SELL_SETUP,
+        "bar_index": np.r_[np.arange(9), np.arange(20, 29)],
+        "count": np.tile(np.arange(1, 10), 2),
+    }).astype(EVENT_DTYPES)
+    round_trip = events_from_wide(events_to_wide(df, events))
+    np.testing.assert_array_equal(np.unique(round_trip["sequence_id"]), ids)
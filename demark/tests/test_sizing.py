@@ -0,0 +1,56 @@
+import pandas as pd
+import numpy as np
+import pytest
+
+from sizing import KellyPositionSizer, TradeReturnsBuffer, calculate_kelly_fraction
+from test_setup_demark import make_ohlc
+
+"""
+    The precomputed / incremental Kelly sizing against the per-trade versions.
+"""
+
+
+def make_data(n_bars, seed):
+    df = make_ohlc(n_bars, seed).drop(columns="Date")
+    df.index = pd.bdate_range("2020-01-01", periods=n_bars, name="Date")
+    return df
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_ring_buffer_matches_kelly_fraction(seed):
+    rng = np.random.default_rng(seed)
+    buffer = TradeReturnsBuffer(100)
+    history = []
+    for ret in rng.normal(0.005, 0.05, 400):
+        buffer.add(ret)
+        history.append({"return": ret})
+        assert buffer.kelly_fraction() == pytest.approx(
+            calculate_kelly_fraction(pd.DataFrame(history)), abs=1e-12
+        )
+
+
+def test_ring_buffer_without_losses():
+    buffer = TradeReturnsBuffer(100)
+    for _ in range(30):
+        buffer.add(0.01)
+    assert buffer.kelly_fraction() == calculate_kelly_fraction(pd.DataFrame({"return": [0.01] * 30}))
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_position_size_on_matches_slicing(seed):
+    all_data = {"AAA": make_data(300, seed), "^GSPC": make_data(300, seed + 50)}
+    fast = KellyPositionSizer(100000)
+    fast.prepare(all_data)
+    slow = KellyPositionSizer(100000)
+    slow.prepare(all_data)
+    # Without features the sizer falls back to slicing the history
+    slow.features = {}
+
+    rng = np.random.default_rng(seed)
+    for date in all_data["AAA"].index[::7]:
+        trade = {"return": rng.normal(0.01, 0.05)}
+        fast.update_trade_history(trade)
+        slow.update_trade_history(trade)
+        assert fast.position_size_on("AAA", date, 100000) == pytest.approx(
+            slow.position_size_on("AAA", date, 100000), rel=1e-9
+        )
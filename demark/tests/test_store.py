@@ -0,0 +1,82 @@
+import pandas as pd
+import numpy as np
+import pytest
+
+from backtest import backtest_portfolio
+from panel import Panel
+from sizing import FixedAmountPositionSizer
+from store import StoreWriter, UniverseStore, build_store, compute_store_signals
+from test_backtest import make_universe
+
+"""
+    The memory-mapped store against the in-memory frames it is built from.
+"""
+
+FIELDS = ("Open", "High", "Low", "Close")
+
+
+def naive(all_data):
+    frames = {}
+    for ticker, data in all_data.items():
+        data = data.copy()
+        data.index = data.index.tz_convert(None)
+        frames[ticker] = data
+    return frames
+
+
+@pytest.fixture(scope="module")
+def all_data():
+    return naive(make_universe(6, 400, 2, drop_fraction=0.05))
+
+
+def write_store(path, all_data):
+    # A business-day calendar longer than the data, so close() compacts it
+    dates = pd.bdate_range("2019-12-01", "2021-12-31")
+    writer = StoreWriter(path, dates, list(all_data), FIELDS, np.float64)
+    for ticker, data in all_data.items():
+        writer.write(ticker, data)
+    writer.close()
+    return UniverseStore(path)
+
+
+def test_store_round_trip(all_data, tmp_path):
+    store = write_store(tmp_path, all_data)
+    assert isinstance(store.field("Close"), np.memmap)
+
+    expected = Panel.from_frames(all_data, fields=list(FIELDS), dtype=np.float64)
+    assert store.dates.equals(expected.dates)
+    np.testing.assert_array_equal(store.valid, expected.valid)
+    for field in FIELDS:
+        np.testing.assert_array_equal(store.field(field), expected.field(field))
+
+    chunks = list(store.date_chunks(100))
+    assert sum(len(chunk.dates) for chunk in chunks) == len(store.dates)
+    np.testing.assert_array_equal(np.concatenate([c.field("Close") for c in chunks]), store.field("Close"))
+    chunks = list(store.ticker_chunks(4))
+    assert [chunk.tickers for chunk in chunks] == [store.tickers[:4], store.tickers[4:]]
+
+
+def test_signals_and_backtest_from_store(all_data, tmp_path):
+    write_store(tmp_path, all_data)
+    store = compute_store_signals(tmp_path, chunk_size=3)
+    for ticker, data in all_data.items():
+        np.testing.assert_array_equal(store.panel()[ticker]["TD_Signal"], data["TD_Signal"])
+
+    portfolio_df, trades_df, diagnostics = backtest_portfolio(all_data, FixedAmountPositionSizer(5000.))
+    store_portfolio_df, store_trades_df, store_diagnostics = backtest_portfolio(
+        UniverseStore(tmp_path).panel(), FixedAmountPositionSizer(5000.)
+    )
+    assert store_diagnostics == diagnostics
+    pd.testing.assert_frame_equal(store_trades_df, trades_df)
+    pd.testing.assert_frame_equal(store_portfolio_df, portfolio_df)
+
+
+def test_build_store_from_downloads(all_data, tmp_path):
+    def fetch_batch(symbols, start_date, end_date):
+        return {symbol: all_data[symbol] for symbol in symbols if symbol != "T2"}, {"T2": "not found"}
+
+    store = build_store(
+        tmp_path, list(all_data), "2020-01-01", "2022-01-01", fetch_batch, fields=FIELDS, dtype=np.float64,
+    )
+    assert not store.valid[:, store.tickers.index("T2")].any()
+    np.testing.assert_array_equal(store.panel()["T3"]["Close"], all_data["T3"]["Close"])
@@ -0,0 +1,42 @@
+import pandas as pd
+import pytest
+
+from signals_demark import identify_td_events, events_from_sequences
+from streaming_demark import TDSequentialState
+from test_setup_demark import make_ohlc
+
+"""
+    Streaming bar by bar must find the same sequences as a full recompute.
+"""
+
+
+@pytest.mark.parametrize("seed", range(4))
+@pytest.mark.parametrize("drift", [-0.001, 0.0, 0.001])
+def test_streaming_matches_full_recompute(seed, drift):
+    df = make_ohlc(1500, seed, drift=drift)
+    _, sequences = TDSequentialState.from_history(df)
+    pd.testing.assert_frame_equal(events_from_sequences(sequences), identify_td_events(df))
+
+
+def test_saved_state_resumes_identically(tmp_path):
+    df = make_ohlc(1200, seed=5)
+    head, tail = df.iloc[:700], df.iloc[700:]
+
+    state, sequences = TDSequentialState.from_history(head)
+    state.save(tmp_path / "state.json")
+    restored = TDSequentialState.load(tmp_path / "state.json")
+    sequences += restored.replay(tail["High"], tail["Low"], tail["Close"])
+
+    pd.testing.assert_frame_equal(events_from_sequences(sequences), identify_td_events(df))
+
+
+def test_update_emits_new_nines_and_thirteens():
+    df = make_ohlc(1500, seed=2)
+    state = TDSequentialState()
+    emitted_on = {}
+    for bar, row in enumerate(df[["High", "Low", "Close"]].itertuples(index=False)):
+        for kind, sequence_id, bars in state.update(*row):
+            emitted_on[(kind, sequence_id)] = bar
+            # Emitted on the bar of the 9 or 13
+            assert bars[-1] == bar
+    assert len(emitted_on) > 0
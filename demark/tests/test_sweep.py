@@ -0,0 +1,45 @@
+import pandas as pd
+import pytest
+
+from backtest import find_potential_trades, backtest_stats, INITIAL_CAPITAL
+from portfolio import simulate_portfolio
+from sizing import FixedAmountPositionSizer, KellyPositionSizer
+from sweep import run_sweep, RESULT_COLUMNS
+from test_backtest import make_universe
+
+"""
+    The grid search against backtesting each grid point on its own.
+"""
+
+SIZERS = {
+    "fixed": (FixedAmountPositionSizer, {"fixed_amount": 5000.}),
+    "kelly": (KellyPositionSizer, {"initial_capital": INITIAL_CAPITAL, "concentration_limit": 0.1}),
+}
+
+
+@pytest.fixture(scope="module")
+def all_data():
+    return make_universe(6, 400, 0)
+
+
+def test_sweep_matches_single_backtests(all_data, tmp_path):
+    output_path = tmp_path / "sweep.csv"
+    table = run_sweep(all_data, (5, 12), (1, 2), SIZERS, output_path=output_path)
+
+    assert len(table) == 8
+    for row in table.itertuples():
+        diagnostics = {"total_td_signals": 0, "signals_with_rising_closes": 0}
+        trades = find_potential_trades(all_data, diagnostics, row.holding_period_days, row.num_rising_closes)
+        sizer_class, kwargs = SIZERS[row.sizer]
+        portfolio_df, trades_df, _ = simulate_portfolio(all_data, trades, sizer_class(**kwargs), INITIAL_CAPITAL)
+        expected = backtest_stats(portfolio_df, trades_df)
+        for column in RESULT_COLUMNS:
+            assert getattr(row, column) == pytest.approx(expected[column], nan_ok=True)
+
+    pd.testing.assert_frame_equal(pd.read_csv(output_path), table, check_dtype=False)
+
+
+def test_parallel_sweep_matches_serial(all_data):
+    serial = run_sweep(all_data, (5, 10), (2,), SIZERS)
+    parallel = run_sweep(all_data, (5, 10), (2,), SIZERS, n_processes=2)
+    pd.testing.assert_frame_equal(parallel, serial)
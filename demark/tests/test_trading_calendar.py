@@ -0,0 +1,42 @@
+import pandas as pd
+import numpy as np
+
+from backtest import find_potential_trades, INITIAL_CAPITAL
+from portfolio import simulate_portfolio
+from sizing import FixedAmountPositionSizer
+from trading_calendar import schedule_exits, NO_EXIT
+from test_backtest import make_universe
+
+"""
+    Exit scheduling on each ticker's own calendar.
+"""
+
+
+def test_schedule_exits_skips_ticker_holidays():
+    dates = pd.bdate_range("2024-01-01", periods=10)
+    close = np.ones((10, 2))
+    close[[4, 5], 1] = np.nan  # ticker 1 does not trade on rows 4 and 5
+
+    cols = [0, 1, 1, 1]
+    entry_rows = [1, 1, 3, 8]
+    exit_dates = [dates[4], dates[4], dates[3], dates[9] + pd.Timedelta(days=5)]
+    exit_rows = schedule_exits(dates, close, cols, entry_rows, exit_dates)
+    # Holiday on the exit date moves it to the next bar, an exit on the
+    # entry date to the next bar, and past the data there is none
+    assert exit_rows.tolist() == [4, 6, 6, NO_EXIT]
+
+    exit_rows = schedule_exits(dates, close, cols, entry_rows, holding_bars=2)
+    assert exit_rows.tolist() == [3, 3, 7, NO_EXIT]
+
+
+def test_simulate_with_holding_bars():
+    all_data = make_universe(6, 300, 3, drop_fraction=0.1)
+    diagnostics = {"total_td_signals": 0, "signals_with_rising_closes": 0}
+    trades = find_potential_trades(all_data, diagnostics)
+    _, trades_df, _ = simulate_portfolio(
+        all_data, trades, FixedAmountPositionSizer(1000.), INITIAL_CAPITAL, holding_bars=5
+    )
+    assert len(trades_df) > 0
+    for trade in trades_df.itertuples():
+        index = all_data[trade.ticker].index
+        assert index.get_loc(trade.exit_date) - index.get_loc(trade.entry_date) == 5
@@ -0,0 +1,77 @@
+import pandas as pd
+import numpy as np
+import pytest
+
+from universe import (
+    normalize_symbol, parse_changes, reconstruct_history, ConstituentHistory, UniverseCache,
+)
+
+"""
+    Constituent history against a fake, offline scraper.
+"""
+
+NOW = pd.Timestamp("2024-06-01").timestamp()
+
+
+def fake_changes():
+    # Wikipedia's two-level header
+    return pd.DataFrame({
+        ("Date", "Date"): ["March 18, 2024", "January 2, 2023", "January 2, 2023"],
+        ("Added", "Ticker"): ["SMCI", "BRK.B", np.nan],
+        ("Added", "Security"): ["Super Micro", "Berkshire", np.nan],
+        ("Removed", "Ticker"): ["WHR", np.nan, "XYZ"],
+        ("Removed", "Security"): ["Whirlpool", np.nan, "Xyz"],
+        ("Reason", "Reason"): ["", "", ""],
+    })
+
+
+class FakeScraper:
+    def __init__(self):
+        self.calls = 0
+        self.fail = False
+
+    def __call__(self):
+        self.calls += 1
+        if self.fail:
+            raise ConnectionError("offline")
+        return ["AAPL", "BRK.B", "SMCI"], parse_changes(fake_changes())
+
+
+def test_normalize_symbol():
+    assert normalize_symbol(" brk.b ") == "BRK-B"
+    assert normalize_symbol("BF/B") == "BF-B"
+
+
+def test_history_as_of():
+    current, changes = FakeScraper()()
+    history = ConstituentHistory.from_snapshots(reconstruct_history(current, changes))
+
+    assert history.as_of() == ["AAPL", "BRK-B", "SMCI"]
+    assert history.as_of("2024-03-18") == ["AAPL", "BRK-B", "SMCI"]
+    assert history.as_of("2024-03-17") == ["AAPL", "BRK-B", "WHR"]
+    assert history.as_of("2023-01-02") == ["AAPL", "BRK-B", "WHR"]
+    assert history.as_of(pd.Timestamp("2023-06-01", tz="UTC")) == ["AAPL", "BRK-B", "WHR"]
+    with pytest.raises(ValueError):
+        history.as_of("2022-12-30")
+    assert history.ever_members() == ["AAPL", "BRK-B", "SMCI", "WHR"]
+
+    dates = pd.DatetimeIndex(["2023-05-01", "2024-05-01"])
+    membership = history.membership(dates, ["SMCI", "WHR", "brk.b", "MSFT"])
+    np.testing.assert_array_equal(membership, [[False, True, True, False], [True, False, True, False]])
+
+
+def test_cache_scrapes_once_and_works_offline(tmp_path):
+    scraper = FakeScraper()
+    now = [NOW]
+    make_cache = lambda: UniverseCache(tmp_path, clock=lambda: now[0], scrapers={"sp500": scraper})
+
+    assert make_cache().history().as_of() == ["AAPL", "BRK-B", "SMCI"]
+    # A new process reads the stored history without scraping
+    history = make_cache().history()
+    assert scraper.calls == 1
+    assert history.as_of("2024-01-01") == ["AAPL", "BRK-B", "WHR"]
+
+    now[0] += 30 * 86400
+    scraper.fail = True
+    assert make_cache().history().as_of() == ["AAPL", "BRK-B", "SMCI"]
+    assert scraper.calls == 2
@@ -0,0 +1,52 @@
+import pandas as pd
+import numpy as np
+import pytest
+
+from backtest import find_potential_trades, INITIAL_CAPITAL
+from panel import Panel
+from portfolio import simulate_portfolio
+from sizing import FixedAmountPositionSizer, KellyPositionSizer
+from walkforward import walk_forward, walk_forward_windows
+from test_backtest import make_universe
+
+"""
+    Walk-forward windows against simulating each window on its own.
+"""
+
+KELLY = (KellyPositionSizer, {"initial_capital": INITIAL_CAPITAL})
+
+
+@pytest.fixture(scope="module")
+def panel():
+    return Panel.from_frames(make_universe(8, 600, 4), dtype=np.float64)
+
+
+def test_windows_cover_history():
+    windows = walk_forward_windows(600, 252, 63)
+    assert windows[0] == (0, 252, 315)
+    assert windows[-1][2] == 600
+    assert all(a[2] == b[1] for a, b in zip(windows, windows[1:]))
+
+
+def test_fixed_sizer_window_matches_standalone_backtest(panel):
+    table = walk_forward(panel, (FixedAmountPositionSizer, {"fixed_amount": 5000.}), 252, 100)
+    assert len(table) == 4
+
+    diagnostics = {"total_td_signals": 0, "signals_with_rising_closes": 0}
+    trades = find_potential_trades(panel, diagnostics)
+    for row in table.itertuples():
+        window = panel.slice_dates(row.test_start, row.test_end)
+        window_trades = [t for t in trades if row.test_start <= t["entry_date"] <= row.test_end]
+        _, trades_df, _ = simulate_portfolio(window, window_trades, FixedAmountPositionSizer(5000.), INITIAL_CAPITAL)
+        assert row.total_trades == len(trades_df)
+
+
+def test_parallel_matches_serial_and_carry_starts_alike(panel):
+    serial = walk_forward(panel, KELLY, 200, 100)
+    parallel = walk_forward(panel, KELLY, 200, 100, n_processes=2)
+    pd.testing.assert_frame_equal(parallel, serial)
+
+    carried = walk_forward(panel, KELLY, 200, 100, carry_sizer=True)
+    assert len(carried) == len(serial)
+    # Same first window, the sizer history only differs afterwards
+    pd.testing.assert_series_equal(carried.iloc[0], serial.iloc[0])
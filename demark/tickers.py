@@ -1,4 +1,4 @@
-import pandas as pd
+from universe import get_constituents
 
 
 def get_crypto_tickers():
@@ -156,11 +156,8 @@ def get_commodity_tickers():
     return commodities
 
 
-def get_sp500_tickers():
-    """Get list of current S&P 500 tickers."""
-    url = "https://en.wikipedia.org/wiki/List_of_S%26P_500_companies"
-    tables = pd.read_html(url)
-    tickers = tables[0]["Symbol"].tolist()
-    return [ticker.replace(".", "-") for ticker in tickers]
+def get_sp500_tickers(as_of=None):
+    """Get list of S&P 500 tickers, current or as of a date (see universe.py)."""
+    return get_constituents("sp500", as_of)
 
 
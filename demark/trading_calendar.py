@@ -0,0 +1,47 @@
+import numpy as np
+
+"""
+    Exit scheduling on each ticker's own trading calendar.
+
+    Rows index the shared (dates x tickers) calendar of align_closes / Panel,
+    and a ticker trades on the rows where its close is not NaN. Exits are
+    resolved to rows once, before the simulation, so a holding period that
+    ends on a holiday of the ticker becomes its next trading day up front.
+"""
+
+NO_EXIT = -1  # the ticker has no bar after the entry, held to the end
+
+
+def ticker_bars(close, col):
+    """Rows of the calendar where the ticker in column col has a bar."""
+    return np.flatnonzero(~np.isnan(close[:, col]))
+
+
+def schedule_exits(dates, close, cols, entry_rows, exit_dates=None, holding_bars=None):
+    """
+    Exit row of every trade (ticker column cols[i], entered on entry_rows[i]):
+    the first bar of its ticker on or after exit_dates[i] or, with
+    holding_bars, its ticker's holding_bars-th bar after the entry. An exit
+    is always at least one bar after the entry. NO_EXIT if there is none.
+    """
+    cols = np.asarray(cols, dtype=np.int64)
+    entry_rows = np.asarray(entry_rows, dtype=np.int64)
+    exit_rows = np.full(len(cols), NO_EXIT, dtype=np.int64)
+    if holding_bars is None:
+        exit_from_rows = np.maximum(dates.searchsorted(exit_dates), entry_rows + 1)
+
+    for col in np.unique(cols):
+        trades = np.flatnonzero(cols == col)
+        bars = ticker_bars(close, col)
+        if holding_bars is None:
+            k = np.searchsorted(bars, exit_from_rows[trades])
+        else:
+            k = np.searchsorted(bars, entry_rows[trades], side="right") + holding_bars - 1
+        has_exit = k < len(bars)
+        exit_rows[trades[has_exit]] = bars[k[has_exit]]
+    return exit_rows
+
+
+def exit_buckets(n_rows):
+    """One list of position slots per calendar row, filled as trades execute."""
+    return [[] for _ in range(n_rows)]
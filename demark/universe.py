@@ -0,0 +1,215 @@
+import logging
+import os
+import time
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+
+"""
+    Point-in-time index constituents, cached on disk.
+
+    The S&P 500 history is rebuilt from Wikipedia's current list and its
+    table of changes, by undoing the changes from the newest back. It is
+    stored as one .npz per index: the dates the membership changed, every
+    symbol that was ever a member and a (snapshots x symbols) membership
+    matrix. A day -> snapshot array over the whole history then answers
+    "members as of date X" with one lookup.
+
+    The scrape only runs when the stored history is older than max_age; if
+    it fails, the stored history is used as is, so runs work offline.
+
+    This module only needs numpy and pandas, so the scripts at the top of
+    the repository can import it as demark.universe.
+"""
+
+SP500_URL = "https://en.wikipedia.org/wiki/List_of_S%26P_500_companies"
+DEFAULT_UNIVERSE_DIR = os.path.join(
+    os.environ.get("DEMARK_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "demark")), "universe"
+)
+DEFAULT_MAX_AGE = timedelta(days=7)
+
+
+def normalize_symbol(symbol):
+    """Yahoo Finance form of a symbol: upper case, share classes with '-' (BRK.B -> BRK-B)."""
+    return symbol.strip().upper().replace(".", "-").replace("/", "-")
+
+
+def _column(table, *names):
+    """The first column of a (possibly two-level) table whose labels contain all names."""
+    for column in table.columns:
+        labels = column if isinstance(column, tuple) else (column,)
+        if all(any(name in str(label) for label in labels) for name in names):
+            return table[column]
+    raise KeyError(f"No column matching {names}")
+
+
+def parse_changes(table):
+    """Wikipedia's 'Selected changes' table as rows of (date, added, removed), NaN for none."""
+    changes = pd.DataFrame({
+        "date": pd.to_datetime(_column(table, "Date"), format="mixed", errors="coerce"),
+        "added": _column(table, "Added", "Ticker"),
+        "removed": _column(table, "Removed", "Ticker"),
+    })
+    for side in ("added", "removed"):
+        present = changes[side].notna()
+        changes.loc[present, side] = changes.loc[present, side].astype(str).map(normalize_symbol)
+    return changes.dropna(subset=["date"])
+
+
+def scrape_sp500():
+    """(current symbols, changes) from Wikipedia."""
+    tables = pd.read_html(SP500_URL)
+    return tables[0]["Symbol"].tolist(), parse_changes(tables[1])
+
+
+def reconstruct_history(current, changes, today=None):
+    """
+    Membership snapshots [(effective date, set of symbols)], oldest first,
+    from the current members and the changes. The first snapshot starts at
+    the oldest change; the last one is the current list.
+    """
+    members = {normalize_symbol(symbol) for symbol in current}
+    today = pd.Timestamp.now().normalize() if today is None else pd.Timestamp(today)
+    snapshots = []
+    for date, day in sorted(changes.groupby("date"), key=lambda item: item[0], reverse=True):
+        if date > today:
+            continue
+        snapshots.append((date, set(members)))
+        # Undo the day's changes to get the members before it
+        members -= set(day["added"].dropna())
+        members |= set(day["removed"].dropna())
+    snapshots.reverse()
+    if not snapshots:
+        snapshots.append((today, set(members)))
+    return snapshots
+
+
+SCRAPERS = {"sp500": scrape_sp500}
+
+
+class ConstituentHistory:
+    def __init__(self, dates, symbols, members):
+        self.dates = pd.DatetimeIndex(dates)
+        self.symbols = np.asarray(symbols, dtype=str)
+        self.members = np.asarray(members, dtype=bool)
+        self._columns = {symbol: col for col, symbol in enumerate(self.symbols)}
+        # Snapshot in effect on each day from the first change to the last
+        self._start = self.dates[0].to_datetime64().astype("datetime64[D]")
+        days = (self.dates.to_numpy().astype("datetime64[D]") - self._start).astype(np.int64)
+        self._day_snapshot = np.repeat(np.arange(len(days)), np.diff(np.append(days, days[-1] + 1)))
+
+    @classmethod
+    def from_snapshots(cls, snapshots):
+        symbols = sorted(set().union(*(members for _, members in snapshots)))
+        columns = {symbol: col for col, symbol in enumerate(symbols)}
+        members = np.zeros((len(snapshots), len(symbols)), dtype=bool)
+        for row, (_, snapshot) in enumerate(snapshots):
+            members[row, [columns[symbol] for symbol in snapshot]] = True
+        return cls([date for date, _ in snapshots], symbols, members)
+
+    def _snapshot_rows(self, dates):
+        dates = pd.DatetimeIndex(dates)
+        if dates.tz is not None:
+            dates = dates.tz_convert(None)
+        days = (dates.to_numpy().astype("datetime64[D]") - self._start).astype(np.int64)
+        if (days < 0).any():
+            raise ValueError(f"The constituent history starts on {self.dates[0].date()}")
+        return self._day_snapshot[np.minimum(days, len(self._day_snapshot) - 1)]
+
+    def as_of(self, date=None):
+        """Sorted members on date (default: the latest snapshot)."""
+        if date is None:
+            row = len(self.dates) - 1
+        else:
+            row = self._snapshot_rows([date])[0]
+        return self.symbols[self.members[row]].tolist()
+
+    def ever_members(self, start=None, end=None):
+        """Every symbol that was a member at some point in [start, end]."""
+        lo = 0 if start is None else self._snapshot_rows([start])[0]
+        hi = len(self.dates) - 1 if end is None else self._snapshot_rows([end])[0]
+        return self.symbols[self.members[lo : hi + 1].any(axis=0)].tolist()
+
+    def membership(self, dates, symbols):
+        """(dates x symbols) bool array, True where the symbol was a member on the date."""
+        rows = self._snapshot_rows(dates)
+        cols = np.array([self._columns.get(normalize_symbol(symbol), -1) for symbol in symbols], dtype=np.int64)
+        result = self.members[rows][:, np.maximum(cols, 0)]
+        result[:, cols < 0] = False
+        return result
+
+
+class UniverseCache:
+    """
+    scrapers maps index names to functions returning (current symbols,
+    changes DataFrame of date, added, removed), so offline ones can be
+    plugged in.
+    """
+    def __init__(self, cache_dir=DEFAULT_UNIVERSE_DIR, max_age=DEFAULT_MAX_AGE, clock=time.time, scrapers=None):
+        self.cache_dir = cache_dir
+        self.scrapers = scrapers or SCRAPERS
+        self.max_age = max_age
+        self.clock = clock
+        self._loaded = {}
+
+    def _path(self, index):
+        return os.path.join(self.cache_dir, f"{index}.npz")
+
+    def history(self, index="sp500"):
+        """The ConstituentHistory of index, rebuilt if the stored one is stale."""
+        loaded = self._loaded.get(index) or self._read(index)
+        if loaded is not None and self.clock() - loaded[0] <= self.max_age.total_seconds():
+            return loaded[1]
+
+        try:
+            current, changes = self.scrapers[index]()
+        except Exception as e:
+            if loaded is None:
+                raise
+            logging.warning(f"Could not refresh the {index} constituents, using the stored ones: {e}")
+            return loaded[1]
+
+        fetched_at = self.clock()
+        today = pd.Timestamp(fetched_at, unit="s").normalize()
+        history = ConstituentHistory.from_snapshots(reconstruct_history(current, changes, today))
+        self._save(index, history, fetched_at)
+        self._loaded[index] = (fetched_at, history)
+        return history
+
+    def _read(self, index):
+        path = self._path(index)
+        if not os.path.exists(path):
+            return None
+        with np.load(path) as npz:
+            loaded = (float(npz["fetched_at"]), ConstituentHistory(npz["dates"], npz["symbols"], npz["members"]))
+        self._loaded[index] = loaded
+        return loaded
+
+    def _save(self, index, history, fetched_at):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_path = self._path(index) + ".tmp.npz"
+        np.savez(
+            tmp_path,
+            fetched_at=fetched_at,
+            dates=history.dates.to_numpy().astype("datetime64[D]"),
+            symbols=history.symbols,
+            members=history.members,
+        )
+        os.replace(tmp_path, self._path(index))
+
+
+_default_cache = None
+
+
+def get_default_universe_cache():
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = UniverseCache()
+    return _default_cache
+
+
+def get_constituents(index="sp500", as_of=None, cache=None):
+    """Members of index on as_of (default: now), from the on-disk history."""
+    cache = cache or get_default_universe_cache()
+    return cache.history(index).as_of(as_of)
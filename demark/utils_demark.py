@@ -1,15 +1,35 @@
-from functools import lru_cache
-from matplotlib.dates import DateFormatter, AutoDateLocator
+from functools import partial
 import logging
 import matplotlib.pyplot as plt
+import os
 import pandas as pd
+import random
 import time
 import yfinance as yf
 
+from data import OHLCVCache, DEFAULT_CACHE_DIR
 
-#@lru_cache(maxsize=500)
-def yf_retry_download(symbol, start_date, end_date, max_retries=5, retry_delay=1):
+
+_default_cache = None
+
+
+def get_default_cache():
+    """ The on-disk OHLCV cache used by yf_retry_download, in $DEMARK_CACHE_DIR """
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = OHLCVCache(
+            os.environ.get("DEMARK_CACHE_DIR", DEFAULT_CACHE_DIR),
+            downloader=partial(yf_retry_download, use_cache=False),
+        )
+    return _default_cache
+
+
+def yf_retry_download(symbol, start_date, end_date, max_retries=5, retry_delay=1, use_cache=True):
     """ yf.download but it retries up to 5 times if there's an error """
+    if use_cache:
+        # Only the dates missing from the local cache go to Yahoo
+        return get_default_cache().get(symbol, start_date, end_date)
+
     for attempt in range(max_retries):
         try:
             data = yf.download(symbol, start=start_date, end=end_date)
@@ -21,120 +41,73 @@ def yf_retry_download(symbol, start_date, end_date, max_retries=5, retry_delay=1
                 logging.error(f"Failed to download {symbol} after {max_retries} attempts: {str(e)}")
                 return None
             logging.warning(f"Attempt {attempt + 1} failed for {symbol}: {str(e)}")
-            time.sleep(retry_delay)
+            time.sleep(backoff_delay(attempt, retry_delay))
     return None
 
 
-def plot_data(df, title):
+def backoff_delay(attempt, retry_delay, max_delay=60):
+    """ Exponential backoff with full jitter, so parallel workers don't retry in lockstep """
+    return random.uniform(0, min(max_delay, retry_delay * 2**attempt))
+
+
+def yf_batch_download(symbols, start_date, end_date, max_retries=5, retry_delay=1):
+    """
+    yf.download for a list of symbols in one request. Symbols that fail or
+    come back empty are retried together with backoff.
+
+    Returns ({symbol: DataFrame}, {symbol: error message}).
+    """
+    results = {}
+    errors = {}
+    pending = list(symbols)
+
+    for attempt in range(max_retries):
+        try:
+            data = yf.download(
+                pending, start=start_date, end=end_date,
+                group_by="ticker", progress=False, threads=False,
+            )
+            for symbol in pending:
+                if isinstance(data.columns, pd.MultiIndex):
+                    if symbol not in data.columns.get_level_values(0):
+                        continue
+                    symbol_data = data[symbol].dropna(how="all")
+                else:
+                    symbol_data = data
+                if not symbol_data.empty:
+                    results[symbol] = symbol_data
+            pending = [symbol for symbol in pending if symbol not in results]
+            for symbol in pending:
+                errors[symbol] = "Empty dataset received"
+        except Exception as e:
+            for symbol in pending:
+                errors[symbol] = str(e)
+
+        if not pending:
+            break
+        if attempt < max_retries - 1:
+            logging.warning(f"Attempt {attempt + 1} failed for {len(pending)} symbols: {pending}")
+            time.sleep(backoff_delay(attempt, retry_delay))
+
+    for symbol in results:
+        errors.pop(symbol, None)
+    return results, errors
+
+
+def plot_data(df, title, path=None):
+    """ OHLC chart of df with its TD counts, shown or saved to path (see plot_demark) """
+    # plot_demark needs signals_demark, which imports this module
+    from plot_demark import OHLCChart, format_chart
+
     fig, ax = plt.subplots(figsize=(15, 7))
-    
-    # Plot high-low lines with open-close ticks
-    for idx, row in df.iterrows():
-        # High-Low line
-        ax.plot(
-            [row["Date"], row["Date"]],
-            [row["Low"], row["High"]],
-            color="black",
-            linewidth=1,
-        )
-        # Open tick (left side)
-        ax.plot(
-            [row["Date"] - 0.2, row["Date"]],
-            [row["Open"], row["Open"]],
-            color="black",
-            linewidth=1,
-        )
-        # Close tick (right side)
-        ax.plot(
-            [row["Date"], row["Date"] + 0.2],
-            [row["Close"], row["Close"]],
-            color="black",
-            linewidth=1,
-        )
-    
-    # Format x-axis dates
-    ax.xaxis.set_major_locator(AutoDateLocator())
-    ax.xaxis.set_major_formatter(DateFormatter("%Y-%m-%d"))
-    plt.xticks(rotation=45)
-    
-    # Calculate y-axis scale for relative offsets
-    y_range = df["High"].max() - df["Low"].min()
-    text_offset = y_range * 0.02  # 2% of total price range for vertical spacing
-
-    # Define shades of purple for buy countdown
-    purple_shades = ['#800080', '#9932CC', '#BA55D3', '#D8BFD8', '#DDA0DD']  # Dark to light purple
-    
-    # Define shades of blue for sell countdown
-    blue_shades = ['#00008B', '#0000CD', '#4169E1', '#6495ED', '#87CEEB']  # Dark to light blue
-
-    # Plot TD Buy Setup numbers for all setup columns
-    setup_columns = [col for col in df.columns if col.startswith("TD_Buy_Setup_")]
-    for i, column in enumerate(setup_columns):
-        vertical_offset = text_offset * (i + 1)  # Multiply by column index for spacing
-        for idx, row in df.iterrows():
-            if pd.notna(row[column]) and row[column] > 0:
-                ax.text(
-                    row["Date"],
-                    row["High"] + vertical_offset,
-                    int(row[column]),
-                    color="green",
-                    fontsize=12,
-                    ha="center",
-                )
-
-    # Plot TD Sell Setup numbers for all setup columns
-    setup_columns = [col for col in df.columns if col.startswith("TD_Sell_Setup_")]
-    for i, column in enumerate(setup_columns):
-        vertical_offset = text_offset * (i + 1)  # Multiply by column index for spacing
-        for idx, row in df.iterrows():
-            if pd.notna(row[column]) and row[column] > 0:
-                ax.text(
-                    row["Date"],
-                    row["High"] + vertical_offset,
-                    int(row[column]),
-                    color="green",
-                    fontsize=12,
-                    ha="center",
-                )
-
-    # Plot TD Buy Countdown numbers for all countdown columns
-    countdown_columns = [col for col in df.columns if col.startswith("TD_Buy_Countdown_")]
-    for i, column in enumerate(countdown_columns):
-        vertical_offset = text_offset * (i + 1)  # Multiply by column index for spacing
-        color = purple_shades[i % len(purple_shades)]  # Cycle through purple shades
-        for idx, row in df.iterrows():
-            if pd.notna(row[column]) and row[column] > 0:
-                ax.text(
-                    row["Date"],
-                    row["Low"] - vertical_offset,
-                    int(row[column]),
-                    color=color,
-                    fontsize=12,
-                    ha="center",
-                )
-
-    # Plot TD Sell Countdown numbers for all countdown columns
-    countdown_columns = [col for col in df.columns if col.startswith("TD_Sell_Countdown_")]
-    for i, column in enumerate(countdown_columns):
-        vertical_offset = text_offset * (i + 1)  # Multiply by column index for spacing
-        color = blue_shades[i % len(blue_shades)]  # Cycle through blue shades
-        for idx, row in df.iterrows():
-            if pd.notna(row[column]) and row[column] > 0:
-                ax.text(
-                    row["Date"],
-                    row["Low"] - vertical_offset,
-                    int(row[column]),
-                    color=color,
-                    fontsize=12,
-                    ha="center",
-                )
-
-    # Set labels and title
-    ax.set_xlabel("Date")
-    ax.set_ylabel("Price")
-    ax.set_title(title)
+    OHLCChart(ax, df)
+    format_chart(ax, title)
     plt.tight_layout()
-    plt.show()
+    if path is None:
+        plt.show()
+    else:
+        fig.savefig(path)
+        plt.close(fig)
 
 
 def get_ohlc_for_date(df, target_date):
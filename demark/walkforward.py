@@ -0,0 +1,126 @@
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+
+from backtest import (
+    find_potential_trades, backtest_stats, prepare_data,
+    HOLDING_PERIOD_DAYS, NUM_RISING_CLOSES, INITIAL_CAPITAL,
+)
+from panel import Panel
+from portfolio import simulate_portfolio
+from sizing import KellyPositionSizer
+from sweep import RESULT_COLUMNS
+from tickers import get_sp500_tickers
+
+"""
+    Walk-forward backtests over rolling train / test windows.
+
+    The signals and candidate trades are computed once on the whole panel;
+    each window only simulates the trades entered inside it. Before its
+    test window a sizer is warmed up on the train window's trades (the
+    Kelly history). With carry_sizer the same sizer runs through all the
+    windows in order, otherwise each window gets a fresh one and the
+    windows are independent, so they can run on a process pool.
+"""
+
+TRAIN_BARS = 252
+TEST_BARS = 63
+
+_panel = None
+_trades = None
+
+
+def _init_worker(panel, trades):
+    global _panel, _trades
+    _panel = panel
+    _trades = trades
+
+
+def walk_forward_windows(n_bars, train_bars=TRAIN_BARS, test_bars=TEST_BARS):
+    """(train_start, test_start, test_end) rows of consecutive test windows."""
+    return [
+        (test_start - train_bars, test_start, min(test_start + test_bars, n_bars))
+        for test_start in range(train_bars, n_bars, test_bars)
+    ]
+
+
+def _simulate_rows(lo, hi, sizer):
+    """Simulate the trades entered on rows [lo, hi) of the panel with sizer."""
+    first, last = _panel.dates[lo], _panel.dates[hi - 1]
+    window = _panel.slice_dates(first, last)
+    trades = [trade for trade in _trades if first <= trade["entry_date"] <= last]
+    # Sizer features come from the whole panel, not just the window
+    return simulate_portfolio(window, trades, sizer, INITIAL_CAPITAL, prepare_sizer=False)
+
+
+def _run_window(window, sizer_spec=None, sizer=None):
+    train_start, test_start, test_end = window
+    if sizer is None:
+        sizer_class, sizer_kwargs = sizer_spec
+        sizer = sizer_class(**sizer_kwargs)
+        sizer.prepare(_panel)
+        _simulate_rows(train_start, test_start, sizer)
+
+    portfolio_df, trades_df, _ = _simulate_rows(test_start, test_end, sizer)
+    stats = backtest_stats(portfolio_df, trades_df)
+    row = {
+        "train_start": _panel.dates[train_start],
+        "test_start": _panel.dates[test_start],
+        "test_end": _panel.dates[test_end - 1],
+    }
+    row.update({column: stats[column] for column in RESULT_COLUMNS})
+    return row
+
+
+def walk_forward(
+    all_data,
+    sizer_spec,
+    train_bars=TRAIN_BARS,
+    test_bars=TEST_BARS,
+    carry_sizer=False,
+    holding_period_days=HOLDING_PERIOD_DAYS,
+    num_rising_closes=NUM_RISING_CLOSES,
+    n_processes=None,
+):
+    """
+    Backtest every test window of walk_forward_windows over all_data (a
+    Panel or {ticker: DataFrame}) with a sizer built from sizer_spec, a
+    (PositionSizer class, constructor kwargs) pair. Each window starts from
+    INITIAL_CAPITAL.
+
+    Returns one row per window with its dates and the RESULT_COLUMNS.
+    n_processes runs the windows concurrently, unless carry_sizer makes
+    each window depend on the previous one.
+    """
+    panel = all_data if isinstance(all_data, Panel) else Panel.from_frames(all_data)
+    diagnostics = {"total_td_signals": 0, "signals_with_rising_closes": 0}
+    trades = find_potential_trades(panel, diagnostics, holding_period_days, num_rising_closes)
+    windows = walk_forward_windows(len(panel.dates), train_bars, test_bars)
+
+    if carry_sizer:
+        _init_worker(panel, trades)
+        sizer_class, sizer_kwargs = sizer_spec
+        sizer = sizer_class(**sizer_kwargs)
+        sizer.prepare(panel)
+        if windows:
+            _simulate_rows(windows[0][0], windows[0][1], sizer)
+        rows = [_run_window(window, sizer=sizer) for window in windows]
+    elif n_processes:
+        with ProcessPoolExecutor(n_processes, initializer=_init_worker, initargs=(panel, trades)) as executor:
+            rows = list(executor.map(_run_window, windows, [sizer_spec] * len(windows)))
+    else:
+        _init_worker(panel, trades)
+        rows = [_run_window(window, sizer_spec) for window in windows]
+
+    return pd.DataFrame(rows)
+
+
+if __name__ == "__main__":
+    tickers = get_sp500_tickers()
+    tickers.append("^GSPC")
+    all_data = prepare_data(tickers, panel=True)
+
+    sizer_spec = (KellyPositionSizer, {"initial_capital": INITIAL_CAPITAL})
+    for carry_sizer in (False, True):
+        table = walk_forward(all_data, sizer_spec, carry_sizer=carry_sizer, n_processes=4)
+        print(f"\nWalk-forward, carry_sizer={carry_sizer}:")
+        print(table.to_string(index=False))
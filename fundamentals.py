@@ -0,0 +1,146 @@
+import json
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+import pandas as pd
+import yfinance as yf
+
+"""
+    Fundamentals for a universe of tickers, fetched concurrently and cached.
+
+    A source is any function symbol -> {yfinance info key: value}, or None
+    when the symbol has no data: yf_source reads Yahoo's quote summary once
+    per symbol, csv_source serves a local file offline. Every field in
+    FIELDS comes from that single read.
+
+    FundamentalsCache keeps the fields of every symbol in one JSON file
+    with the time they were fetched, so re-ranking a universe whose
+    fundamentals are younger than max_age does not touch the network.
+"""
+
+# column -> yfinance info key
+FIELDS = {
+    "name": "longName",
+    "sector": "sector",
+    "market_cap": "marketCap",
+    "trailing_pe": "trailingPE",
+    "forward_pe": "forwardPE",
+    "price_to_book": "priceToBook",
+    "ev_to_ebitda": "enterpriseToEbitda",
+}
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".cache", "valueinvesting", "fundamentals.json")
+DEFAULT_MAX_AGE = timedelta(days=1)
+
+
+def yf_source(symbol):
+    """The FIELDS of symbol from one yfinance info request."""
+    info = yf.Ticker(symbol).info
+    if not info:
+        return None
+    return {key: info.get(key) for key in FIELDS.values()}
+
+
+def _plain(value):
+    """A JSON-serializable value for a CSV cell."""
+    if pd.isna(value):
+        return None
+    return value.item() if hasattr(value, "item") else value
+
+
+def csv_source(path):
+    """
+    A source reading a CSV with a symbol column and FIELDS columns (e.g. a
+    fetch_fundamentals table saved with to_csv), for running offline.
+    """
+    table = pd.read_csv(path, index_col="symbol")
+
+    def source(symbol):
+        if symbol not in table.index:
+            return None
+        row = table.loc[symbol]
+        return {key: _plain(row.get(column)) for column, key in FIELDS.items()}
+
+    return source
+
+
+class FundamentalsCache:
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_age=DEFAULT_MAX_AGE, clock=time.time):
+        self.path = path
+        self.max_age = max_age
+        self.clock = clock
+        self.entries = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                self.entries = json.load(f)
+
+    def fresh(self, symbol):
+        """The cached fields of symbol if fetched within max_age, else None."""
+        entry = self.entries.get(symbol)
+        if entry is None or self.clock() - entry["fetched_at"] > self.max_age.total_seconds():
+            return None
+        return entry["info"]
+
+    def put(self, symbol, info):
+        self.entries[symbol] = {"fetched_at": self.clock(), "info": info}
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.entries, f)
+        os.replace(tmp_path, self.path)
+
+
+def _fetch(source, symbol):
+    try:
+        return source(symbol), None
+    except Exception as e:
+        return None, str(e)
+
+
+def fetch_fundamentals(symbols, source=yf_source, cache=None, max_workers=8):
+    """
+    DataFrame of the FIELDS of symbols, indexed by symbol, in the given
+    order. Symbols fresh in the cache are not fetched; the others are
+    fetched from source by max_workers threads and stored in the cache.
+    Missing values are NaN, symbols without any data are left out.
+    """
+    infos = {}
+    to_fetch = []
+    for symbol in symbols:
+        info = cache.fresh(symbol) if cache is not None else None
+        if info is None:
+            to_fetch.append(symbol)
+        else:
+            infos[symbol] = info
+
+    failed = {}
+    if to_fetch:
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            results = pool.map(lambda symbol: _fetch(source, symbol), to_fetch)
+            for symbol, (info, error) in zip(to_fetch, results):
+                if info is None:
+                    failed[symbol] = error or "No data"
+                    continue
+                infos[symbol] = info
+                if cache is not None:
+                    cache.put(symbol, info)
+        if cache is not None:
+            cache.save()
+
+    if failed:
+        logging.warning(f"No fundamentals for {len(failed)} symbols: {', '.join(failed)}")
+
+    found = [symbol for symbol in symbols if symbol in infos]
+    table = pd.DataFrame(
+        [{column: infos[symbol].get(key) for column, key in FIELDS.items()} for symbol in found],
+        index=pd.Index(found, name="symbol"),
+        columns=list(FIELDS),
+    )
+    numeric = [column for column in FIELDS if column not in ("name", "sector")]
+    table[numeric] = table[numeric].apply(pd.to_numeric, errors="coerce")
+    return table
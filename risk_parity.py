@@ -0,0 +1,149 @@
+import numpy as np
+from scipy.optimize import minimize
+
+"""
+    Risk budgeting across economic regimes, as in allweather.py.
+
+    Each asset's risk is split over the regimes by an (assets x regimes)
+    exposure matrix, and the weights are solved so that the regimes carry
+    risk in proportion to their budgets (equal by default). With equal
+    budgets the objective is allweather.py's original one, the squared
+    differences between the first regime's risk and each other regime's. An asset's risk
+    is either its stand-alone risk w_i * sigma_i (allweather.py's model,
+    standalone=True) or its contribution to the portfolio volatility,
+    w_i * (C w)_i / sqrt(w' C w), which accounts for the correlations in
+    the covariance matrix C.
+
+    The objective and its gradient are computed for a whole batch of
+    weight vectors at once and the gradient is handed to SLSQP, which
+    solves one problem at a time: solve_sequence loops over a stack of
+    covariance matrices (rolling windows, perturbed sigmas), each solve
+    starting from the previous solution.
+"""
+
+ALL_WEATHER_ASSETS = [
+    "Equities", "Commodities", "Corporate Credit", "EM Credit", "IL Bonds", "Nominal Bonds",
+]
+ALL_WEATHER_REGIMES = ["Rising Growth", "Rising Inflation", "Falling Growth", "Falling Inflation"]
+ALL_WEATHER_SIGMAS = np.array([0.153, 0.213, 0.041, 0.105, 0.073, 0.08])
+ALL_WEATHER_EXPOSURES = np.array([
+    [0.5, 0.0, 0.0, 0.5],  # Equities
+    [0.5, 0.5, 0.0, 0.0],  # Commodities
+    [1.0, 0.0, 0.0, 0.0],  # Corporate Credit
+    [0.5, 0.5, 0.0, 0.0],  # EM Credit
+    [0.0, 0.5, 0.5, 0.0],  # IL Bonds
+    [0.0, 0.0, 0.5, 0.5],  # Nominal Bonds
+])
+
+
+def covariance_from_sigmas(sigmas, correlation=None):
+    """Covariance matrix of assets with volatilities sigmas (uncorrelated by default)."""
+    sigmas = np.asarray(sigmas, dtype=float)
+    correlation = np.eye(sigmas.shape[-1]) if correlation is None else np.asarray(correlation, dtype=float)
+    return correlation * sigmas[..., :, None] * sigmas[..., None, :]
+
+
+def asset_risks(weights, covariance, standalone=False):
+    """
+    Risk of each asset and its Jacobian with respect to the weights, for
+    a (batch x assets) weights array: (batch x assets), (batch x assets x assets).
+    covariance is one matrix or one per row of weights.
+    """
+    weights = np.atleast_2d(weights)
+    n_assets = weights.shape[1]
+    eye = np.eye(n_assets)
+    if standalone:
+        sigmas = np.sqrt(np.diagonal(covariance, axis1=-2, axis2=-1))
+        sigmas = np.broadcast_to(sigmas, weights.shape)
+        return weights * sigmas, eye * sigmas[:, :, None]
+
+    marginal = (covariance @ weights[:, :, None])[:, :, 0]
+    vol = np.sqrt((weights * marginal).sum(axis=1))[:, None]
+    risks = weights * marginal / vol
+    jacobian = (
+        eye * marginal[:, :, None] + weights[:, :, None] * covariance
+    ) / vol[:, :, None] - (weights * marginal)[:, :, None] * marginal[:, None, :] / vol[:, :, None] ** 3
+    return risks, jacobian
+
+
+def regime_risks(weights, exposures, covariance, standalone=False):
+    """(batch x regimes) risk carried by each regime."""
+    risks, _ = asset_risks(weights, covariance, standalone)
+    return risks @ exposures
+
+
+def risk_budget_objective(weights, exposures, covariance, budgets=None, standalone=False):
+    """
+    Sum of squared gaps between the first regime's risk and each other
+    regime's, every risk R_k scaled to R_k / (n b_k) by its budget, with
+    its gradient, for each row of weights. It is zero when the regimes
+    carry risk in proportion to the budgets.
+    """
+    n_regimes = exposures.shape[1]
+    budgets = np.full(n_regimes, 1 / n_regimes) if budgets is None else np.asarray(budgets, dtype=float)
+    risks, jacobian = asset_risks(weights, covariance, standalone)
+    # gaps = M R with R = E' r, the rows of M are (e_1 - e_k) / (n b)
+    eye = np.eye(n_regimes)
+    gap_matrix = (eye[:1] - eye[1:]) / (n_regimes * budgets)
+    regime_jacobian = gap_matrix @ exposures.T @ jacobian
+    gaps = risks @ exposures @ gap_matrix.T
+    objective = (gaps**2).sum(axis=1)
+    gradient = 2 * np.einsum("bk,bkj->bj", gaps, regime_jacobian)
+    return objective, gradient
+
+
+def solve(exposures, covariance, budgets=None, x0=None, bounds=(0, 1), standalone=False, tol=1e-12):
+    """
+    Fully invested weights balancing the regime risks, as a scipy
+    OptimizeResult (check .success, weights in .x).
+    """
+    n_assets = exposures.shape[0]
+    x0 = np.full(n_assets, 1 / n_assets) if x0 is None else np.asarray(x0, dtype=float)
+
+    def fun(weights):
+        objective, gradient = risk_budget_objective(weights, exposures, covariance, budgets, standalone)
+        return objective[0], gradient[0]
+
+    constraints = {
+        "type": "eq",
+        "fun": lambda weights: weights.sum() - 1,
+        "jac": lambda weights: np.ones_like(weights),
+    }
+    return minimize(
+        fun, x0, jac=True, method="SLSQP", bounds=[bounds] * n_assets,
+        constraints=constraints, options={"ftol": tol, "maxiter": 500},
+    )
+
+
+def solve_sequence(exposures, covariances, budgets=None, x0=None, bounds=(0, 1), standalone=False,
+                   warm_start=True, tol=1e-12):
+    """
+    solve for each of a stack of covariance matrices in turn, each started
+    from the previous solution when warm_start (order similar problems
+    together, e.g. consecutive windows). Returns (weights, objectives,
+    success) arrays.
+    """
+    covariances = np.asarray(covariances, dtype=float)
+    n_problems, n_assets = len(covariances), exposures.shape[0]
+    weights = np.empty((n_problems, n_assets))
+    success = np.empty(n_problems, dtype=bool)
+    start = x0
+    for i, covariance in enumerate(covariances):
+        result = solve(exposures, covariance, budgets, start, bounds, standalone, tol)
+        weights[i] = result.x
+        success[i] = result.success
+        if warm_start and result.success:
+            start = result.x
+
+    objectives, _ = risk_budget_objective(weights, exposures, covariances, budgets, standalone)
+    return weights, objectives, success
+
+
+def perturbed_covariances(sigmas, n_scenarios, scale=0.1, correlation=None, seed=0):
+    """
+    n_scenarios covariance matrices with every sigma scaled by an
+    independent lognormal factor of volatility scale, for sensitivity runs.
+    """
+    rng = np.random.default_rng(seed)
+    shocks = np.exp(rng.normal(0, scale, (n_scenarios, len(sigmas))))
+    return covariance_from_sigmas(np.asarray(sigmas) * shocks, correlation)
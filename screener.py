@@ -0,0 +1,186 @@
+import argparse
+
+import numpy as np
+import pandas as pd
+from tabulate import tabulate
+
+from fundamentals import fetch_fundamentals, FundamentalsCache
+from table_by_pe_ratio import get_sp500_tickers
+
+"""
+    Multi-factor value screen over a fundamentals table (see fundamentals.py).
+
+    Each factor is a yield (1 / the ratio), so higher is cheaper and losses
+    rank last. Factors are turned into percentiles once, within each sector
+    when sector neutral; after that a weighting is one matrix product and a
+    top-k is an argpartition, so many weightings of thousands of tickers
+    can be scored together (composite_scores takes a matrix of weights).
+"""
+
+# factor -> fundamentals column it is the inverse of
+FACTORS = {
+    "earnings_yield": "trailing_pe",
+    "forward_earnings_yield": "forward_pe",
+    "book_to_price": "price_to_book",
+    "ebitda_to_ev": "ev_to_ebitda",
+}
+
+DEFAULT_WEIGHTS = {factor: 1.0 for factor in FACTORS}
+
+
+def factor_matrix(fundamentals, factors=FACTORS):
+    """(tickers x factors) array of factor values, NaN where a ratio is missing or zero."""
+    ratios = fundamentals[list(factors.values())].to_numpy(dtype=float)
+    with np.errstate(divide="ignore"):
+        values = 1 / ratios
+    values[~np.isfinite(values)] = np.nan
+    return values
+
+
+def percentile_scores(values, groups=None):
+    """
+    Percentile (0, 1] of each value within its column, or within its group
+    of rows (e.g. sectors) for each column, ties at their average rank.
+    NaNs stay NaN.
+    """
+    scores = np.full(values.shape, np.nan)
+    if groups is None:
+        groups = np.zeros(len(values), dtype=int)
+    else:
+        groups = pd.factorize(np.asarray(groups), use_na_sentinel=False)[0]
+
+    for group in np.unique(groups):
+        rows = np.flatnonzero(groups == group)
+        for col in range(values.shape[1]):
+            column = values[rows, col]
+            present = np.flatnonzero(~np.isnan(column))
+            if len(present) == 0:
+                continue
+            # Tied values share their average rank
+            scores[rows[present], col] = pd.Series(column[present]).rank(pct=True).to_numpy()
+    return scores
+
+
+def composite_scores(scores, weights):
+    """
+    Weighted mean of each row's factor percentiles, over the factors it has.
+    weights is one weight per factor, or a (weightings x factors) matrix
+    that gives a (tickers x weightings) result. Rows with none of the
+    weighted factors score NaN.
+    """
+    weights = np.asarray(weights, dtype=float)
+    present = ~np.isnan(scores)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return (np.where(present, scores, 0) @ weights.T) / (present @ weights.T)
+
+
+def filter_mask(fundamentals, filters):
+    """
+    Rows passing every filter, a dict of column -> (min, max) with None for
+    no bound. Rows with a NaN in a filtered column fail.
+    """
+    mask = np.ones(len(fundamentals), dtype=bool)
+    for column, (lo, hi) in filters.items():
+        values = fundamentals[column].to_numpy(dtype=float)
+        mask &= ~np.isnan(values)
+        if lo is not None:
+            mask &= values >= lo
+        if hi is not None:
+            mask &= values <= hi
+    return mask
+
+
+def top_k(scores, k, mask=None):
+    """
+    Row indices of the k highest scores, best first, skipping NaNs and rows
+    outside mask. For a (tickers x weightings) matrix, a (k x weightings)
+    array with one column per weighting (padded with -1 if fewer rows qualify).
+    """
+    scores = np.where(np.isnan(scores), -np.inf, scores)
+    if mask is not None:
+        scores[~mask] = -np.inf
+    k = max(min(k, len(scores)), 0)
+    if k == 0:
+        return np.empty((0,) + scores.shape[1:], dtype=np.int64)
+
+    # Only the k best are sorted
+    best = np.argpartition(-scores, k - 1, axis=0)[:k]
+    best_scores = np.take_along_axis(scores, best, axis=0)
+    order = np.argsort(-best_scores, axis=0, kind="stable")
+    best = np.take_along_axis(best, order, axis=0)
+    best_scores = np.take_along_axis(best_scores, order, axis=0)
+    if scores.ndim == 1:
+        return best[best_scores > -np.inf]
+    return np.where(best_scores > -np.inf, best, -1)
+
+
+def screen(fundamentals, weights=DEFAULT_WEIGHTS, k=25, filters=None, sector_neutral=False):
+    """
+    The k best tickers of fundamentals under a {factor: weight} weighting,
+    with their fundamentals, factor percentiles and composite score.
+    """
+    factors = list(weights)
+    values = factor_matrix(fundamentals, {factor: FACTORS[factor] for factor in factors})
+    groups = fundamentals["sector"].to_numpy() if sector_neutral else None
+    scores = percentile_scores(values, groups)
+    composite = composite_scores(scores, [weights[factor] for factor in factors])
+    mask = filter_mask(fundamentals, filters) if filters else None
+    rows = top_k(composite, k, mask)
+
+    table = fundamentals.iloc[rows].copy()
+    for col, factor in enumerate(factors):
+        table[f"{factor}_pct"] = scores[rows, col]
+    table["score"] = composite[rows]
+    table.insert(0, "rank", np.arange(1, len(rows) + 1))
+    return table
+
+
+def export_screen(table, path):
+    """Write a screen to .csv or .parquet (which needs pyarrow or fastparquet)."""
+    if str(path).endswith(".parquet"):
+        table.to_parquet(path)
+    else:
+        table.to_csv(path)
+
+
+def print_screen(table):
+    columns = ["rank", "name", "sector", "trailing_pe", "forward_pe", "price_to_book", "ev_to_ebitda", "score"]
+    print(tabulate(table[columns], headers=["Ticker"] + columns, floatfmt=".2f"))
+
+
+def _parse_weights(specs):
+    weights = {}
+    for spec in specs:
+        factor, weight = spec.split("=")
+        if factor not in FACTORS:
+            raise argparse.ArgumentTypeError(f"Unknown factor {factor!r}, expected one of {list(FACTORS)}")
+        weights[factor] = float(weight)
+    return weights
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Multi-factor value screen of the S&P 500.")
+    parser.add_argument("--weights", nargs="+", default=[], metavar="FACTOR=WEIGHT",
+                        help=f"factor weights, default all of {list(FACTORS)} equally")
+    parser.add_argument("--top", type=int, default=25, help="number of tickers to keep")
+    parser.add_argument("--sector-neutral", action="store_true", help="rank factors within each sector")
+    parser.add_argument("--min-market-cap", type=float, default=None, help="in dollars")
+    parser.add_argument("--output", default=None, help="also write the screen to this .csv or .parquet")
+    args = parser.parse_args()
+
+    print("Fetching S&P 500 tickers...")
+    tickers = get_sp500_tickers()
+    print("Retrieving fundamentals...")
+    fundamentals = fetch_fundamentals(tickers, cache=FundamentalsCache())
+
+    filters = {"market_cap": (args.min_market_cap, None)} if args.min_market_cap else None
+    table = screen(fundamentals, _parse_weights(args.weights) or DEFAULT_WEIGHTS, args.top, filters, args.sector_neutral)
+
+    print(f"\nTop {len(table)} S&P 500 Companies by Composite Value Score:")
+    print_screen(table)
+    if args.output:
+        export_screen(table, args.output)
+
+
+if __name__ == "__main__":
+    main()
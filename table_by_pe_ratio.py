@@ -1,41 +1,37 @@
-import yfinance as yf
-import pandas as pd
 from tabulate import tabulate
 
-def get_sp500_tickers():
-    # Get S&P 500 tickers using Wikipedia
-    url = "https://en.wikipedia.org/wiki/List_of_S%26P_500_companies"
-    tables = pd.read_html(url)
-    df = tables[0]
-    return df['Symbol'].tolist()
-
-def get_pe_ratios(tickers):
-    data = []
-    for ticker in tickers:
-        stock = yf.Ticker(ticker)
-        try:
-            pe_ratio = stock.info['trailingPE']
-            company_name = stock.info['longName']
-            data.append((ticker, company_name, pe_ratio))
-        except KeyError:
-            # Skip companies with missing PE ratio data
-            pass
-    return data
+from fundamentals import fetch_fundamentals, yf_source, FundamentalsCache
+from demark.universe import get_constituents
+
+def get_sp500_tickers(as_of=None):
+    # S&P 500 constituents from the on-disk history, scraped from Wikipedia when stale
+    return get_constituents("sp500", as_of)
+
+def get_pe_ratios(tickers, source=yf_source, cache=None, max_workers=8):
+    # One concurrent, cached fetch for all tickers (see fundamentals.py)
+    if cache is None:
+        cache = FundamentalsCache()
+    fundamentals = fetch_fundamentals(tickers, source, cache, max_workers)
+    # Skip companies with missing PE ratio data
+    fundamentals = fundamentals.dropna(subset=["trailing_pe"])
+    return list(zip(fundamentals.index, fundamentals["name"], fundamentals["trailing_pe"]))
 
 def main():
     print("Fetching S&P 500 tickers...")
     tickers = get_sp500_tickers()
-    
-    print("Retrieving PE ratios...")
-    pe_data = get_pe_ratios(tickers)
-    
+
+    print("Retrieving fundamentals...")
+    fundamentals = fetch_fundamentals(tickers, cache=FundamentalsCache())
+    fundamentals = fundamentals.dropna(subset=["trailing_pe"])
+
     # Sort the data by PE ratio (lowest to highest)
-    pe_data.sort(key=lambda x: x[2])
-    
+    fundamentals = fundamentals.sort_values("trailing_pe")
+
     # Prepare the table
-    headers = ["Ticker", "Company Name", "PE Ratio"]
-    table = tabulate(pe_data, headers=headers, floatfmt=".2f")
-    
+    columns = ["name", "trailing_pe", "forward_pe", "price_to_book", "ev_to_ebitda"]
+    headers = ["Ticker", "Company Name", "PE Ratio", "Forward PE", "P/B", "EV/EBITDA"]
+    table = tabulate(fundamentals[columns], headers=headers, floatfmt=".2f")
+
     print("\nS&P 500 Companies Ranked by PE Ratio (Lowest to Highest):")
     print(table)
 
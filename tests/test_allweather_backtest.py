@@ -0,0 +1,134 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from demark.data import OHLCVCache
+import allweather_backtest
+from allweather_backtest import (
+    EWMACovariance, RollingCovariance, backtest_allweather, load_prices, rebalance_rows,
+)
+
+"""
+    All Weather backtest: streaming covariances, rebalance dates and the
+    price loading through a fake, offline OHLCV cache.
+"""
+
+
+def random_prices(n_dates, n_assets=6, seed=0, start="2020-01-01"):
+    rng = np.random.default_rng(seed)
+    returns = rng.normal(0.0003, 0.01, (n_dates, n_assets)) * np.linspace(0.5, 2, n_assets)
+    dates = pd.bdate_range(start, periods=n_dates, name="Date")
+    return pd.DataFrame(100 * np.cumprod(1 + returns, axis=0), index=dates, columns=[f"A{i}" for i in range(n_assets)])
+
+
+@pytest.mark.parametrize("window", [2, 5, 30])
+def test_rolling_covariance_matches_np_cov(window):
+    returns = np.random.default_rng(window).normal(0, 0.01, (120, 4))
+    estimator = RollingCovariance(4, window=window)
+    for row in range(len(returns)):
+        estimator.update(returns[row])
+        if row < 1:
+            continue
+        last = returns[max(0, row + 1 - window) : row + 1]
+        assert estimator.count == len(last)
+        np.testing.assert_allclose(estimator.covariance(), np.cov(last, rowvar=False), rtol=1e-9, atol=1e-15)
+
+
+def test_rolling_covariance_without_window_uses_everything():
+    returns = np.random.default_rng(0).normal(0, 0.01, (50, 3))
+    estimator = RollingCovariance(3)
+    for row in returns:
+        estimator.update(row)
+    np.testing.assert_allclose(estimator.covariance(), np.cov(returns, rowvar=False))
+
+
+def test_ewma_covariance_is_normalized():
+    # A constant outer product is estimated exactly whatever the number of days
+    estimator = EWMACovariance(2, lam=0.9)
+    for _ in range(3):
+        estimator.update(np.array([0.01, -0.02]))
+    np.testing.assert_allclose(estimator.covariance(), np.outer([0.01, -0.02], [0.01, -0.02]))
+
+
+def test_rebalance_rows_are_first_trading_days():
+    dates = pd.DatetimeIndex(["2024-01-02", "2024-01-31", "2024-02-01", "2024-02-29", "2024-03-04", "2024-04-01"])
+    assert rebalance_rows(dates).tolist() == [0, 2, 4, 5]
+    assert rebalance_rows(dates, "Q").tolist() == [0, 5]
+
+
+def test_backtest_rebalances_monthly_after_warmup():
+    prices = random_prices(300)
+    warmup = 40
+    equity_df, weights_df = backtest_allweather(prices, warmup=warmup, initial_capital=1000)
+
+    # Returns are one row behind prices, so row r has r days in the estimator
+    months = prices.index.to_period("M")
+    first_days = [row for row in range(1, len(prices)) if months[row] != months[row - 1]]
+    expected = prices.index[[row for row in first_days if row >= warmup]]
+    assert weights_df.index.tolist() == expected.tolist()
+    np.testing.assert_allclose(weights_df.sum(axis=1), 1)
+
+    # Flat until the first rebalance, invested after it
+    first = prices.index.get_loc(expected[0])
+    values = equity_df["portfolio_value"].to_numpy()
+    assert (values[: first + 1] == 1000).all()
+    assert (values[first + 1 :] != 1000).all()
+
+
+def test_backtest_holdings_drift_between_rebalances():
+    prices = random_prices(200, seed=1)
+    equity_df, weights_df = backtest_allweather(prices, estimator=RollingCovariance(6, window=30), warmup=30)
+    values = equity_df.set_index("date")["portfolio_value"]
+    close = prices.to_numpy()
+
+    # From one rebalance to the next the portfolio is the same shares
+    start, end = (prices.index.get_loc(date) for date in weights_df.index[:2])
+    shares = values.iloc[start] * weights_df.iloc[0].to_numpy() / close[start]
+    np.testing.assert_allclose(values.iloc[start : end + 1], close[start : end + 1] @ shares)
+
+
+class FakeDownloader:
+    """Closes of random_prices, with A1 missing a day and no data for NONE."""
+    def __init__(self):
+        prices = random_prices(400, n_assets=2, start="2019-06-03")
+        self.history = {symbol: pd.DataFrame({
+            "Open": close, "High": close, "Low": close, "Close": close, "Volume": 1000,
+        }) for symbol, close in prices.items()}
+        self.history["A1"] = self.history["A1"].drop(prices.index[250])
+        self.calls = []
+
+    def __call__(self, symbol, start_date, end_date):
+        self.calls.append(symbol)
+        if symbol not in self.history:
+            return None
+        data = self.history[symbol]
+        data = data[(data.index >= start_date) & (data.index < end_date)]
+        return data if not data.empty else None
+
+
+def test_load_prices_through_the_cache(tmp_path):
+    downloader = FakeDownloader()
+    cache = OHLCVCache(str(tmp_path), downloader)
+    prices = load_prices(["A1", "A0"], "2019-07-01", "2020-06-01", cache)
+
+    assert prices.columns.tolist() == ["A1", "A0"]
+    dates = downloader.history["A1"].loc["2019-07-01":"2020-05-29"].index
+    assert prices.index.equals(dates)
+    np.testing.assert_allclose(prices["A0"], downloader.history["A0"]["Close"].reindex(dates))
+
+    # The second run is served from disk
+    calls = len(downloader.calls)
+    assert load_prices(["A1", "A0"], "2019-07-01", "2020-06-01", cache).equals(prices)
+    assert len(downloader.calls) == calls
+
+    with pytest.raises(ValueError, match="NONE"):
+        load_prices(["A0", "NONE"], "2019-07-01", "2020-06-01", cache)
+
+
+def test_default_cache_keeps_adjusted_prices_apart(tmp_path, monkeypatch):
+    downloader = FakeDownloader()
+    monkeypatch.setattr(allweather_backtest, "ADJUSTED_CACHE_DIR", str(tmp_path / "adjusted"))
+    monkeypatch.setattr(allweather_backtest, "yf_close_download", downloader)
+    load_prices(["A0"], "2019-07-01", "2020-06-01")
+    assert [p.name for p in tmp_path.iterdir()] == ["adjusted"]
+    assert [p.name for p in (tmp_path / "adjusted").iterdir()] == ["A0"]
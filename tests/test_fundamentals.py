@@ -0,0 +1,95 @@
+from datetime import timedelta
+
+import numpy as np
+import pytest
+
+from fundamentals import FIELDS, FundamentalsCache, csv_source, fetch_fundamentals
+
+"""
+    Cached, concurrent fundamentals against a fake, offline source.
+"""
+
+NOW = 1_700_000_000.0
+
+INFOS = {
+    "AAA": {"longName": "Alpha", "sector": "Tech", "marketCap": 1e9, "trailingPE": 12.5,
+            "forwardPE": 11.0, "priceToBook": 2.0, "enterpriseToEbitda": 8.0},
+    "BBB": {"longName": "Beta", "sector": "Energy", "marketCap": 5e8, "trailingPE": None,
+            "forwardPE": 9.0, "priceToBook": 1.1, "enterpriseToEbitda": "Infinity"},
+    "CCC": {"longName": "Gamma", "sector": "Tech", "marketCap": 2e9, "trailingPE": 30.0,
+            "forwardPE": 25.0, "priceToBook": 6.0, "enterpriseToEbitda": 20.0},
+}
+
+
+class FakeSource:
+    """INFOS as a source, None for unknown symbols and an error for BAD."""
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, symbol):
+        self.calls.append(symbol)
+        if symbol == "BAD":
+            raise RuntimeError("rate limited")
+        return INFOS.get(symbol)
+
+
+class FakeClock:
+    def __init__(self, now=NOW):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def test_missing_and_failed_symbols_are_dropped_in_order():
+    source = FakeSource()
+    table = fetch_fundamentals(["CCC", "NONE", "AAA", "BAD", "BBB"], source, max_workers=3)
+    assert table.index.tolist() == ["CCC", "AAA", "BBB"]
+    assert table.columns.tolist() == list(FIELDS)
+    assert sorted(source.calls) == ["AAA", "BAD", "BBB", "CCC", "NONE"]
+    assert table.loc["AAA", "trailing_pe"] == 12.5
+    assert np.isnan(table.loc["BBB", "trailing_pe"])
+    assert table.loc["BBB", "name"] == "Beta"
+
+
+def test_warm_cache_skips_the_source(tmp_path):
+    path = str(tmp_path / "fundamentals.json")
+    clock = FakeClock()
+    cold = fetch_fundamentals(["AAA", "BBB"], FakeSource(), FundamentalsCache(path, clock=clock))
+
+    # A new cache reads the stored entries back
+    source = FakeSource()
+    clock.now += timedelta(hours=23).total_seconds()
+    warm = fetch_fundamentals(["AAA", "BBB"], source, FundamentalsCache(path, clock=clock))
+    assert source.calls == []
+    assert warm.equals(cold)
+
+
+def test_expired_entries_are_fetched_again(tmp_path):
+    path = str(tmp_path / "fundamentals.json")
+    clock = FakeClock()
+    fetch_fundamentals(["AAA", "BBB"], FakeSource(), FundamentalsCache(path, clock=clock))
+
+    clock.now += timedelta(hours=12).total_seconds()
+    fetch_fundamentals(["CCC"], FakeSource(), FundamentalsCache(path, clock=clock))
+
+    # AAA and BBB are 25 hours old, CCC 13
+    source = FakeSource()
+    clock.now += timedelta(hours=13).total_seconds()
+    cache = FundamentalsCache(path, max_age=timedelta(days=1), clock=clock)
+    assert cache.fresh("AAA") is None
+    assert cache.fresh("CCC") == INFOS["CCC"]
+    table = fetch_fundamentals(["AAA", "BBB", "CCC"], source, cache)
+    assert sorted(source.calls) == ["AAA", "BBB"]
+    assert table.index.tolist() == ["AAA", "BBB", "CCC"]
+    assert FundamentalsCache(path, clock=clock).fresh("AAA") == INFOS["AAA"]
+
+
+@pytest.mark.parametrize("symbols", [["AAA", "BBB", "CCC"], ["CCC", "AAA"]])
+def test_csv_source_round_trips(tmp_path, symbols):
+    path = tmp_path / "fundamentals.csv"
+    table = fetch_fundamentals(symbols, FakeSource())
+    table.to_csv(path)
+
+    offline = fetch_fundamentals(symbols + ["NONE"], csv_source(path))
+    assert offline.equals(table)
@@ -0,0 +1,103 @@
+import numpy as np
+import pytest
+from scipy.optimize import check_grad
+
+from risk_parity import (
+    ALL_WEATHER_EXPOSURES, ALL_WEATHER_SIGMAS, covariance_from_sigmas, perturbed_covariances,
+    regime_risks, risk_budget_objective, solve, solve_sequence,
+)
+
+"""
+    Regime risk budgeting: gradients, budgets and batched solves.
+"""
+
+
+def random_covariance(n_assets, seed):
+    rng = np.random.default_rng(seed)
+    factors = rng.normal(0, 0.1, (n_assets, n_assets))
+    return factors @ factors.T + np.eye(n_assets) * 0.01
+
+
+@pytest.mark.parametrize("standalone", [False, True])
+@pytest.mark.parametrize("seed", range(3))
+def test_gradient_matches_finite_differences(standalone, seed):
+    rng = np.random.default_rng(seed)
+    covariance = random_covariance(6, seed)
+    budgets = rng.dirichlet(np.ones(4))
+
+    def objective(weights):
+        return risk_budget_objective(weights, ALL_WEATHER_EXPOSURES, covariance, budgets, standalone)[0][0]
+
+    def gradient(weights):
+        return risk_budget_objective(weights, ALL_WEATHER_EXPOSURES, covariance, budgets, standalone)[1][0]
+
+    for _ in range(5):
+        weights = rng.dirichlet(np.ones(6))
+        scale = np.abs(gradient(weights)).max() + 1e-12
+        assert check_grad(objective, gradient, weights) / scale < 1e-5
+
+
+def test_batched_objective_matches_rows():
+    rng = np.random.default_rng(0)
+    weights = rng.dirichlet(np.ones(6), size=4)
+    covariances = np.stack([random_covariance(6, seed) for seed in range(4)])
+    objectives, gradients = risk_budget_objective(weights, ALL_WEATHER_EXPOSURES, covariances)
+    for i in range(4):
+        objective, gradient = risk_budget_objective(weights[i], ALL_WEATHER_EXPOSURES, covariances[i])
+        np.testing.assert_allclose(objectives[i], objective[0])
+        np.testing.assert_allclose(gradients[i], gradient[0])
+
+
+@pytest.mark.parametrize("standalone", [False, True])
+def test_solve_reaches_unequal_budgets(standalone):
+    covariance = covariance_from_sigmas(ALL_WEATHER_SIGMAS)
+    budgets = np.array([0.4, 0.3, 0.2, 0.1])
+    result = solve(ALL_WEATHER_EXPOSURES, covariance, budgets, standalone=standalone)
+    assert result.success
+    assert result.x.sum() == pytest.approx(1)
+    assert (result.x >= -1e-9).all()
+
+    risks = regime_risks(result.x, ALL_WEATHER_EXPOSURES, covariance, standalone)[0]
+    np.testing.assert_allclose(risks / risks.sum(), budgets, atol=1e-4)
+
+
+def test_solve_sequence_flags_each_problem():
+    covariances = perturbed_covariances(ALL_WEATHER_SIGMAS, 5, seed=1)
+    weights, objectives, success = solve_sequence(ALL_WEATHER_EXPOSURES, covariances)
+    assert success.shape == (5,) and success.dtype == bool
+    assert success.all()
+    assert objectives.shape == (5,)
+    # Six assets over four regimes leave the weights free, so compare the objectives
+    for i, covariance in enumerate(covariances):
+        result = solve(ALL_WEATHER_EXPOSURES, covariance)
+        assert objectives[i] == pytest.approx(result.fun, abs=1e-8)
+    np.testing.assert_allclose(weights.sum(axis=1), 1)
+
+    # Six weights of at most 0.1 cannot be fully invested
+    _, _, success = solve_sequence(ALL_WEATHER_EXPOSURES, covariances, bounds=(0, 0.1))
+    assert success.tolist() == [False] * 5
+
+
+def original_risk_diff(weights, sigmas):
+    """allweather.py's first objective, written out by quadrant."""
+    w_eq, w_com, w_cc, w_em, w_il, w_nom = weights
+    s_eq, s_com, s_cc, s_em, s_il, s_nom = sigmas
+    r1 = w_eq / 2 * s_eq + w_com / 2 * s_com + w_cc * s_cc + w_em / 2 * s_em
+    r2 = w_il / 2 * s_il + w_com / 2 * s_com + w_em / 2 * s_em
+    r3 = w_nom / 2 * s_nom + w_il / 2 * s_il
+    r4 = w_eq / 2 * s_eq + w_nom / 2 * s_nom
+    return (r1 - r2) ** 2 + (r1 - r3) ** 2 + (r1 - r4) ** 2
+
+
+def test_equal_budgets_keep_the_original_objective_and_allocation():
+    covariance = covariance_from_sigmas(ALL_WEATHER_SIGMAS)
+    weights = np.random.default_rng(0).dirichlet(np.ones(6), size=10)
+    objectives, _ = risk_budget_objective(weights, ALL_WEATHER_EXPOSURES, covariance, standalone=True)
+    expected = [original_risk_diff(w, ALL_WEATHER_SIGMAS) for w in weights]
+    np.testing.assert_allclose(objectives, expected, rtol=1e-12)
+
+    # The allocation allweather.py has always published
+    result = solve(ALL_WEATHER_EXPOSURES, covariance, standalone=True, tol=1e-6)
+    np.testing.assert_allclose(
+        result.x, [0.11129921, 0.01442717, 0.13121359, 0.12701067, 0.29618735, 0.31986202], atol=1e-6
+    )
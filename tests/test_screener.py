@@ -0,0 +1,92 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from screener import percentile_scores, top_k, screen
+
+"""
+    Factor percentiles and top-k selection of the value screen.
+"""
+
+
+def full_sort_top_k(scores, k, mask=None):
+    """The k best rows of a 1-D scores array by a full argsort, NaNs and masked rows skipped."""
+    rows = np.flatnonzero(~np.isnan(scores) & (True if mask is None else mask))
+    order = rows[np.argsort(-scores[rows], kind="stable")]
+    return order[:max(k, 0)]
+
+
+@pytest.mark.parametrize("seed", range(5))
+@pytest.mark.parametrize("k", [0, 1, 7, 40, 100])
+def test_top_k_matches_full_sort(seed, k):
+    rng = np.random.default_rng(seed)
+    scores = rng.random((40, 3))
+    scores[rng.random(scores.shape) < 0.2] = np.nan
+    mask = rng.random(40) < 0.7
+
+    for column_mask in (None, mask):
+        best = top_k(scores, k, column_mask)
+        assert best.shape == (min(k, 40), 3)
+        for col in range(3):
+            expected = full_sort_top_k(scores[:, col], k, column_mask)
+            # Rows past the ones that qualify are padded with -1
+            assert best[: len(expected), col].tolist() == expected.tolist()
+            assert (best[len(expected) :, col] == -1).all()
+            assert top_k(scores[:, col], k, column_mask).tolist() == expected.tolist()
+
+
+def test_top_k_clamps_negative_k():
+    scores = np.array([0.3, 0.1, 0.2])
+    assert top_k(scores, -1).tolist() == []
+    assert top_k(scores[:, None], -2).shape == (0, 1)
+
+
+def test_percentiles_average_ties():
+    values = np.array([[1.0], [2.0], [2.0], [np.nan], [3.0]])
+    scores = percentile_scores(values)
+    # The two 2.0s share ranks 2 and 3
+    assert scores[:, 0].tolist()[:3] == [0.25, 0.625, 0.625]
+    assert np.isnan(scores[3, 0])
+    assert scores[4, 0] == 1.0
+
+
+def test_sector_neutral_percentiles():
+    values = np.array([
+        [10.0, 1.0],
+        [20.0, np.nan],
+        [30.0, 3.0],
+        [1.0, 5.0],
+        [2.0, 4.0],
+    ])
+    sectors = ["Tech", "Tech", "Tech", "Energy", "Energy"]
+    scores = percentile_scores(values, sectors)
+    expected = np.array([
+        [1 / 3, 0.5],
+        [2 / 3, np.nan],
+        [1.0, 1.0],
+        [0.5, 1.0],
+        [1.0, 0.5],
+    ])
+    np.testing.assert_allclose(scores, expected)
+    # Across the whole table the Energy rows rank below every Tech row
+    assert (percentile_scores(values)[3:, 0] < 0.5).all()
+
+
+def test_screen_ranks_cheapest_first():
+    fundamentals = pd.DataFrame({
+        "name": ["A", "B", "C", "D"],
+        "sector": ["Tech", "Tech", "Energy", "Energy"],
+        "market_cap": [1e9, 2e9, 3e9, np.nan],
+        "trailing_pe": [10.0, 20.0, 5.0, -4.0],
+        "forward_pe": [12.0, 18.0, 6.0, 8.0],
+        "price_to_book": [2.0, 3.0, 1.0, 1.5],
+        "ev_to_ebitda": [8.0, 9.0, 4.0, 5.0],
+    }, index=pd.Index(["A", "B", "C", "D"], name="symbol"))
+
+    table = screen(fundamentals, k=10)
+    assert table.index.tolist()[0] == "C"
+    assert table["rank"].tolist() == [1, 2, 3, 4]
+    assert table["score"].is_monotonic_decreasing
+
+    filtered = screen(fundamentals, k=10, filters={"market_cap": (1.5e9, None)})
+    assert filtered.index.tolist() == ["C", "B"]